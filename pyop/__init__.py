@@ -10,8 +10,8 @@ from .convert import(
 
 from .tests import adjointTest
 
-from .utilities import matmat, matvec, matvectorized
+from .utilities import matmat, matvec, matvectorized, promoteDtype
 
-from .block import bmat, blockDiag, hstack, vstack
+from .block import bmat, blockDiag, blockRepeat, hstack, vstack
 
 from . import operators
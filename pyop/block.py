@@ -19,6 +19,42 @@ lists is in row-major order.
 
 :func:`~pyop.block.blockDiag` allows for easy creation of common block
 diagonal operators, given a list of the diagonal component operators.
+Repeated blocks along the diagonal, or :func:`~pyop.block.blockRepeat`, are
+applied in one batched call to the block, and families of operators that
+know their block diagonal form (such as :func:`~pyop.operators.diag`) are
+merged into one operator.
+
+All of these functions return a :class:`~pyop.block.BlockOperator`, a flat
+list of blocks with the rows and columns each one covers. Block operators
+passed to the functions are merged into the new one, so nested stacks are
+as cheap to apply as a single :func:`~pyop.block.bmat`. Each application is
+one pass over the blocks: every block reads its slice of the input and
+writes into its slice of an output allocated once, with the blocks sharing
+rows accumulated in place. Blocks that are products with a common factor,
+such as the coil operators ``vstack([S1*F, S2*F])``, apply that factor only
+once.
+
+The blocks can also be applied in parallel by passing an executor from
+``concurrent.futures`` to :func:`~pyop.block.bmat`,
+:func:`~pyop.block.blockDiag`, :func:`~pyop.block.hstack` or
+:func:`~pyop.block.vstack`. Threads suit blocks that release the GIL. With
+a ``ProcessPoolExecutor`` the blocks are pickled once into shared memory,
+where each worker process loads them on first use, and every application
+only exchanges the input and output through shared memory segments kept by
+the operator. Arrays placed in those segments by
+:meth:`~pyop.block.BlockOperator.sharedArrays` are applied without copying
+them in or out. Before Python 3.8, which lacks shared memory, the blocks
+are applied in the calling process instead. Blocks are
+pickled with cloudpickle when it is installed, which also handles
+operators built from lambdas and closures.
+
+Blocks that are :func:`~pyop.operators.zeros` operators are never applied;
+they only contribute zeros to the output. Likewise :func:`~pyop.toMatrix`
+converts a block operator one block at a time, skipping the zero blocks
+and using the closed form of blocks such as :func:`~pyop.operators.eye` or
+:func:`~pyop.operators.diag`, into one sparse matrix. :func:`~pyop.block.bmat` also
+accepts ``None`` for a zero block, whose shape is inferred from the other
+blocks in its row and column.
 
 .. math::
   E = \begin{bmatrix} A & B \\ C & D \end{bmatrix}
@@ -59,12 +95,34 @@ We can also easily make block diagonal operators with
   D = blockDiag([A, B, C])
 '''
 
-from numpy import vsplit, vstack, tile, concatenate, cumsum, add
-from numpy import vstack as npvstack
-from pyop import LinearOperator, matmat
+from numpy import asarray, concatenate, empty, float64, frombuffer, \
+        ndarray, result_type, uint8
+from pyop import LinearOperator
+from pyop.convert import toMatrix
+from pyop.operators.matrix_operators import ZeroOperator
 from scipy.misc import doccer
 
-import six
+import scipy.sparse
+
+from collections import OrderedDict
+from functools import partial
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError: # Python 2 without the futures backport.
+    ProcessPoolExecutor = ()
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python before 3.8.
+    shared_memory = None
+
+from threading import Lock
+
+try:
+    import cloudpickle as pickler
+except ImportError:
+    import pickle as pickler
 
 docdict = {
     'blocks' :
@@ -73,12 +131,19 @@ docdict = {
     'LinearOperator' :
 '''LinearOperator
     The new block operator.''',
+    'executor' :
+'''executor : concurrent.futures.Executor, optional
+    Applies the blocks in parallel. With a ProcessPoolExecutor the blocks
+    must be picklable; operators built from lambdas and closures, such as
+    generic products, need cloudpickle (the ``processes`` extra).''',
 
     ## The see also section.
     'blockDiag' : '''blockDiag : Construct a LinearOperator from block
     diagonal components.''',
     'bmat' : '''bmat : Construct a LinearOperator from LinearOperator
     subcomponents.''',
+    'blockRepeat' : '''blockRepeat : Repeat one LinearOperator along the
+    diagonal.''',
     'hstack' : '''hstack : Squash a row of LinearOperators to a single block
     LinearOperator.''',
     'vstack' : '''vstack : Squash a column of LinearOperators to a single
@@ -88,7 +153,7 @@ docdict = {
 docfill = doccer.filldoc(docdict)
 
 @docfill
-def bmat(blocks):
+def bmat(blocks, executor=None):
     ''' Converts a list of lists into a new operator.
 
     The new operator is composed of blocks described by the list.
@@ -97,7 +162,9 @@ def bmat(blocks):
     ----------
     blocks : [[LinearOperator]]
         A list of lists, with each base component a linear operator (objects
-        instantiated from the LinearOperator class).
+        instantiated from the LinearOperator class) or None for a block of
+        zeros.
+    %(executor)s
 
     Returns
     -------
@@ -129,16 +196,59 @@ def bmat(blocks):
     if len(blocks) == 0:
         raise ValueError('Empty list supplied to block operator.')
 
-    ## First collapse the rows using horz_cat.
-    vert_block_op = [hstack(row) for row in blocks]
-    ## Next collapse the column into one block operator using vert_cat.
-    block_op = vstack(vert_block_op)
+    blocks = __fillNone(blocks)
+
+    rows = [hstack(row) for row in blocks]
+    return vstack(rows, executor)
+
+
+def __fillNone(blocks):
+    ''' Replaces None blocks with zero operators of the inferred shape.
+
+    A None block takes the width of the other blocks in its column when
+    every row has the same number of blocks. Otherwise, or if its column
+    holds no operator, it fills whatever its row lacks of the full width,
+    which requires it to be the only such block in its row. '''
+
+    def rowHeight(row):
+        for b in row:
+            if b is not None:
+                return b.shape[0]
+        raise ValueError('Block operator row contains only None blocks.')
+
+    widths = [[None if b is None else b.shape[1] for b in row]
+              for row in blocks]
+
+    ## Column indices only line up when the rows are all equally long.
+    if len(set(len(row) for row in blocks)) == 1:
+        for row in widths:
+            for j, w in enumerate(row):
+                if w is None:
+                    row[j] = next((r[j] for r in widths if r[j] is not None),
+                                  None)
+
+    totals = set(sum(row) for row in widths if None not in row)
+    if len(totals) > 1:
+        raise ValueError('Block operator rows have different widths.')
+
+    for row in widths:
+        if None not in row:
+            continue
+        if row.count(None) > 1 or not totals:
+            raise ValueError('Cannot infer the width of a None block; '
+                             'its column offsets are ambiguous.')
+        row[row.index(None)] = next(iter(totals)) - sum(
+            w for w in row if w is not None)
+        if min(row) < 0:
+            raise ValueError('Block operator rows have different widths.')
 
-    return block_op
+    return [[ZeroOperator((rowHeight(row), w)) if b is None else b
+             for b, w in zip(row, ws)]
+            for row, ws in zip(blocks, widths)]
 
 
 @docfill
-def blockDiag(blocks):
+def blockDiag(blocks, executor=None):
     ''' Converts a list of operators into a new operator.
 
     The new operator is composed of diagonal blocks described by the list.
@@ -146,6 +256,7 @@ def blockDiag(blocks):
     Parameters
     ----------
     %(blocks)s
+    %(executor)s
 
     Returns
     -------
@@ -173,95 +284,76 @@ def blockDiag(blocks):
     if len(blocks) == 0:
         raise ValueError('Empty list supplied to diagonal block operator.')
 
-    rows = sum(b.shape[0] for b in blocks)
-    cols = sum(b.shape[1] for b in blocks)
+    ## Merge neighbouring blocks that are applied as one operator.
+    merged = [blocks[0]]
+    for b in blocks[1:]:
+        m = __mergeDiag(merged[-1], b)
+        if m is NotImplemented:
+            merged.append(b)
+        else:
+            merged[-1] = m
 
-    ## Generate a list containing the indices to split the vector x
-    ## to be sent to each component of the block operator.
-    forward_splitting_idx = cumsum([b.shape[1] for b in blocks])
-    adjoint_splitting_idx = cumsum([b.shape[0] for b in blocks])
+    if len(merged) == 1 and len(blocks) > 1:
+        return merged[0]
 
-    @matmat
-    def forwardFunction(x):
+    return __place(merged, True, True, executor)
 
-        ## Split vector subcomponents on the block operator lengths.
-        ## TODO: Rename for general  matrix inputs.
-        vec_components = vsplit(x, forward_splitting_idx)
 
-        ## Apply each operator to corresponding subvector and concatenate
-        ## the results.
-        sub_outvecs = (b(v) for (b, v) in six.moves.zip(blocks,
-            vec_components))
+def __mergeDiag(a, b):
+    ''' The single operator blockDiag([a, b]), or NotImplemented. '''
 
-        ## Concatenate the output sub-vectors together.
-        return npvstack(sub_outvecs)
+    merged = a._blockDiag(b)
+    if merged is NotImplemented and a is b:
+        merged = RepeatedOperator(a, 2)
 
+    return merged
 
-    @matmat
-    def adjointFunction(x):
-
-        ## Split vector subcomponents on the block operator lengths.
-        ## TODO: Rename for general  matrix inputs.
-        vec_components = vsplit(x, adjoint_splitting_idx)
-
-        ## Apply each operator to corresponding subvector and concatenate
-        ## the results.
-        sub_outvecs = (b.T(v) for (b, v) in six.moves.zip(blocks,
-            vec_components))
-
-        ## Concatenate the output sub-vectors together.
-        return npvstack(sub_outvecs)
-
-
-    return LinearOperator((rows, cols),
-            forwardFunction,
-            adjointFunction)
-
-
-def __horzcat(horz_blocks):
-    ''' Converts list of horizontal operators into one linear operator.'''
-
-    ## Generate a list containing the indices to split the vector x
-    ## to be sent to each component of the block operator.
-    splitting_idx = cumsum([b.shape[1] for b in horz_blocks])
-
-    @matmat
-    def opFunction(x):
-
-        ## Split vector subcomponents based on the block operator lengths.
-        ## TODO: Rename all of these to imply matrix not vector
-        vec_components = vsplit(x, splitting_idx)
-
-        ## Apply each operator to its corresponding subvector and add the
-        ## results. Two cases for forward and adjoint functions.
-        sub_outvecs = (b(v) for (b, v) in six.moves.zip(horz_blocks,
-            vec_components))
-
-        ## Add the vectors together.
-        return sum(sub_outvecs)
 
+@docfill
+def blockRepeat(block, copies):
+    ''' Repeats one operator along the diagonal of a block operator.
 
-    return opFunction
+    The result is ``blockDiag([block] * copies)``, which
+    :func:`~pyop.block.blockDiag` also produces for repeated blocks. All
+    copies are applied in a single call to the block: the input is reshaped
+    so that the pieces for each copy become extra columns.
 
+    Parameters
+    ----------
+    block : LinearOperator
+        The operator to repeat.
+    copies : int
+        The number of copies along the diagonal.
 
-def __vertcat(vert_blocks):
-    ''' Converts list of vertical operators into one operator.'''
+    Returns
+    -------
+    %(LinearOperator)s
 
-    @matmat
-    def opFunction(x):
+    See Also
+    --------
+    %(blockDiag)s
 
-        ## Apply each operator (forward or adjoint) to the input vector to
-        ## get output vector sub-components.
-        sub_outvecs = (b(x) for b in vert_blocks)
-        ## Concatenate the output sub-vectors together.
-        return npvstack(sub_outvecs)
+    Examples
+    --------
+    >>> from pyop.block import blockRepeat
+    >>> from pyop import toLinearOperator, toMatrix
+    >>> from numpy import array
+    >>> A = toLinearOperator(array([[1., 2.]]))
+    >>> toMatrix(blockRepeat(A, 2))
+    array([[ 1.,  2.,  0.,  0.],
+           [ 0.,  0.,  1.,  2.]])
+    '''
+    if not isinstance(copies, int) or copies < 1:
+        raise ValueError('The number of copies must be a positive integer.')
 
+    if copies == 1:
+        return block
 
-    return opFunction
+    return RepeatedOperator(block, copies)
 
 
 @docfill
-def hstack(blocks):
+def hstack(blocks, executor=None):
     ''' Converts list of operators into one operator.
 
     The new operator is created assuming the list corresponds to a row of
@@ -270,6 +362,7 @@ def hstack(blocks):
     Parameters
     ----------
     %(blocks)s
+    %(executor)s
 
     Returns
     -------
@@ -297,18 +390,15 @@ def hstack(blocks):
         raise ValueError('Horizontal concatenation of empty list.')
 
     rows = blocks[0].shape[0]
-    cols = sum(h.shape[1] for h in blocks)
     if not all(b.shape[0] == rows for b in blocks):
         raise ValueError('Block operator horizontal concatenation failed: '
                          'row mismatch.')
 
-    return LinearOperator((rows, cols),
-            __horzcat(blocks),
-            __vertcat([h.T for h in blocks]))
+    return __place(blocks, False, True, executor)
 
 
 @docfill
-def vstack(blocks):
+def vstack(blocks, executor=None):
     ''' Converts list of operators into one operator.
 
     The new operator is created assuming the list corresponds to a column of
@@ -317,6 +407,7 @@ def vstack(blocks):
     Parameters
     ----------
     %(blocks)s
+    %(executor)s
 
     Returns
     -------
@@ -344,12 +435,693 @@ def vstack(blocks):
     if len(blocks) == 0:
         raise ValueError('Vertical concatenation of empty list.')
 
-    rows = sum(v.shape[0] for v in blocks)
     cols = blocks[0].shape[1]
     if not all(b.shape[1] == cols for b in blocks):
         raise ValueError('Block operator vertical concatenation failed: '
                          'column mismatch.')
 
-    return LinearOperator((rows, cols),
-            __vertcat(blocks),
-            __horzcat([v.T for v in blocks]))
+    return __place(blocks, True, False, executor)
+
+
+def __place(blocks, down, right, executor):
+    ''' Lays out blocks one after another, moving down the rows and/or
+    right along the columns, as one BlockOperator. '''
+
+    entries = []
+    row = col = 0
+    for b in blocks:
+        entries.append((row, col, b))
+        row += b.shape[0] if down else 0
+        col += b.shape[1] if right else 0
+
+    shape = (row if down else blocks[0].shape[0],
+             col if right else blocks[0].shape[1])
+
+    if all(isinstance(b, ZeroOperator) for b in blocks):
+        return ZeroOperator(shape)
+
+    return BlockOperator(shape, entries, executor)
+
+
+## The blocks loaded by a worker process, by the name of the shared memory
+## they were shipped in. Workers are never told when an operator is gone,
+## so only the most recently used _shippedLimit operators are kept.
+_shipped = OrderedDict()
+_shippedLimit = 8
+
+
+def _sharedBlock(blocks, src, src_shape, src_dtype, dst, dst_shape,
+        dst_dtype, task):
+    ''' Applies one shipped block between two shared memory arrays, reading
+    from its first column and writing from its first row in task. Run in a
+    worker process. Returns the result when it does not fit the type of the
+    output, and None otherwise. '''
+
+    name, size = blocks
+    if name in _shipped:
+        _shipped[name] = _shipped.pop(name)
+    else:
+        shm = shared_memory.SharedMemory(name = name)
+        try:
+            _shipped[name] = pickler.loads(bytes(shm.buf[:size]))
+        finally:
+            shm.close()
+
+        while len(_shipped) > _shippedLimit:
+            _shipped.popitem(last = False)
+
+    index, col, row = task
+    b = _shipped[name][index]
+
+    src = shared_memory.SharedMemory(name = src)
+    dst = shared_memory.SharedMemory(name = dst)
+    try:
+        x = ndarray(src_shape, dtype = src_dtype, buffer = src.buf)
+        res = ndarray(dst_shape, dtype = dst_dtype, buffer = dst.buf)
+
+        part = b(x[col:col + b.shape[1]])
+        if result_type(part, res) == res.dtype:
+            res[row:row + b.shape[0]] = part
+            part = None
+        del x, res
+    finally:
+        src.close()
+        dst.close()
+
+    return part
+
+
+def _unlink(shm):
+    shm.close()
+    shm.unlink()
+
+
+class _Segment(object):
+    ''' A shared memory block, unlinked once neither its operator nor any
+    array placed over it remains. '''
+
+    def __init__(self, size):
+        from weakref import finalize
+
+        self.shm = shared_memory.SharedMemory(create = True,
+                size = max(size, 1))
+
+        ## Arrays are placed by address rather than over shm.buf, which
+        ## could not be closed while they exist.
+        view = frombuffer(self.shm.buf, dtype = uint8)
+        self.address = view.ctypes.data
+        del view
+
+        finalize(self, _unlink, self.shm)
+
+
+    def array(self, shape, dtype):
+        ''' An array over the start of the block, which keeps it alive. '''
+        return asarray(_SegmentView(self, shape, dtype))
+
+
+    def holds(self, a):
+        ''' If a is a C ordered array starting at the block. '''
+        return a.flags.c_contiguous and a.ctypes.data == self.address
+
+
+class _SegmentView(object):
+    ''' Exposes the start of a segment to numpy as the base of an array. '''
+
+    def __init__(self, segment, shape, dtype):
+        self.segment = segment
+        self.__array_interface__ = {
+                'shape' : tuple(shape),
+                'typestr' : result_type(dtype).str,
+                'data' : (segment.address, False),
+                'version' : 3}
+
+
+class RepeatedOperator(LinearOperator):
+    ''' Copies of one operator along the diagonal, applied in one batched
+    call. Created by :func:`blockRepeat` and :func:`blockDiag`.
+
+    Parameters
+    ----------
+    block : LinearOperator
+        The repeated operator.
+    copies : int
+        The number of copies.
+    '''
+
+    def __init__(self, block, copies):
+
+        self._block = block
+        self._copies = copies
+
+        super(RepeatedOperator, self).__init__(
+                (block.shape[0] * copies, block.shape[1] * copies),
+                self._apply,
+                lambda x: self.T(x),
+                block.dtype)
+
+
+    def _apply(self, x, out=None):
+        k = self._copies
+        n = self._block.shape[1]
+        columns = x.shape[1:]
+
+        ## The pieces of the input for each copy become extra columns:
+        ## (k n, c) -> (n, k c). For vectors this is a transposed view.
+        batch = x.reshape((k, n) + columns).swapaxes(0, 1).reshape(
+                (n, -1))
+
+        res = self._block(batch)
+        res = res.reshape((self._block.shape[0], k) + columns).swapaxes(0, 1)
+
+        if out is None:
+            return res.reshape((-1,) + columns)
+
+        out.reshape(res.shape)[...] = res
+        return out
+
+
+    def _forwardInto(self, x, out):
+        if not out.flags.c_contiguous:
+            return super(RepeatedOperator, self)._forwardInto(x, out)
+
+        return self._apply(x, out)
+
+
+    @property
+    def T(self):
+        return RepeatedOperator(self._block.T, self._copies)
+
+
+    ## The forward and adjoint refer back to the operator, so they are
+    ## neither printed nor compared.
+    def __repr__(self):
+        return "RepeatedOperator(%r, %r)" % (self._block, self._copies)
+
+
+    def _structure(self):
+        return (self._block, self._copies)
+
+
+    def _toSparse(self, dtype):
+        block = BlockOperator._blockMatrix(self._block, dtype)
+        return scipy.sparse.kron(scipy.sparse.eye(self._copies), block,
+                format = 'csr').astype(block.dtype, copy = False)
+
+
+    def _sparsity(self):
+        block = self._block._sparsity()
+        if block is NotImplemented:
+            return NotImplemented
+
+        return scipy.sparse.kron(scipy.sparse.eye(self._copies, dtype = bool),
+                block, format = 'csr')
+
+
+    def _blockDiag(self, other):
+        if other is self._block:
+            return RepeatedOperator(self._block, self._copies + 1)
+
+        if isinstance(other, RepeatedOperator) and \
+                other._block is self._block:
+            return RepeatedOperator(self._block,
+                    self._copies + other._copies)
+
+        return NotImplemented
+
+
+class BlockOperator(LinearOperator):
+    ''' A LinearOperator made of blocks placed in a larger operator.
+
+    The blocks are kept as one flat table of row and column offsets.
+    Blocks that are themselves BlockOperators are merged into the table and
+    zero blocks are dropped. Blocks covering the same rows are summed.
+    Products sharing a factor, such as the blocks of
+    ``vstack([D1*F, D2*F])``, are merged into one product with the factor.
+
+    Each application is planned once: the blocks with rows no other
+    earlier block covers write directly into their slice of the output,
+    the rows that none of them cover are zeroed, and the remaining blocks
+    are accumulated in place.
+
+    Parameters
+    ----------
+    shape : pair
+        The shape of the operator.
+    entries : [(int, int, LinearOperator)]
+        The first row and column of each block, and the block.
+    executor : concurrent.futures.Executor, optional
+        Applies the blocks in parallel.
+    '''
+
+    def __init__(self, shape, entries, executor=None):
+
+        flat = []
+        for r, c, b in entries:
+            if r + b.shape[0] > shape[0] or c + b.shape[1] > shape[1]:
+                raise ValueError("Block does not fit in the block operator.")
+
+            if isinstance(b, BlockOperator):
+                flat.extend((r + r2, c + c2, b2) for r2, c2, b2 in b._entries)
+            elif not isinstance(b, ZeroOperator):
+                flat.append((r, c, b))
+
+        flat = BlockOperator._shareFactors(flat)
+
+        self._entries = flat
+        self._plan = BlockOperator._makePlan(shape[0], flat)
+        self._transpose = None
+        self._executor = executor
+        self._shipped = None
+        self._segments = None
+        self._lock = Lock() if isinstance(executor, ProcessPoolExecutor) \
+                else None
+
+        super(BlockOperator, self).__init__(shape,
+                self._apply,
+                lambda x: self.T(x),
+                LinearOperator._commonDtype(*(b.dtype for _, _, b in flat)))
+
+
+    @staticmethod
+    def _shareFactors(entries):
+        ''' Merges the products reading the same columns with the same right
+        factor into one product with that factor, so that it is applied
+        once, and likewise for products writing the same rows with the same
+        left factor. '''
+
+        for side in (1, 0):
+            groups = []
+            for e in entries:
+                product = e[2]._product
+                if product is None:
+                    continue
+
+                offset, factor = e[side], product[side]
+                for g in groups:
+                    if g[0] == offset and g[1] == factor:
+                        g[2].append(e)
+                        break
+                else:
+                    groups.append((offset, factor, [e]))
+
+            merged = dict((id(g[2][0]), g) for g in groups if len(g[2]) > 1)
+            shared = set(id(e) for g in merged.values() for e in g[2])
+
+            result = []
+            for e in entries:
+                if id(e) in merged:
+                    result.append(BlockOperator._shareFactor(side,
+                        *merged[id(e)]))
+                elif id(e) not in shared:
+                    result.append(e)
+
+            entries = result
+
+        return entries
+
+
+    @staticmethod
+    def _shareFactor(side, offset, factor, members):
+        ''' The entry applying the products in members, which share factor
+        on side, as one product with factor. '''
+
+        if side == 1:
+            r0 = min(r for r, _, _ in members)
+            rows = max(r + b.shape[0] for r, _, b in members) - r0
+            rest = BlockOperator((rows, factor.shape[0]),
+                    [(r - r0, 0, b._product[0]) for r, _, b in members])
+
+            return (r0, offset, rest * factor)
+
+        c0 = min(c for _, c, _ in members)
+        cols = max(c + b.shape[1] for _, c, b in members) - c0
+        rest = BlockOperator((factor.shape[1], cols),
+                [(0, c - c0, b._product[1]) for _, c, b in members])
+
+        return (offset, c0, factor * rest)
+
+
+    @staticmethod
+    def _makePlan(rows, entries):
+        ''' Splits the blocks into those assigned to untouched rows and
+        those accumulated, and finds the rows left to zero. '''
+
+        assign, accumulate = [], []
+        covered = []
+
+        for r, c, b in entries:
+            span = (r, r + b.shape[0])
+            if any(a < span[1] and span[0] < e for a, e in covered):
+                accumulate.append((r, c, b))
+            else:
+                assign.append((r, c, b))
+                covered.append(span)
+
+        gaps = []
+        start = 0
+        for a, e in sorted(covered):
+            if a > start:
+                gaps.append((start, a))
+            start = e
+        if start < rows:
+            gaps.append((start, rows))
+
+        return assign, gaps, accumulate
+
+
+    @staticmethod
+    def _knownDtype(b):
+        ''' If the result type of b follows the dtype rule, so that b can
+        write into an output allocated ahead of time. Plain LinearOperators
+        without a dtype may wrap functions that change the type. '''
+
+        return b.dtype is not None or type(b) is not LinearOperator
+
+
+    def _apply(self, x, out=None):
+        ''' One pass over the blocks, writing into out or a new array. '''
+
+        vector = x.ndim == 1
+        if vector:
+            x = x.reshape(-1, 1)
+
+        owned = out is None
+        if owned:
+            res = empty((self.shape[0],) + x.shape[1:],
+                    dtype = self.result_type(x.dtype))
+        else:
+            res = out.reshape(-1, 1) if vector else out
+
+        processes = isinstance(self._executor, ProcessPoolExecutor)
+        if processes and shared_memory is not None:
+            res = self._applyShared(x, res, owned)
+        elif self._executor is not None and not processes:
+            res = self._applyThreaded(x, res, owned)
+        else:
+            ## Worker processes need shared memory, added in Python 3.8.
+            res = self._applySerial(x, res, owned)
+
+        if not owned:
+            return out
+
+        return res.reshape(-1) if vector else res
+
+
+    def _applySerial(self, x, res, owned):
+        assign, gaps, accumulate = self._plan
+        scratch = None
+
+        for r, c, b in assign:
+            slc = slice(r, r + b.shape[0])
+            v = x[c:c + b.shape[1]]
+
+            if BlockOperator._knownDtype(b) and \
+                    b.result_type(v.dtype) == res.dtype:
+                b(v, out = res[slc])
+            else:
+                res = BlockOperator._store(res, slc, b(v), owned, False)
+
+        for a, e in gaps:
+            res[a:e] = 0
+
+        for r, c, b in accumulate:
+            slc = slice(r, r + b.shape[0])
+            v = x[c:c + b.shape[1]]
+
+            if BlockOperator._knownDtype(b) and \
+                    b.result_type(v.dtype) == res.dtype:
+                if scratch is None:
+                    scratch = empty((max(b2.shape[0] for _, _, b2 in
+                        accumulate),) + x.shape[1:], dtype = res.dtype)
+                part = b(v, out = scratch[:b.shape[0]])
+            else:
+                part = b(v)
+
+            res = BlockOperator._store(res, slc, part, owned, True)
+
+        return res
+
+
+    def _applyThreaded(self, x, res, owned):
+        ''' The blocks assigned to their rows write into res concurrently,
+        after which the accumulated blocks, also computed concurrently, are
+        added one by one. '''
+
+        assign, gaps, accumulate = self._plan
+
+        def direct(entry):
+            r, c, b = entry
+            v = x[c:c + b.shape[1]]
+
+            if BlockOperator._knownDtype(b) and \
+                    b.result_type(v.dtype) == res.dtype:
+                b(v, out = res[r:r + b.shape[0]])
+                return None
+
+            return b(v)
+
+        parts = list(self._executor.map(direct, assign))
+        for (r, c, b), part in zip(assign, parts):
+            if part is not None:
+                res = BlockOperator._store(res, slice(r, r + b.shape[0]),
+                        part, owned, False)
+
+        for a, e in gaps:
+            res[a:e] = 0
+
+        parts = self._executor.map(lambda e: e[2](x[e[1]:e[1] +
+            e[2].shape[1]]), accumulate)
+        for (r, c, b), part in zip(accumulate, parts):
+            res = BlockOperator._store(res, slice(r, r + b.shape[0]),
+                    part, owned, True)
+
+        return res
+
+
+    def _ship(self):
+        ''' Pickles the blocks once into shared memory, kept for the life
+        of the operator, and returns its name and the size of the data. '''
+
+        if self._shipped is None:
+            from weakref import finalize
+
+            try:
+                data = pickler.dumps([b for _, _, b in self._entries])
+            except Exception as e:
+                raise TypeError("The blocks must be picklable to be applied "
+                                "by worker processes: {}".format(e))
+
+            shm = shared_memory.SharedMemory(create = True,
+                    size = len(data))
+            shm.buf[:len(data)] = data
+            finalize(self, _unlink, shm)
+
+            self._shipped = (shm.name, len(data))
+
+        return self._shipped
+
+
+    def _sharedRows(self):
+        ''' The first row of each accumulated block in the output segment,
+        below the output, and the number of rows of the segment. '''
+
+        below, rows = [], self.shape[0]
+        for _, _, b in self._plan[2]:
+            below.append(rows)
+            rows += b.shape[0]
+
+        return below, rows
+
+
+    def _sharedSegments(self, src_size, dst_size):
+        ''' The input and output segments, kept for the life of the operator
+        and only replaced when an application needs more room. '''
+
+        src, dst = self._segments or (None, None)
+        if src is None or src.shm.size < src_size:
+            src = _Segment(src_size)
+        if dst is None or dst.shm.size < dst_size:
+            dst = _Segment(dst_size)
+
+        self._segments = (src, dst)
+        return src, dst
+
+
+    def sharedArrays(self, columns=None, dtype=float64):
+        ''' An input and an output array for applying this operator.
+
+        With a ``ProcessPoolExecutor`` the arrays are placed in the shared
+        memory the worker processes read and write, so that ``O(x, out =
+        out)`` copies neither. The arrays are reused by later calls, so
+        only one pair is valid at a time. Other operators return new
+        arrays.
+
+        Parameters
+        ----------
+        columns : int, optional
+            The number of columns, or None for vectors.
+        dtype : numpy.dtype, optional
+            The dtype of the input. The output has the result type.
+
+        Returns
+        -------
+        x, out : ndarray
+            The input and output arrays.
+        '''
+
+        dtype = result_type(dtype)
+        res_dtype = self.result_type(dtype)
+        tail = () if columns is None else (columns,)
+
+        if not isinstance(self._executor, ProcessPoolExecutor) or \
+                shared_memory is None:
+            return (empty((self.shape[1],) + tail, dtype = dtype),
+                    empty((self.shape[0],) + tail, dtype = res_dtype))
+
+        k = 1 if columns is None else columns
+        with self._lock:
+            src, dst = self._sharedSegments(
+                    self.shape[1] * k * dtype.itemsize,
+                    self._sharedRows()[1] * k * res_dtype.itemsize)
+
+        return (src.array((self.shape[1],) + tail, dtype),
+                dst.array((self.shape[0],) + tail, res_dtype))
+
+
+    def _applyShared(self, x, res, owned):
+        ''' The blocks are applied by worker processes, reading the input
+        from and writing their results to the shared memory segments of the
+        operator. The blocks assigned to their rows write into their slice
+        of the output, and the accumulated blocks into rows of their own
+        below it. Arrays from :meth:`sharedArrays` are used in place. '''
+
+        blocks = self._ship()
+        assign, gaps, accumulate = self._plan
+        index = dict((id(b), i) for i, (_, _, b) in enumerate(self._entries))
+        below, rows = self._sharedRows()
+        shape = (rows,) + x.shape[1:]
+
+        with self._lock:
+            src, dst = self._sharedSegments(x.nbytes,
+                    rows * x[:1].size * res.dtype.itemsize)
+
+            if not src.holds(x):
+                src.array(x.shape, x.dtype)[...] = x
+            shared = dst.array(shape, res.dtype)
+            inplace = dst.holds(res)
+
+            tasks = [(e, e[0]) for e in assign] + list(zip(accumulate, below))
+            parts = list(self._executor.map(partial(_sharedBlock, blocks,
+                src.shm.name, x.shape, x.dtype, dst.shm.name, shape,
+                res.dtype),
+                [(index[id(b)], c, row) for (_, c, b), row in tasks]))
+
+            for ((r, c, b), _), part in zip(tasks[:len(assign)], parts):
+                if part is None and inplace:
+                    continue
+
+                slc = slice(r, r + b.shape[0])
+                res = BlockOperator._store(res, slc,
+                        shared[slc] if part is None else part, owned, False)
+
+            for a, e in gaps:
+                res[a:e] = 0
+
+            for ((r, c, b), row), part in zip(tasks[len(assign):],
+                    parts[len(assign):]):
+                res = BlockOperator._store(res, slice(r, r + b.shape[0]),
+                        shared[row:row + b.shape[0]] if part is None
+                        else part, owned, True)
+
+        return res
+
+
+    @staticmethod
+    def _store(res, slc, part, owned, add):
+        ''' Writes or adds part into res[slc], widening an owned output to
+        the type of part. '''
+
+        if owned and result_type(part, res) != res.dtype:
+            res = res.astype(result_type(part, res))
+
+        if add:
+            res[slc] += part
+        else:
+            res[slc] = part
+
+        return res
+
+
+    def _forwardInto(self, x, out):
+        return self._apply(x, out)
+
+
+    @staticmethod
+    def _blockMatrix(b, dtype):
+        ''' The sparse matrix of one block, in closed form if the block
+        knows it, and applied to an identity otherwise. '''
+
+        S = b._toSparse(dtype)
+        if S is NotImplemented:
+            S = scipy.sparse.coo_matrix(toMatrix(b, dtype = dtype))
+
+        return S
+
+
+    def _toSparse(self, dtype):
+        ''' The blocks converted one by one and assembled. Zero blocks
+        were dropped from the table and are never converted. '''
+
+        parts = [BlockOperator._blockMatrix(b, dtype) for _, _, b in
+                self._entries]
+        return self._assemble(parts, self.result_type(dtype))
+
+
+    def _sparsity(self):
+        parts = [b._sparsity() for _, _, b in self._entries]
+        if any(S is NotImplemented for S in parts):
+            return NotImplemented
+
+        return self._assemble(parts, bool)
+
+
+    def _assemble(self, parts, dtype):
+        ''' One sparse matrix from the sparse matrices of the blocks,
+        with their rows and columns shifted to their place. '''
+
+        rows, cols, data = [], [], []
+        for (r, c, _), S in zip(self._entries, parts):
+            S = S.tocoo()
+            rows.append(S.row + r)
+            cols.append(S.col + c)
+            data.append(S.data)
+
+        data = concatenate(data) if data else empty(0, dtype = dtype)
+        dtype = result_type(dtype, data)
+
+        return scipy.sparse.coo_matrix((data.astype(dtype, copy = False),
+            (concatenate(rows or [empty(0, int)]),
+             concatenate(cols or [empty(0, int)]))),
+            shape = self.shape)
+
+
+    @property
+    def T(self):
+        if self._transpose is None:
+            self._transpose = BlockOperator(self.shape[::-1],
+                    [(c, r, b.T) for r, c, b in self._entries],
+                    self._executor)
+            self._transpose._transpose = self
+
+        return self._transpose
+
+
+    ## The forward and adjoint refer back to the operator, so they are
+    ## neither printed nor compared.
+    def __repr__(self):
+        return "BlockOperator(%r, %r)" % (self.shape, self._entries)
+
+
+    def _structure(self):
+        return self._entries
@@ -2,8 +2,11 @@
 Utilities for converting to and from a :class:`.LinearOperator`.
 '''
 
+from pyop.error import MissingAdjoint
 from pyop.linop import LinearOperator
+from pyop.utilities import promoteDtype
 
+from functools import partial
 
 import numpy as np
 import scipy.sparse as sp
@@ -21,6 +24,13 @@ def toLinearOperator(m):
     saving benefits are lost since the result is an operator that
     performs a standard matrix multiplication.
 
+    The result is a :class:`MatrixOperator`, which keeps the matrix:
+    :func:`toMatrix` returns it directly, also when the operator is a
+    factor of a product with other operators whose matrices are known.
+
+    The dtype of the operator is the dtype of the matrix. As for all
+    operators, the result keeps the precision of the input.
+
     Parameters
     ----------
     m : numpy.ndarray or scipy.sparse
@@ -28,7 +38,7 @@ def toLinearOperator(m):
 
     Returns
     -------
-    LinearOperator
+    MatrixOperator
         the transform lifted into the LinearOperator context.
 
     Raises
@@ -57,10 +67,68 @@ def toLinearOperator(m):
     if len(m.shape) > 2:
         raise ValueError("Cannot convert 3+D to LinearOperator")
 
-    return LinearOperator(m.shape, m.dot, m.T.dot)
+    return MatrixOperator(m)
+
+
+class MatrixOperator(LinearOperator):
+    ''' A LinearOperator multiplying by a dense or sparse matrix. Created by
+    :func:`toLinearOperator`.
+
+    The matrix is kept, so :func:`toMatrix` returns it without applying
+    the operator.
+
+    Parameters
+    ----------
+    m : numpy.ndarray or scipy.sparse
+        The matrix.
+    m_H : numpy.ndarray or scipy.sparse, optional
+        The conjugate transpose of m, computed if not given.
+    '''
+
+    def __init__(self, m, m_H=None):
+
+        if m_H is None:
+            m_H = m.T.conj() if np.iscomplexobj(m) else m.T
+
+        self._matrix = m
+        self._matrix_H = m_H
+        self._transpose = None
+
+        super(MatrixOperator, self).__init__(m.shape,
+                partial(MatrixOperator._dotAs, m),
+                partial(MatrixOperator._dotAs, m_H),
+                m.dtype)
+
+
+    @staticmethod
+    def _dotAs(m, x):
+        ''' m.dot(x), keeping the precision of x. '''
+        return m.dot(x).astype(promoteDtype(x.dtype, m.dtype), copy = False)
+
 
+    @property
+    def T(self):
+        if self._transpose is None:
+            self._transpose = MatrixOperator(self._matrix_H, self._matrix)
+            self._transpose._transpose = self
 
-def toMatrix(O, sparse = False):
+        return self._transpose
+
+
+    def _structure(self):
+        return (self._matrix,)
+
+
+    def _toSparse(self, dtype):
+        return sp.csr_matrix(self._matrix, dtype = self.result_type(dtype))
+
+
+    def _sparsity(self):
+        return sp.csr_matrix(self._matrix, dtype = bool)
+
+
+def toMatrix(O, sparse = False, dtype = None, out = None, columns = None,
+        memory = None, executor = None, pattern = None):
     ''' Convert an LinearOperator into its matrix form.
 
     Converting an LinearOperator into a matrix could make a large
@@ -73,17 +141,66 @@ def toMatrix(O, sparse = False):
     be easily done automatically, and as such the developer will need to be
     concious of this fact when writing LinearOperators.
 
+    Operators with a known matrix, such as :func:`~pyop.operators.eye`,
+    :func:`~pyop.operators.diag`, :func:`~pyop.operators.select` and
+    zeros, are converted without being applied. Block operators convert
+    each block on its own, skipping the zero blocks, and assemble one
+    sparse matrix.
+
+    If the sparsity pattern of the matrix is known, given as `pattern` or
+    by the operator itself (as for convolutions, gradients and products of
+    such operators), columns that share no row are grouped together by a
+    greedy graph coloring. The operator is then only applied to one probe
+    per group, the sum of the columns of the identity in it, and each
+    result is split back into its columns. A banded matrix needs as many
+    applications as its band is wide.
+
+    Other operators are applied to the columns of an identity. By default
+    all columns are applied at once, which needs memory for the full
+    identity. Given `columns` or `memory`, the matrix is instead formed a
+    block of columns at a time, and the blocks are written into `out`,
+    which may be an array on disk.
+
     Parameters
     ----------
     sparse : bool, optional
         Passes in a sparse matrix to the LinearOperator instead of a dense
         one. For this parameter to work, the functions that a LinearOperator
         calls (forward, adjoint) must respect the type of the input.
+    dtype : numpy.dtype, optional
+        The dtype of the identity the operator is applied to. The None
+        default uses float64, so the matrix has the dtype
+        ``O.result_type(numpy.float64)``. Pass numpy.float32 to form the
+        matrix in single precision.
+    out : numpy.ndarray or str, optional
+        The array to write the dense matrix into, for example a
+        numpy.memmap. A string is the name of a ``.npy`` file created for
+        the matrix and returned as a memory map.
+    columns : int, optional
+        The number of columns formed at a time.
+    memory : int, optional
+        A budget in bytes for the identity and result of one block of
+        columns, from which the number of columns is chosen when `columns`
+        is not given.
+    executor : concurrent.futures.Executor, optional
+        Forms the blocks of columns in parallel. Every block in flight uses
+        its own share of `memory`.
+    pattern : array_like or scipy.sparse.spmatrix, optional
+        Nonzero wherever the matrix may be nonzero. The matrix is wrong if
+        the pattern misses any of its nonzeros. The None default uses the
+        pattern the operator knows, if any.
 
     Returns
     -------
-    numpy.ndarray
-        the matrix representation of the transform.
+    numpy.ndarray or scipy.sparse.spmatrix
+        the matrix representation of the transform, or `out`. Operators
+        with a known matrix give a CSR matrix when `sparse` is set.
+
+    Raises
+    ------
+    ValueError
+        When `out` is given for a sparse matrix, or does not have the shape
+        of the operator.
 
     Examples
     --------
@@ -93,6 +210,9 @@ def toMatrix(O, sparse = False):
     >>> toMatrix(A_op)
     array([[ 1.,  0.],
            [ 0.,  1.]])
+    >>> toMatrix(A_op, columns = 1, out = np.zeros((2, 2), dtype = int))
+    array([[1, 0],
+           [0, 1]])
 
     See Also
     --------
@@ -100,10 +220,127 @@ def toMatrix(O, sparse = False):
     toScipyLinearOperator : Convert a LinearOperator to the SciPy version
         of a LinearOperator.
     '''
+    if dtype is None:
+        dtype = np.float64
+
+    if sparse and out is not None:
+        raise ValueError("A sparse matrix cannot be written into out.")
+
+    n = O.shape[1]
+    step = __blockColumns(O, dtype, columns, memory)
+    blocks = [(a, min(a + step, n)) for a in range(0, n, step)]
+
+    ## Operators that know their matrix, such as block operators, skip the
+    ## identity.
+    S = O._toSparse(dtype)
+    if S is NotImplemented:
+        if pattern is None:
+            pattern = O._sparsity()
+        if pattern is not NotImplemented:
+            S = __probe(O, sp.csc_matrix(pattern, dtype = bool), dtype)
+
+    if S is not NotImplemented:
+        if sparse:
+            return S.tocsr()
+        if out is None and len(blocks) == 1:
+            return S.toarray()
+
+        S = S.tocsc()
+        form = lambda a, b: S[:, a:b].toarray()
+    else:
+        form = partial(__identityColumns, O, dtype, sparse)
+
+    mapper = map if executor is None else executor.map
+
     if sparse:
-        I = sp.eye(O.shape[1])
+        if len(blocks) == 1:
+            return form(0, n)
+
+        return sp.hstack(list(mapper(lambda ab: form(*ab), blocks)),
+                format = 'csr')
+
+    if out is None and len(blocks) == 1:
+        return form(0, n)
+
+    if out is None:
+        out = np.empty(O.shape, dtype = O.result_type(dtype))
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode = 'w+',
+                dtype = O.result_type(dtype), shape = O.shape)
+    elif out.shape != O.shape:
+        raise ValueError("Output of shape {} cannot hold the matrix of "
+                         "LinearOperator {}.".format(out.shape, O.shape))
+
+    def write(ab):
+        a, b = ab
+        out[:, a:b] = form(a, b)
+
+    list(mapper(write, blocks))
+
+    return out
+
+
+def __colorColumns(pattern):
+    ''' Groups the columns of a CSC pattern such that no two columns of a
+    group share a row. Returns the group of each column. '''
+
+    ## Columns sharing a row are neighbours.
+    graph = (pattern.T.dot(pattern)).tocsr()
+
+    colors = np.full(pattern.shape[1], -1, dtype = np.intp)
+    for j in range(pattern.shape[1]):
+        taken = colors[graph.indices[graph.indptr[j]:graph.indptr[j + 1]]]
+        used = np.zeros(len(taken) + 1, dtype = bool)
+        used[taken[(taken >= 0) & (taken < len(used))]] = True
+        colors[j] = np.argmin(used)
+
+    return colors
+
+
+def __probe(O, pattern, dtype):
+    ''' The sparse matrix of O with the given pattern, from one application
+    of O to a probe per group of structurally orthogonal columns. '''
+
+    colors = __colorColumns(pattern)
+    groups = colors.max() + 1 if len(colors) else 0
+
+    probes = np.zeros((O.shape[1], groups), dtype = dtype, order = 'F')
+    probes[np.arange(O.shape[1]), colors] = 1
+
+    Y = np.asarray(O(probes)).reshape(O.shape[0], groups)
+
+    ## Entry (i, j) is the only one of its group in row i.
+    rows, cols = pattern.nonzero()
+    S = sp.csr_matrix((Y[rows, colors[cols]], (rows, cols)), shape = O.shape)
+    S.eliminate_zeros()
+
+    return S
+
+
+def __blockColumns(O, dtype, columns, memory):
+    ''' The number of columns of the identity applied at a time. '''
+
+    if columns is None and memory is not None:
+        ## One column of the identity and one of the result.
+        size = O.shape[1] * np.dtype(dtype).itemsize + \
+                O.shape[0] * np.dtype(O.result_type(dtype)).itemsize
+        columns = memory // size
+
+    if columns is None:
+        return O.shape[1]
+
+    return int(min(max(columns, 1), O.shape[1]))
+
+
+def __identityColumns(O, dtype, sparse, a, b):
+    ''' O applied to the columns a to b of the identity. '''
+
+    if sparse:
+        I = sp.eye(O.shape[1], b - a, -a, dtype = dtype, format = 'csc')
     else:
-        I = np.eye(O.shape[1]).T ## Turn into Fortran ordering.
+        ## In Fortran ordering, as the columns are the inputs.
+        I = np.zeros((O.shape[1], b - a), dtype = dtype, order = 'F')
+        I[np.arange(a, b), np.arange(b - a)] = 1
 
     return O(I)
 
@@ -112,7 +349,7 @@ def toMatrix(O, sparse = False):
 #  Scipy  #
 ###########
 
-def toScipyLinearOperator(O, dtype = np.float):
+def toScipyLinearOperator(O, dtype = None):
     ''' Converts a LinearOperator into a scipy.sparse.linalg.LinearOperator
 
     Scipy comes with come handy functions for calculating properties of a
@@ -123,10 +360,20 @@ def toScipyLinearOperator(O, dtype = np.float):
     work with the composition functions provided by the PyOp package while
     still being able to utilise these SciPy functions.
 
+    The SciPy operator applies O to a whole block of vectors in one call,
+    through `matmat` and `rmatmat`, so block methods such as
+    scipy.sparse.linalg.lobpcg make one call to O per iteration. SciPy
+    versions before 1.4 have no `rmatmat` and apply the adjoint per vector.
+
     Parameters
     ----------
     O : LinearOperator
         The LinearOperator to convert into the Scipy format.
+    dtype : numpy.dtype, optional
+        The dtype SciPy reports for the operator. The None default is the
+        dtype of O applied to float64 inputs, ``O.result_type(numpy.float64)``.
+        Operators that do not declare their dtype are applied once to a
+        vector of zeros to find it.
 
     Returns
     -------
@@ -155,6 +402,29 @@ def toScipyLinearOperator(O, dtype = np.float):
     toMatrix : Convert a LinearOperator to a matrix.
     toLinearOperator : Convert a matrix to a LinearOperator.
     '''
-    return linalg.LinearOperator(O.shape, O._forward, O._adjoint,
-            dtype=dtype)
+    if dtype is None:
+        dtype = __resultDtype(O)
+
+    try:
+        adjoint = O.T
+    except MissingAdjoint:
+        adjoint = None
+
+    ## rmatmat was added in SciPy 1.4; older versions apply the adjoint one
+    ## vector at a time.
+    blocks = {'matmat' : O}
+    if hasattr(linalg.LinearOperator, 'rmatmat'):
+        blocks['rmatmat'] = adjoint
+
+    return linalg.LinearOperator(O.shape, O, adjoint, dtype = dtype, **blocks)
+
+
+def __resultDtype(O):
+    ''' The dtype of O applied to float64 inputs. '''
+
+    ## Plain operators without a dtype may wrap functions that change the
+    ## type, such as FFTs.
+    if O.dtype is None and type(O) is LinearOperator:
+        return O(np.zeros(O.shape[1])).dtype
 
+    return O.result_type(np.float64)
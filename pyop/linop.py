@@ -26,6 +26,26 @@ The following are all valid ways to call/apply the operator on an input
 - ``A.dot(x)``
 - ``A*x``
 
+The result can also be written into an existing array with
+``A(x, out=y)``. Operators that can compute directly into ``y`` do so;
+all others copy their result into it.
+
+Operators keep the precision of their input: a float32 input gives a
+float32 (or complex64) result. The ``dtype`` attribute holds the dtype of
+an operator's coefficients, and ``A.result_type(x.dtype)`` reports the
+dtype of ``A(x)`` without applying the operator. Both are carried through
+sums, products and transposes.
+
+Products built by ``A * B`` remember their factors ``A`` and ``B``, so
+sums and block operators can evaluate a shared factor once: ``A + A*B`` is
+applied as ``A(x + B(x))``, and ``vstack([D1*F, D2*F])`` applies ``F``
+once. Factors are shared when they are the same operator or compare equal.
+
+Operators built by the same structured constructor compare equal when they
+are built from equal data, such as the vectors of two :func:`.diag`
+operators or the kernels of two convolutions, as do products of equal
+factors. Other operators are equal when they share their functions.
+
 ``LinearOperators`` also define the string method, and can be directly
 used with ``str``.
 '''
@@ -37,11 +57,16 @@ from pyop.error import (
 ## For __pow__
 from itertools import repeat
 from functools import reduce
-from operator import mul
+from operator import mul, add, sub
 
 ## Check for __scaledmul__
 from numbers import Number
 
+import numpy as np
+import scipy.sparse
+
+from pyop.utilities import promoteDtype
+
 ## Uses NumPy style docstrings: http://goo.gl/xd873p
 class LinearOperator(object):
     ''' LinearOperators for performing transformations without matrices.
@@ -55,12 +80,18 @@ class LinearOperator(object):
         the functional representation of a linear transform.
     adjoint : function, optional
         the adjoint of a linear transformation in functional form.
+    dtype : numpy.dtype, optional
+        the dtype of the coefficients of the transformation. The None
+        default means the operator has no coefficients of its own, and
+        results have the dtype of the input.
 
     Attributes
     ----------
     shape : int, int
         a pair representing the rows/columns of this transformation, if it
         were in matrix form.
+    dtype : numpy.dtype or None
+        the dtype of the coefficients of the transformation.
     T : LinearOperator
         the transpose/adjoint of the current operator (if defined).
 
@@ -75,7 +106,7 @@ class LinearOperator(object):
     array([1, 2, 3, 4])
     '''
 
-    def __init__(self, shape, forward, adjoint=None):
+    def __init__(self, shape, forward, adjoint=None, dtype=None):
 
         self._forward = forward
 
@@ -94,12 +125,55 @@ class LinearOperator(object):
 
         self._shape = shape
 
+        self._dtype = None if dtype is None else np.dtype(dtype)
+
+        ## The left and right factors of a generic product.
+        self._product = None
+
 
     @property
     def shape(self):
         return self._shape
 
 
+    @property
+    def dtype(self):
+        return self._dtype
+
+
+    def result_type(self, dtype):
+        ''' The dtype of applying this operator to an input of dtype.
+
+        See :func:`~pyop.utilities.promoteDtype` for the rule.
+
+        Parameters
+        ----------
+        dtype : numpy.dtype
+            the dtype of the input.
+
+        Returns
+        -------
+        numpy.dtype
+            the dtype of the result.
+        '''
+        return promoteDtype(dtype, self._dtype)
+
+
+    @staticmethod
+    def _commonDtype(*dtypes):
+        ''' The dtype of coefficients formed from coefficients of dtypes.
+
+        None entries (operators without coefficients) are ignored, and None
+        is returned when all entries are None.
+        '''
+        dtypes = [d for d in dtypes if d is not None]
+
+        if not dtypes:
+            return None
+
+        return np.result_type(*dtypes)
+
+
     @staticmethod
     def __missingAdjoint(_): # pylint: disable=W0613
         raise MissingAdjoint()
@@ -123,8 +197,15 @@ class LinearOperator(object):
         if self._adjoint is LinearOperator.__missingAdjoint:
             raise MissingAdjoint()
 
+        if self._product is not None:
+            left, right = self._product
+            try:
+                return right.T * left.T
+            except MissingAdjoint:
+                pass
+
         return LinearOperator(self._shape[::-1],
-                self._adjoint, self._forward)
+                self._adjoint, self._forward, self._dtype)
 
 
     ########################
@@ -153,7 +234,7 @@ class LinearOperator(object):
             raise HighOrderTensor(shape)
 
 
-    def __call__(self, x):
+    def __call__(self, x, out=None):
 
         ## Don't do the calculation if the shape makes no sense.
         x_shape = LinearOperator.__upgradeShapeToMatrix(x.shape)
@@ -162,7 +243,16 @@ class LinearOperator(object):
             raise InnerDimensionMismatch(self._shape, x.shape)
 
         ## Actually do the calculation.
-        result = self._forward(x)
+        if out is None:
+            result = self._forward(x)
+        else:
+            if out.shape != (self._shape[0],) + x.shape[1:]:
+                raise DimensionMismatch(
+                        "Output of shape {} cannot hold the result of "
+                        "LinearOperator {} applied to input of shape {}."
+                        .format(out.shape, self._shape, x.shape))
+
+            result = self._forwardInto(x, out)
 
         result_shape = LinearOperator.__upgradeShapeToMatrix(result.shape)
 
@@ -175,6 +265,16 @@ class LinearOperator(object):
         return result
 
 
+    def _forwardInto(self, x, out):
+        ''' Applies the operator to x, writing the result into out.
+
+        Subclasses that can compute directly into an existing array override
+        this function. By default the result is computed and then copied.
+        '''
+        out[...] = self._forward(x)
+        return out
+
+
     ## Numpy 1.9 will allow overriding dot.
     #def __numpy_ufunc__(self, ufunc, method, i, inputs, **kwargs):
 
@@ -186,18 +286,159 @@ class LinearOperator(object):
         if not LinearOperator.__checkSameDims(self, other):
             raise AllDimensionMismatch(self, other)
 
+        summed = LinearOperator.__structuredSum(self, other)
+        if summed is NotImplemented:
+            summed = LinearOperator.__factoredSum(self, other, add)
+        if summed is not NotImplemented:
+            return summed
+
         return LinearOperator(self._shape,
                 lambda x: self(x) + other(x),
-                lambda x: self.T(x) + other.T(x))
+                lambda x: self.T(x) + other.T(x),
+                LinearOperator._commonDtype(self._dtype, other._dtype))
 
 
     def __sub__(self, other):
         if not LinearOperator.__checkSameDims(self, other):
             raise AllDimensionMismatch(self, other)
 
+        summed = LinearOperator.__structuredSum(self, -other)
+        if summed is NotImplemented:
+            summed = LinearOperator.__factoredSum(self, other, sub)
+        if summed is not NotImplemented:
+            return summed
+
         return LinearOperator(self._shape,
                 lambda x: self(x) - other(x),
-                lambda x: self.T(x) - other.T(x))
+                lambda x: self.T(x) - other.T(x),
+                LinearOperator._commonDtype(self._dtype, other._dtype))
+
+
+    @staticmethod
+    def __structuredSum(a, b):
+        summed = a._add(b)
+        if summed is NotImplemented:
+            summed = b._radd(a)
+
+        return summed
+
+
+    @staticmethod
+    def __factoredSum(a, b, combine):
+        ''' combine(a, b) with a factor shared by a and b taken out of the
+        sum, or NotImplemented if they share none. '''
+
+        a_left, a_right = a._product or (None, None)
+        b_left, b_right = b._product or (None, None)
+
+        def identity(n):
+            return LinearOperator((n, n), lambda x: x, lambda x: x)
+
+        ## L*B + L*C = L*(B + C) and B*R + C*R = (B + C)*R
+        if a_left is not None and b_left is not None:
+            if a_left == b_left:
+                return a_left * combine(a_right, b_right)
+            if a_right == b_right:
+                return combine(a_left, b_left) * a_right
+
+        ## A + A*B = A*(I + B) and A + B*A = (I + B)*A
+        if b_left is not None:
+            if a == b_left:
+                return a * combine(identity(a.shape[1]), b_right)
+            if a == b_right:
+                return combine(identity(a.shape[0]), b_left) * a
+
+        if a_left is not None:
+            if b == a_left:
+                return b * combine(a_right, identity(b.shape[1]))
+            if b == a_right:
+                return combine(a_left, identity(b.shape[0])) * b
+
+        return NotImplemented
+
+
+    def _add(self, other):
+        ''' Structural simplification of ``self + other``.
+
+        Subclasses that know a closed form for their sum with another
+        operator override this function. Returning ``NotImplemented`` falls
+        back to the generic sum.
+        '''
+        return NotImplemented
+
+
+    def _radd(self, other):
+        ''' Structural simplification of ``other + self``.
+
+        The reflected version of :meth:`_add`, only consulted when
+        ``other._add(self)`` returned ``NotImplemented``.
+        '''
+        return NotImplemented
+
+
+    def _blockDiag(self, other):
+        ''' Structural simplification of ``blockDiag([self, other])``.
+
+        Subclasses of the same family that can be applied as one operator
+        along the diagonal, such as diagonal operators, override this
+        function. Returning ``NotImplemented`` keeps the blocks separate.
+        '''
+        return NotImplemented
+
+
+    def _toSparse(self, dtype):
+        ''' The matrix of the operator as a scipy.sparse matrix, for inputs
+        of dtype.
+
+        Subclasses that know their matrix in closed form override this
+        function, which :func:`~pyop.convert.toMatrix` uses instead of
+        applying the operator to an identity. Returning ``NotImplemented``
+        falls back to applying the operator.
+
+        Products whose factors all know their matrices are the sparse
+        product of those matrices, multiplied in the order the factors are
+        applied.
+        '''
+        if self._product is None:
+            return NotImplemented
+
+        matrix = None
+        for f in reversed(self._chain()):
+            S = f._toSparse(dtype if matrix is None else matrix.dtype)
+            if S is NotImplemented:
+                return NotImplemented
+
+            matrix = S if matrix is None else S.dot(matrix)
+
+        return matrix
+
+
+    def _chain(self):
+        ''' The factors of a chain of generic products, left to right. '''
+
+        if self._product is None:
+            return [self]
+
+        left, right = self._product
+        return left._chain() + right._chain()
+
+
+    def _sparsity(self):
+        ''' The sparsity pattern of the matrix of the operator, as a boolean
+        scipy.sparse matrix set wherever the matrix may be nonzero.
+
+        :func:`~pyop.convert.toMatrix` uses the pattern to form the matrix
+        from a few applications of the operator. Subclasses with a known
+        footprint override this function, and products combine the patterns
+        of their factors. Returning ``NotImplemented`` means the pattern is
+        unknown.
+        '''
+        if self._product is not None:
+            left, right = [f._sparsity() for f in self._product]
+            if left is not NotImplemented and right is not NotImplemented:
+                return left.dot(right)
+
+        return NotImplemented
 
 
     def dot(self, other):
@@ -220,7 +461,22 @@ class LinearOperator(object):
     def __scaledmul__(self, other):
         return LinearOperator(self.shape,
                 lambda x: self(other*x),
-                lambda x: self.T(other*x))
+                lambda x: self.T(other*x),
+                LinearOperator._scaledDtype(self._dtype, other))
+
+
+    @staticmethod
+    def _scaledDtype(dtype, scalar):
+        ''' The coefficient dtype of an operator of dtype scaled by scalar.
+
+        Python real scalars do not change the dtype, as they do not change
+        the dtype of NumPy arrays they multiply.
+        '''
+        if isinstance(scalar, (complex, np.generic)):
+            return LinearOperator._commonDtype(dtype,
+                    np.asarray(scalar).dtype)
+
+        return dtype
 
 
     def __mul__(self, other):
@@ -231,13 +487,43 @@ class LinearOperator(object):
             raise InnerDimensionMismatch(self, other)
 
         if isinstance(other, LinearOperator):
-            return LinearOperator((self._shape[0], other._shape[1]),
+            ## Give structured operators a chance to simplify the product
+            ## before falling back to the generic composition.
+            composed = self._compose(other)
+            if composed is NotImplemented:
+                composed = other._rcompose(self)
+            if composed is not NotImplemented:
+                return composed
+
+            product = LinearOperator((self._shape[0], other._shape[1]),
                     lambda x: self(other(x)),
-                    lambda x: other.T(self.T(x)))
+                    lambda x: other.T(self.T(x)),
+                    LinearOperator._commonDtype(self._dtype, other._dtype))
+            product._product = (self, other)
+            return product
         else:
             return self(other)
 
 
+    def _compose(self, other):
+        ''' Structural simplification of ``self * other``.
+
+        Subclasses that know a closed form for their product with another
+        operator override this function. Returning ``NotImplemented`` falls
+        back to the generic composition.
+        '''
+        return NotImplemented
+
+
+    def _rcompose(self, other):
+        ''' Structural simplification of ``other * self``.
+
+        The reflected version of :meth:`_compose`, only consulted when
+        ``other._compose(self)`` returned ``NotImplemented``.
+        '''
+        return NotImplemented
+
+
     def __rmul__(self, other):
         if isinstance(other, Number):
             return self.__scaledmul__(other)
@@ -256,7 +542,8 @@ class LinearOperator(object):
     def __neg__(self):
         return LinearOperator(self._shape,
                 lambda x: self(-x),
-                lambda x: self.T(-x))
+                lambda x: self.T(-x),
+                self._dtype)
 
 
     def __pos__(self):
@@ -268,7 +555,10 @@ class LinearOperator(object):
     ##################
 
     def __copy__(self):
-        return LinearOperator(self._shape, self._forward, self._adjoint)
+        copy = LinearOperator(self._shape, self._forward, self._adjoint,
+                self._dtype)
+        copy._product = self._product
+        return copy
 
 
     def __repr__(self):
@@ -284,10 +574,48 @@ class LinearOperator(object):
     #  Equality  #
     ##############
 
+    def _structure(self):
+        ''' The data defining this operator, which operators of the same
+        type compare for equality, or None if the operator is only defined
+        by its functions. Products are defined by their factors. '''
+        return self._product
+
+
+    @staticmethod
+    def _sameStructure(a, b):
+        ''' If the defining data a and b are equal. '''
+
+        if isinstance(a, LinearOperator) or isinstance(b, LinearOperator):
+            return a is b or (isinstance(a, LinearOperator)
+                              and isinstance(b, LinearOperator) and a == b)
+
+        if isinstance(a, (tuple, list)):
+            return isinstance(b, (tuple, list)) and len(a) == len(b) and \
+                    all(LinearOperator._sameStructure(u, v)
+                        for u, v in zip(a, b))
+
+        if scipy.sparse.issparse(a) or scipy.sparse.issparse(b):
+            return scipy.sparse.issparse(a) and scipy.sparse.issparse(b) \
+                    and a.shape == b.shape and a.dtype == b.dtype \
+                    and (a != b).nnz == 0
+
+        if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+            return np.shape(a) == np.shape(b) and \
+                    np.result_type(a) == np.result_type(b) and \
+                    np.array_equal(a, b)
+
+        return bool(a == b)
+
+
     def __eq__(self, other):
         if self._shape != other._shape:
             return False
 
+        if type(self) is type(other) and self._dtype == other._dtype:
+            mine, theirs = self._structure(), other._structure()
+            if mine is not None and theirs is not None:
+                return LinearOperator._sameStructure(mine, theirs)
+
         if self._forward != other._forward:
             return False
 
@@ -3,10 +3,24 @@ from .matrix_operators import (
         , ones
         , eye
         , select
+        , permute
         , diag
+        , diagStack
+        , kron
+        , lowrank
     )
 
-from .convolution import convolve, gradient
+from .reorder import reverse, roll, transpose
+
+from .convolution import (
+        convolve,
+        convolveNormal,
+        decimate,
+        upsample,
+        gradient
+    )
+
+from .circulant import circulant, toeplitz
 
 from .fft import (
         fft,
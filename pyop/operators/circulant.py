@@ -0,0 +1,342 @@
+'''
+The functions below create circulant and Toeplitz operators from their
+defining vectors alone. Both are applied in O(n log n) as a product in the
+Fourier domain: a circulant matrix is diagonalized by the DFT, and a
+Toeplitz matrix is the top left corner of a circulant matrix of about
+twice its size.
+
+Real inputs to real operators use real transforms. As for the FFT
+operators, the transforms come from scipy.fft when it is available.
+'''
+
+import numpy as np
+
+from numbers import Integral
+
+from pyop import LinearOperator, promoteDtype
+from pyop.operators.fft import fftlib
+
+from scipy.misc import doccer
+
+
+docdict = {
+## The see also section.
+'circulant' : "circulant : Matrix free circulant matrix.",
+'toeplitz' : "toeplitz : Matrix free Toeplitz matrix.",
+'convolve' : "pyop.operators.convolve : Convolution with a kernel.",
+    }
+
+docfill = doccer.filldoc(docdict)
+
+
+def __fastLength(n):
+    ''' A length of at least n for which the FFT is fast. '''
+
+    try:
+        return fftlib.next_fast_len(n)
+    except AttributeError: # numpy.fft
+        return n
+
+
+def __coefficients(v):
+    ''' v as an array of floating point type, at its own precision. '''
+
+    v = np.asarray(v)
+    if v.ndim != 1:
+        raise ValueError("The defining vector must be a 1-D array.")
+
+    return v.astype(np.result_type(v.dtype, np.float32), copy = False)
+
+
+@docfill
+def circulant(c):
+    ''' Create a LinearOperator that emulates a circulant matrix.
+
+    The operator is the matrix ``scipy.linalg.circulant(c)``, whose first
+    column is c and whose every other column is the previous one rotated by
+    one. Only c and its spectrum are stored.
+
+    The eigenvalues of a circulant matrix are the DFT of c, so the result is
+    a :class:`CirculantOperator`: its inverse ``C**-1``, powers, products
+    and sums with other circulant operators are again circulant operators
+    computed on the eigenvalues alone.
+
+    Parameters
+    ----------
+    c : 1-D array
+        The first column of the matrix.
+
+    Returns
+    -------
+    CirculantOperator
+        The circulant matrix as a LinearOperator.
+
+    See Also
+    --------
+    %(toeplitz)s
+    %(convolve)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import circulant
+    >>> C = circulant(np.array([1., 2., 3.]))
+    >>> C(np.array([1., 0., 0.]))
+    array([ 1.,  2.,  3.])
+    >>> np.allclose((C**-1)(C(np.array([1., 2., 4.]))), [1., 2., 4.])
+    True
+    '''
+    return CirculantOperator(__coefficients(c))
+
+
+@docfill
+def toeplitz(c, r = None):
+    ''' Create a LinearOperator that emulates a Toeplitz matrix.
+
+    The operator is the matrix ``scipy.linalg.toeplitz(c, r)``, constant
+    along its diagonals. It is applied as the top left corner of a
+    circulant matrix with at least ``len(c) + len(r) - 1`` columns, so only
+    the two vectors and one spectrum are stored.
+
+    Parameters
+    ----------
+    c : 1-D array
+        The first column of the matrix.
+    r : 1-D array, optional
+        The first row of the matrix. As in scipy.linalg.toeplitz, ``r[0]`` is
+        ignored. The None default makes the matrix Hermitian, ``r =
+        conj(c)``.
+
+    Returns
+    -------
+    ToeplitzOperator
+        The Toeplitz matrix as a LinearOperator.
+
+    See Also
+    --------
+    %(circulant)s
+    %(convolve)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import toeplitz
+    >>> from pyop import toMatrix
+    >>> T = toeplitz(np.array([1., 2., 3.]), np.array([1., 4.]))
+    >>> np.round(toMatrix(T), 10)
+    array([[ 1.,  4.],
+           [ 2.,  1.],
+           [ 3.,  2.]])
+    '''
+    c = __coefficients(c)
+    r = np.conj(c) if r is None else __coefficients(r)
+
+    return ToeplitzOperator(c, r, __fastLength(len(c) + len(r) - 1))
+
+
+class CirculantOperator(LinearOperator):
+    ''' A circulant LinearOperator. Created by :func:`circulant`.
+
+    Parameters
+    ----------
+    c : 1-D array
+        The first column of the matrix.
+
+    Attributes
+    ----------
+    eigenvalues : 1-D array
+        The eigenvalues of the matrix, the DFT of c. The eigenvector of the
+        k-th eigenvalue is the k-th Fourier mode.
+    '''
+
+    def __init__(self, c):
+
+        self._c = c
+        self._real = c.dtype.kind != 'c'
+
+        spectrum = CirculantOperator._spectrum(c, len(c))
+
+        super(CirculantOperator, self).__init__((len(c), len(c)),
+                CirculantOperator._applier(spectrum, len(c), len(c),
+                    self._real),
+                CirculantOperator._applier(np.conj(spectrum), len(c),
+                    len(c), self._real),
+                c.dtype)
+
+
+    @staticmethod
+    def _spectrum(c, size):
+        ''' The spectrum of the circulant matrix of size whose first column
+        starts with c. Only the nonnegative frequencies are kept for real c.
+        '''
+        if c.dtype.kind == 'c':
+            return fftlib.fft(c, size)
+
+        return fftlib.rfft(c, size)
+
+
+    @staticmethod
+    def _applier(spectrum, size, rows, real):
+        ''' The function multiplying its (zero padded) input by the
+        circulant matrix of size with spectrum, keeping the first rows.
+        With real set, spectrum only holds the nonnegative frequencies of a
+        real matrix. '''
+
+        coefficients = spectrum.real.dtype if real else spectrum.dtype
+
+        def apply(x):
+            if real and x.dtype.kind != 'c':
+                x_hat = fftlib.rfft(x, size, axis = 0)
+                res = fftlib.irfft(x_hat * CirculantOperator._column(
+                    spectrum, x_hat), size, axis = 0)
+            else:
+                full = CirculantOperator._full(spectrum, size) if real \
+                        else spectrum
+                x_hat = fftlib.fft(x, size, axis = 0)
+                res = fftlib.ifft(x_hat * CirculantOperator._column(
+                    full, x_hat), size, axis = 0)
+
+            return res[:rows].astype(promoteDtype(x.dtype, coefficients),
+                    copy = False)
+
+        return apply
+
+
+    @staticmethod
+    def _column(spectrum, x_hat):
+        ''' The spectrum shaped and typed to multiply x_hat. '''
+
+        spectrum = spectrum.astype(x_hat.dtype, copy = False)
+        return spectrum.reshape((-1,) + (1,) * (x_hat.ndim - 1))
+
+
+    @staticmethod
+    def _full(spectrum, size):
+        ''' The full spectrum of size from the spectrum of a real matrix. '''
+
+        full = np.empty(size, dtype = spectrum.dtype)
+        full[:len(spectrum)] = spectrum
+        ## The negative frequencies of a real signal are conjugates.
+        full[len(spectrum):] = np.conj(spectrum[1:size - len(spectrum) + 1]
+                [::-1])
+        return full
+
+
+    @property
+    def eigenvalues(self):
+        return fftlib.fft(self._c)
+
+
+    @property
+    def T(self):
+        if self._real:
+            c = np.roll(self._c[::-1], 1)
+        else:
+            c = np.conj(np.roll(self._c[::-1], 1))
+
+        return CirculantOperator(c)
+
+
+    def _structure(self):
+        return (self._c,)
+
+
+    @staticmethod
+    def _fromEigenvalues(eigenvalues, dtype):
+        ''' The circulant operator with eigenvalues, keeping the precision
+        of coefficients of dtype. '''
+
+        dtype = np.promote_types(dtype, np.float32)
+        c = fftlib.ifft(eigenvalues)
+        if dtype.kind != 'c':
+            c = c.real
+
+        return CirculantOperator(c.astype(dtype, copy = False))
+
+
+    def _compose(self, other):
+        if isinstance(other, CirculantOperator):
+            return CirculantOperator._fromEigenvalues(
+                    self.eigenvalues * other.eigenvalues,
+                    LinearOperator._commonDtype(self._c.dtype,
+                        other._c.dtype))
+
+        return NotImplemented
+
+
+    def _add(self, other):
+        if isinstance(other, CirculantOperator):
+            return CirculantOperator(self._c + other._c)
+
+        return NotImplemented
+
+
+    def __scaledmul__(self, other):
+        return CirculantOperator(other * self._c)
+
+
+    def __neg__(self):
+        return CirculantOperator(-self._c)
+
+
+    def __pow__(self, power):
+        if not isinstance(power, Integral):
+            return NotImplemented
+
+        eigenvalues = self.eigenvalues
+        if power < 0 and not np.all(eigenvalues):
+            raise ValueError("A singular circulant operator cannot be "
+                             "raised to a negative power.")
+
+        return CirculantOperator._fromEigenvalues(eigenvalues ** int(power),
+                self._c.dtype)
+
+
+class ToeplitzOperator(LinearOperator):
+    ''' A Toeplitz LinearOperator. Created by :func:`toeplitz`.
+
+    Parameters
+    ----------
+    c : 1-D array
+        The first column of the matrix.
+    r : 1-D array
+        The first row of the matrix, whose first element is ignored.
+    size : int
+        The size of the circulant matrix the operator is embedded into, at
+        least ``len(c) + len(r) - 1``.
+    '''
+
+    def __init__(self, c, r, size):
+
+        if size < len(c) + len(r) - 1:
+            raise ValueError("The circulant embedding is too small.")
+
+        self._c = c
+        self._r = r
+        self._size = size
+
+        ## The first column of the circulant matrix holding the Toeplitz
+        ## matrix in its top left corner.
+        dtype = np.result_type(c, r)
+        embedding = np.zeros(size, dtype = dtype)
+        embedding[:len(c)] = c
+        embedding[size - len(r) + 1:] = r[:0:-1]
+
+        spectrum = CirculantOperator._spectrum(embedding, size)
+        real = dtype.kind != 'c'
+
+        super(ToeplitzOperator, self).__init__((len(c), len(r)),
+                CirculantOperator._applier(spectrum, size, len(c), real),
+                CirculantOperator._applier(np.conj(spectrum), size, len(r),
+                    real),
+                dtype)
+
+
+    @property
+    def T(self):
+        column = np.conj(np.concatenate([self._c[:1], self._r[1:]]))
+        return ToeplitzOperator(column, np.conj(self._c), self._size)
+
+
+    def _structure(self):
+        return (self._c, self._r)
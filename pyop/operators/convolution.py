@@ -1,16 +1,27 @@
 import numpy as np
 import scipy.signal as signal
+import scipy.sparse
 from scipy.misc import central_diff_weights
 
 from functools import reduce, partial
 from operator import mul
 
-from itertools import repeat
+from itertools import repeat, product
 
-from pyop import LinearOperator, matvectorized
+from pyop import LinearOperator, matvectorized, promoteDtype
 
 import six
 
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError: # Python 2 without the futures backport.
+    ProcessPoolExecutor = ()
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python before 3.8.
+    shared_memory = None
+
 def __flip(a):
     ''' Flips all the dimensions of an array '''
 
@@ -22,7 +33,154 @@ def __flip(a):
     return a
 
 
-def convolve(kernel, shape, order='C'):
+def __toPrecisionOf(img, kernel):
+    ''' Casts the kernel so the convolution keeps the precision of img. '''
+
+    return kernel.astype(promoteDtype(img.dtype, kernel.dtype), copy = False)
+
+
+def __shifts(kernel):
+    ''' The nonzero weights of a kernel with the offset into the input that
+    each one reads in a "same" convolution. '''
+
+    return [(kernel[q], tuple((k - 1) // 2 - i
+                              for i, k in six.moves.zip(q, kernel.shape)))
+            for q in zip(*np.nonzero(kernel))]
+
+
+def __shiftSame(img, shifts, sign):
+    ''' Accumulates shifted, scaled copies of img into one output.
+
+    With sign 1 this is the "same" convolution, y[i] += w x[i + offset];
+    with sign -1 it is its adjoint, scattering the other way. '''
+
+    dtype = promoteDtype(img.dtype, *(np.asarray(w).dtype for w, _ in shifts))
+    res = np.zeros(img.shape, dtype = dtype)
+
+    for w, offset in shifts:
+        src = tuple(slice(max(sign*o, 0), n + min(sign*o, 0))
+                    for o, n in six.moves.zip(offset, img.shape))
+        dst = tuple(slice(max(-sign*o, 0), n + min(-sign*o, 0))
+                    for o, n in six.moves.zip(offset, img.shape))
+
+        if any(s.start >= s.stop for s in src):
+            continue
+
+        res[dst] += dtype.type(w) * img[src]
+
+    return res
+
+
+def __tiles(shape, tiles):
+    ''' Splits an array shape into (almost) equal, nonempty tiles. Each tile
+    is a tuple of (start, stop) pairs. '''
+
+    if isinstance(tiles, int):
+        tiles = (tiles, ) * len(shape)
+
+    if len(tiles) != len(shape):
+        raise ValueError("tiles and shape must have the same dimensions.")
+
+    if not all(isinstance(t, int) and t > 0 for t in tiles):
+        raise ValueError("tiles must contain positive integers.")
+
+    bounds = []
+    for n, t in six.moves.zip(shape, tiles):
+        edges = sorted(set(n * i // t for i in six.moves.range(t + 1)))
+        bounds.append(list(six.moves.zip(edges[:-1], edges[1:])))
+
+    return list(product(*bounds))
+
+
+def __convTile(img, kernel, start, tile):
+    ''' One tile of a "same" convolution.
+
+    The tile reads a halo of the input around it, sized by the kernel, so
+    that the tiles together are exactly the convolution of the whole
+    image. '''
+
+    x_slc = tuple(slice(max(a + s - k + 1, 0), min(b + s, n))
+                  for (a, b), s, k, n in six.moves.zip(
+                      tile, start, kernel.shape, img.shape))
+    y_slc = tuple(slice(a + s - xs.start, b + s - xs.start)
+                  for (a, b), s, xs in six.moves.zip(tile, start, x_slc))
+
+    return signal.convolve(img[x_slc], kernel, 'full')[y_slc]
+
+
+def __sharedTile(in_name, out_name, shape, in_dtype, out_dtype, kernel,
+        start, tile):
+    ''' Convolves one tile between two shared memory blocks. Run in a
+    worker process. '''
+
+    src = shared_memory.SharedMemory(name = in_name)
+    dst = shared_memory.SharedMemory(name = out_name)
+    try:
+        img = np.ndarray(shape, dtype = in_dtype, buffer = src.buf)
+        res = np.ndarray(shape, dtype = out_dtype, buffer = dst.buf)
+        res[tuple(slice(a, b) for a, b in tile)] = __convTile(
+                img, kernel, start, tile)
+        del img, res
+    finally:
+        src.close()
+        dst.close()
+
+
+def __tiledSame(img, kernel, start, tiles, executor):
+    ''' A "same" convolution computed tile by tile, in parallel if an
+    executor is given. '''
+
+    kernel = __toPrecisionOf(img, kernel)
+    dtype = np.result_type(img, kernel)
+
+    if isinstance(executor, ProcessPoolExecutor):
+        if shared_memory is None:
+            ## Worker processes could only be sent copies of the image, so
+            ## the tiles are convolved here instead.
+            return __tiledSame(img, kernel, start, tiles, None)
+
+        ## Worker processes read the image and write their tile through
+        ## shared memory, so only the tile bounds are sent to them.
+        src = shared_memory.SharedMemory(create = True,
+                size = max(img.nbytes, 1))
+        dst = shared_memory.SharedMemory(create = True,
+                size = max(img.size * dtype.itemsize, 1))
+        try:
+            shared = np.ndarray(img.shape, dtype = img.dtype, buffer = src.buf)
+            shared[...] = img
+            del shared
+
+            list(executor.map(partial(__sharedTile, src.name, dst.name,
+                img.shape, img.dtype, dtype, kernel, start), tiles))
+
+            shared = np.ndarray(img.shape, dtype = dtype, buffer = dst.buf)
+            res = shared.copy()
+            del shared
+        finally:
+            src.close()
+            src.unlink()
+            dst.close()
+            dst.unlink()
+
+        return res
+
+    res = np.empty(img.shape, dtype = dtype)
+
+    def work(tile):
+        res[tuple(slice(a, b) for a, b in tile)] = __convTile(
+                img, kernel, start, tile)
+
+    if executor is None:
+        for tile in tiles:
+            work(tile)
+    else:
+        list(executor.map(work, tiles))
+
+    return res
+
+
+def convolve(kernel, shape, order='C', sparse_threshold=None, tiles=None,
+        executor=None):
     ''' Convolve two N-dimensional arrays as a LinearOperator.
 
     Note that this only implements the "same" convolution mode seen in other
@@ -32,6 +190,22 @@ def convolve(kernel, shape, order='C'):
     For this operator to work, the number of dimensions in the kernel must
     match the number of fields in the shape tuple.
 
+    Kernels with few nonzeros, such as finite difference stencils, are not
+    passed to scipy. Instead the result is accumulated from one shifted and
+    scaled view of the input per nonzero kernel entry. Each nonzero costs
+    one pass over the image, which is cheaper than a kernel entry of a
+    direct convolution, while an FFT convolution costs about two passes per
+    doubling of the padded image size. The accumulation is used when it
+    costs no more than the FFT.
+
+    Large images can instead be split into tiles, each convolved together
+    with a halo of neighbouring values sized by the kernel, and stitched
+    back into the "same" result. The tiles are processed in parallel by an
+    executor from ``concurrent.futures``. With a ``ProcessPoolExecutor``
+    the image and result are exchanged through shared memory; on Python
+    versions without ``multiprocessing.shared_memory`` the tiles are then
+    convolved serially instead.
+
     Parameters
     ----------
     kernel : ndarray
@@ -47,6 +221,20 @@ def convolve(kernel, shape, order='C'):
         is determined by the underlying format, see the documentation of
         commands that take an order argument.
 
+    sparse_threshold : float, optional
+        The largest fraction of nonzero kernel entries for which the
+        convolution is done by shifted accumulation. Use 0 to always use
+        scipy.signal.convolve and 1 to always accumulate. By default the
+        cheaper of the two is estimated from the number of nonzeros.
+
+    tiles : int or tuple, optional
+        The number of tiles along every dimension, or along each dimension.
+        If given, the convolution is computed tile by tile.
+
+    executor : concurrent.futures.Executor, optional
+        Executes the tiles in parallel. Implies one tile per dimension if
+        `tiles` is not given.
+
     Returns
     -------
     LinearOperator
@@ -55,11 +243,13 @@ def convolve(kernel, shape, order='C'):
     Raises
     ------
     ValueError
-        When the inputs are not the same dimension.
+        When the inputs are not the same dimension or the number of tiles
+        is invalid.
 
     See Also
     --------
     scipy.signal.convolve : The array based version of this operation.
+    convolveNormal : The normal operator ``C.T * C`` of this operator.
     :func:`.fft` : LinearOperator version of fftn.
     :func:`.ifft` : LinearOperator version of ifftn.
 
@@ -85,9 +275,6 @@ def convolve(kernel, shape, order='C'):
         raise ValueError("The order must be 'C', 'F', or 'A'")
 
 
-    vector_length = reduce(mul, shape)
-    op_shape = (vector_length, vector_length)
-
     dim = kernel.ndim
 
     adjoint_kernel = __flip(kernel)
@@ -112,13 +299,675 @@ def convolve(kernel, shape, order='C'):
     mv = matvectorized(shape, order)
 
     def convSame(img, kernel, slc):
-        return signal.convolve(img, kernel, 'full')[slc]
+        return signal.convolve(img, __toPrecisionOf(img, kernel), 'full')[slc]
+
+
+    if tiles is not None or executor is not None:
+        tiled = __tiles(shape, 1 if tiles is None else tiles)
+
+        return ConvolutionOperator(
+            mv(partial(__tiledSame, kernel = kernel,
+                start = tuple(s.start for s in f_slice),
+                tiles = tiled, executor = executor)),
+            mv(partial(__tiledSame, kernel = adjoint_kernel,
+                start = tuple(s.start for s in a_slice),
+                tiles = tiled, executor = executor)),
+            kernel, shape, order)
 
+    if sparse_threshold is None:
+        padded = reduce(mul, (n + k - 1
+                              for n, k in six.moves.zip(shape, kernel.shape)))
+        accumulate = np.count_nonzero(kernel) <= 2 * np.log2(padded)
+    else:
+        accumulate = np.count_nonzero(kernel) <= sparse_threshold * kernel.size
+
+    if accumulate:
+        shifts = __shifts(kernel)
+
+        return ConvolutionOperator(
+            mv(partial(__shiftSame, shifts = shifts, sign = 1)),
+            mv(partial(__shiftSame, shifts = shifts, sign = -1)),
+            kernel, shape, order)
 
     ## The result is square, it preserves shape.
-    return LinearOperator(op_shape,
+    return ConvolutionOperator(
         mv(partial(convSame, kernel = kernel, slc = f_slice)),
-        mv(partial(convSame, kernel = adjoint_kernel, slc = a_slice)))
+        mv(partial(convSame, kernel = adjoint_kernel, slc = a_slice)),
+        kernel, shape, order)
+
+
+def __borderBoxes(shape, kernel_shape):
+    ''' Splits the border of a full convolution into disjoint boxes.
+
+    The border is every index of the "full" output that the "same" slice
+    throws away. Each box is a tuple of (start, stop) pairs in the
+    coordinates of the full output. '''
+
+    full = [n + k - 1 for n, k in six.moves.zip(shape, kernel_shape)]
+    center = [((k - 1) // 2, (k - 1) // 2 + n)
+              for n, k in six.moves.zip(shape, kernel_shape)]
+
+    boxes = []
+    for d in six.moves.range(len(shape)):
+        for a, b in ((0, center[d][0]), (center[d][1], full[d])):
+            if a >= b:
+                continue
+
+            ## Earlier dimensions are restricted to the center so that the
+            ## boxes do not overlap at the corners.
+            boxes.append(tuple(center[:d]) + ((a, b),) +
+                         tuple((0, f) for f in full[d + 1:]))
+
+    return boxes
+
+
+def __normalSame(img, kernel, adjoint_kernel, autocorr, slc, boxes):
+    ''' Applies C.T * C of a "same" convolution to an unvectorized image.
+
+    The autocorrelation gives the normal operator of the "full" convolution.
+    The "same" convolution crops the border of the full result before the
+    adjoint is applied, so the contribution of the border is removed again
+    by only convolving the (thin) regions of the image that produce it. '''
+
+    kernel = __toPrecisionOf(img, kernel)
+    adjoint_kernel = __toPrecisionOf(img, adjoint_kernel)
+
+    res = signal.convolve(img, __toPrecisionOf(img, autocorr), 'full')[slc]
+
+    for box in boxes:
+        ## The part of the image that reaches the box through the kernel.
+        x_slc = tuple(slice(max(a - k + 1, 0), min(b, n))
+                      for (a, b), k, n in six.moves.zip(
+                          box, kernel.shape, img.shape))
+        border = signal.convolve(img[x_slc], kernel, 'full')[tuple(
+            slice(a - s.start, b - s.start)
+            for (a, b), s in six.moves.zip(box, x_slc))]
+
+        ## Push the border back through the adjoint and remove it.
+        back = signal.convolve(border, adjoint_kernel, 'full')
+        r_slc = tuple(slice(max(a - k + 1, 0), min(b, n))
+                      for (a, b), k, n in six.moves.zip(
+                          box, kernel.shape, img.shape))
+        res[r_slc] -= back[tuple(
+            slice(s.start - (a - k + 1), s.stop - (a - k + 1))
+            for (a, _), k, s in six.moves.zip(box, kernel.shape, r_slc))]
+
+    return res
+
+
+def convolveNormal(kernel, shape, order='C', exact=True):
+    ''' The normal operator ``C.T * C`` of a convolution as one operator.
+
+    Applying ``convolve(kernel, shape).T * convolve(kernel, shape)`` runs two
+    convolutions. The normal operator is instead a single convolution with
+    the autocorrelation of the kernel, which scipy performs as one spectral
+    multiply for large inputs. Composing a convolution operator with its own
+    transpose returns this operator automatically.
+
+    The "same" convolution crops its result, so near the edges of the image
+    the normal operator is not exactly a convolution. With `exact` set, the
+    cropped border is convolved separately and removed, which only touches
+    the image within one kernel width of its edges. Without it, the
+    operator is the plain autocorrelation convolution, which is only
+    correct for images that are zero within a kernel width of the edges.
+
+    Parameters
+    ----------
+    kernel : ndarray
+        The kernel of the convolution.
+
+    shape : tuple
+        The shape of the array in non-vector form.
+
+    order = {'C', 'F', 'A'}, optional
+        The order by which the vectorized array is reshaped.
+
+    exact : bool, optional
+        Correct for the zero boundary of the "same" convolution. If False,
+        the border correction is skipped.
+
+    Returns
+    -------
+    ConvolutionNormalOperator
+        A self-adjoint LinearOperator equal to ``C.T * C``.
+
+    Raises
+    ------
+    ValueError
+        When the inputs are not the same dimension.
+
+    See Also
+    --------
+    convolve : The convolution this is the normal operator of.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import convolve, convolveNormal
+    >>> C = convolve(np.array([1., 2.]), (4,))
+    >>> N = convolveNormal(np.array([1., 2.]), (4,))
+    >>> np.allclose(N(np.arange(4.)), C.T(C(np.arange(4.))))
+    True
+    '''
+    if not kernel.ndim == len(shape):
+        raise ValueError("kernel and shape must have "
+                         "the same dimensions.")
+
+    if not order in ('C', 'F', 'A'):
+        raise ValueError("The order must be 'C', 'F', or 'A'")
+
+    vector_length = reduce(mul, shape)
+
+    adjoint_kernel = __flip(kernel)
+    autocorr = signal.convolve(kernel, adjoint_kernel, 'full')
+
+    ## The autocorrelation of a full convolution is centered kernel.shape - 1
+    ## vectors into the result.
+    slc = tuple(slice(k - 1, k - 1 + n)
+                for k, n in six.moves.zip(kernel.shape, shape))
+
+    boxes = __borderBoxes(shape, kernel.shape) if exact else []
+
+    normal = matvectorized(shape, order)(partial(__normalSame,
+        kernel = kernel, adjoint_kernel = adjoint_kernel,
+        autocorr = autocorr, slc = slc, boxes = boxes))
+
+    return ConvolutionNormalOperator(normal, kernel, autocorr, shape, order,
+            exact)
+
+
+class ConvolutionOperator(LinearOperator):
+    ''' A convolution LinearOperator that remembers its kernel.
+
+    Instances are created by :func:`convolve`. Knowing the kernel allows
+    ``C.T * C`` to be replaced by :func:`convolveNormal`.
+    '''
+
+    def __init__(self, forward, adjoint, kernel, shape, order,
+            transposed=False):
+
+        vector_length = reduce(mul, shape)
+        super(ConvolutionOperator, self).__init__(
+                (vector_length, vector_length), forward, adjoint, kernel.dtype)
+
+        self._kernel = kernel
+        self._image_shape = tuple(shape)
+        self._order = order
+        self._transposed = transposed
+
+
+    @property
+    def T(self):
+        return ConvolutionOperator(self._adjoint, self._forward,
+                self._kernel, self._image_shape, self._order,
+                not self._transposed)
+
+
+    def _structure(self):
+        return (self._kernel, self._image_shape, self._order,
+                self._transposed)
+
+
+    def stream(self, x, out=None, chunk_size=65536):
+        ''' Applies a 1D convolution block by block.
+
+        The whole signal is never loaded at once, which allows filtering of
+        signals that do not fit in memory. If `x` is an array (such as an
+        ``np.memmap``), blocks of `chunk_size` outputs are computed by
+        overlap-save, each reading only ``chunk_size + kernel.size - 1``
+        inputs. Any other iterable is treated as a sequence of 1D chunks
+        and filtered by overlap-add, yielding output chunks as soon as they
+        are complete. The transpose of the operator streams the adjoint.
+
+        Parameters
+        ----------
+        x : ndarray or iterable of ndarray
+            The signal to convolve, either whole or as consecutive chunks.
+
+        out : ndarray, optional
+            Array (such as an ``np.memmap``) of the signal length to write
+            the result into.
+
+        chunk_size : int, optional
+            Number of outputs per block when `x` is an array.
+
+        Returns
+        -------
+        ndarray or generator
+            `out` (or a new array) if `x` is an array or `out` is given,
+            otherwise a generator of output chunks.
+
+        Raises
+        ------
+        ValueError
+            If the operator is not 1D or the signal has the wrong length.
+
+        Examples
+        --------
+        >>> import numpy as np
+        >>> from pyop.operators import convolve
+        >>> C = convolve(np.array([1., 1.]), (5,))
+        >>> C.stream(np.arange(5.), chunk_size = 2)
+        array([ 0.,  1.,  3.,  5.,  7.])
+        >>> [list(c) for c in C.stream(iter([np.arange(3.), np.arange(2.)]))]
+        [[0.0, 1.0, 3.0], [2.0, 1.0]]
+        '''
+        if len(self._image_shape) != 1:
+            raise ValueError("Only 1D convolutions can be streamed.")
+
+        n = self._image_shape[0]
+
+        if out is not None and out.shape != (n,):
+            raise ValueError("out must have the length of the signal.")
+
+        ## The adjoint is a convolution with the flipped kernel, offset by
+        ## the other half of the kernel.
+        if self._transposed:
+            kernel = self._kernel[::-1]
+            start = kernel.size // 2
+        else:
+            kernel = self._kernel
+            start = (kernel.size - 1) // 2
+
+        if not isinstance(x, np.ndarray):
+            chunks = self._streamChunks(x, kernel, start)
+            if out is None:
+                return chunks
+
+            pos = 0
+            for c in chunks:
+                out[pos:pos + c.size] = c
+                pos += c.size
+
+            return out
+
+        if x.shape != (n,):
+            raise ValueError("Signal must be 1D with the operator's length.")
+
+        kernel = kernel.astype(self.result_type(x.dtype), copy = False)
+
+        if out is None:
+            out = np.empty(n, dtype = np.result_type(x, kernel))
+
+        ## Overlap-save: each output block only needs the inputs that reach
+        ## it through the kernel.
+        for s in six.moves.range(0, n, chunk_size):
+            e = min(s + chunk_size, n)
+            a = max(s + start - kernel.size + 1, 0)
+            b = min(e + start, n)
+            out[s:e] = signal.convolve(x[a:b], kernel, 'full')[
+                    s + start - a:e + start - a]
+
+        return out
+
+
+    def _streamChunks(self, chunks, kernel, start):
+        ''' Overlap-add over an iterable of chunks. '''
+
+        carry = None
+        consumed = 0
+        emitted = 0
+        skip = start
+
+        for c in chunks:
+            c = np.asarray(c)
+            if c.size == 0:
+                continue
+
+            full = signal.convolve(c,
+                    kernel.astype(self.result_type(c.dtype), copy = False),
+                    'full')
+            if carry is not None:
+                full = full.astype(np.result_type(full, carry), copy = False)
+                full[:kernel.size - 1] += carry
+
+            ## Everything before the end of this chunk is final; the tail
+            ## is added to the next chunk.
+            done, carry = full[:c.size], full[c.size:]
+            consumed += c.size
+
+            drop = min(skip, done.size)
+            done = done[drop:]
+            skip -= drop
+
+            if done.size:
+                emitted += done.size
+                yield done
+
+        if consumed != self._image_shape[0]:
+            raise ValueError("Streamed signal has length {}, expected {}."
+                    .format(consumed, self._image_shape[0]))
+
+        rest = carry[skip:skip + consumed - emitted]
+        if rest.size:
+            yield rest
+
+
+    @staticmethod
+    def _banded(weights, shape, order):
+        ''' The sparse matrix of the "same" convolution of vectorized arrays
+        of shape with a kernel of weights. Only the nonzero weights are
+        stored, one band of the matrix each. '''
+
+        indices = np.arange(reduce(mul, shape)).reshape(shape, order = order)
+        rows, cols = [np.empty(0, dtype = int)], [np.empty(0, dtype = int)]
+        data = [np.empty(0, dtype = weights.dtype)]
+
+        for q in zip(*np.nonzero(weights)):
+            ## y[i] += w x[i + offset], as in the shifted accumulation.
+            offset = [(k - 1) // 2 - i
+                      for i, k in six.moves.zip(q, weights.shape)]
+            src = tuple(slice(max(o, 0), n + min(o, 0))
+                        for o, n in six.moves.zip(offset, shape))
+            dst = tuple(slice(max(-o, 0), n + min(-o, 0))
+                        for o, n in six.moves.zip(offset, shape))
+
+            if any(s.start >= s.stop for s in src):
+                continue
+
+            rows.append(indices[dst].ravel(order))
+            cols.append(indices[src].ravel(order))
+            data.append(np.repeat(weights[q], rows[-1].size))
+
+        return scipy.sparse.coo_matrix((np.concatenate(data),
+            (np.concatenate(rows), np.concatenate(cols))),
+            shape = (indices.size, indices.size))
+
+
+    def _toSparse(self, dtype):
+        if self._order == 'A':
+            return NotImplemented
+
+        S = ConvolutionOperator._banded(
+                self._kernel.astype(self.result_type(dtype), copy = False),
+                self._image_shape, self._order).tocsr()
+
+        return S.T if self._transposed else S
+
+
+    def _sparsity(self):
+        if self._order == 'A':
+            return NotImplemented
+
+        S = ConvolutionOperator._banded(self._kernel != 0, self._image_shape,
+                self._order).tocsr()
+
+        return S.T if self._transposed else S
+
+
+    def _compose(self, other):
+        if (self._transposed
+                and isinstance(other, ConvolutionOperator)
+                and not other._transposed
+                and self._image_shape == other._image_shape
+                and self._order == other._order
+                and np.array_equal(self._kernel, other._kernel)):
+            return convolveNormal(self._kernel, self._image_shape,
+                    self._order)
+
+        return NotImplemented
+
+
+class ConvolutionNormalOperator(LinearOperator):
+    ''' The normal operator ``C.T * C`` of a convolution that remembers its
+    kernel.
+
+    Instances are created by :func:`convolveNormal`. Knowing the kernel
+    allows the operator to be formed as a sparse matrix in closed form.
+    '''
+
+    def __init__(self, normal, kernel, autocorr, shape, order, exact):
+
+        vector_length = reduce(mul, shape)
+        super(ConvolutionNormalOperator, self).__init__(
+                (vector_length, vector_length), normal, normal, kernel.dtype)
+
+        self._kernel = kernel
+        self._autocorr = autocorr
+        self._image_shape = tuple(shape)
+        self._order = order
+        self._exact = exact
+
+
+    @property
+    def T(self):
+        return self
+
+
+    def _structure(self):
+        return (self._kernel, self._image_shape, self._order, self._exact)
+
+
+    def _toSparse(self, dtype):
+        if self._order == 'A':
+            return NotImplemented
+
+        dtype = self.result_type(dtype)
+
+        if not self._exact:
+            return ConvolutionOperator._banded(
+                    self._autocorr.astype(dtype, copy = False),
+                    self._image_shape, self._order).tocsr()
+
+        S = ConvolutionOperator._banded(self._kernel.astype(dtype,
+            copy = False), self._image_shape, self._order).tocsr()
+
+        return S.T.dot(S).tocsr()
+
+
+    def _sparsity(self):
+        if self._order == 'A':
+            return NotImplemented
+
+        if not self._exact:
+            return ConvolutionOperator._banded(self._autocorr != 0,
+                    self._image_shape, self._order).tocsr()
+
+        S = ConvolutionOperator._banded(self._kernel != 0, self._image_shape,
+                self._order).tocsr()
+
+        return S.T.dot(S).tocsr()
+
+
+def __addWindow(out, a, starts):
+    ''' Adds a[starts:starts + out.shape] to out, where a is zero outside of
+    its bounds. '''
+
+    src = tuple(slice(max(s, 0), min(s + l, n))
+                for s, l, n in six.moves.zip(starts, out.shape, a.shape))
+
+    if any(sl.start >= sl.stop for sl in src):
+        return
+
+    dst = tuple(slice(sl.start - s, sl.stop - s)
+                for sl, s in six.moves.zip(src, starts))
+    out[dst] += a[src]
+
+
+def __polyphases(kernel, shape, factor):
+    ''' Splits a decimating convolution into its polyphase components.
+
+    Output i of the decimated "same" convolution is
+
+        y[i] = sum_q kernel[q] x[i*m + start - q].
+
+    Splitting q = p*m + r by its phase r gives a convolution of the phase
+    r kernel, kernel[r::m], with the polyphase component x[d::m] of the
+    input, where start - r = c*m + d. Each phase is returned as the tuple
+    (kernel slice, input slice, c). '''
+
+    phases = []
+    for r in np.ndindex(*factor):
+        k_slc = tuple(slice(ri, None, m) for ri, m in six.moves.zip(r, factor))
+        if any(ri >= k for ri, k in six.moves.zip(r, kernel.shape)):
+            continue
+
+        c, d = zip(*(divmod((k - 1) // 2 - ri, m)
+                     for ri, m, k in six.moves.zip(r, factor, kernel.shape)))
+        if any(di >= n for di, n in six.moves.zip(d, shape)):
+            continue
+
+        x_slc = tuple(slice(di, None, m) for di, m in six.moves.zip(d, factor))
+        phases.append((kernel[k_slc], x_slc, c))
+
+    return phases
+
+
+def __decimateForward(img, phases, out_shape):
+    res = np.zeros(out_shape, dtype = promoteDtype(img.dtype, *(
+        k.dtype for k, _, _ in phases)))
+
+    for k, x_slc, c in phases:
+        __addWindow(res, signal.convolve(img[x_slc],
+            k.astype(res.dtype, copy = False), 'full'), c)
+
+    return res
+
+
+def __decimateAdjoint(img, phases, shape):
+    res = np.zeros(shape, dtype = promoteDtype(img.dtype, *(
+        k.dtype for k, _, _ in phases)))
+
+    ## Each phase writes a distinct polyphase component (a view) of the
+    ## result.
+    for k, x_slc, c in phases:
+        __addWindow(res[x_slc], signal.convolve(img,
+            __flip(k).astype(res.dtype, copy = False), 'full'),
+            tuple(k_d - 1 - c_d for k_d, c_d in six.moves.zip(k.shape, c)))
+
+    return res
+
+
+def decimate(kernel, shape, factor, order='C'):
+    ''' Convolve and then keep every factor-th sample, as a LinearOperator.
+
+    This is the same operator as a "same" mode :func:`convolve` followed by
+    a :func:`~pyop.operators.select` of the samples at multiples of
+    `factor`, but only the retained outputs are computed. The convolution is
+    split into polyphase components, each a convolution of a subsampled
+    input with a subsampled kernel, so the cost is divided by the product
+    of the factors.
+
+    The adjoint is the matching upsampling operator, see :func:`upsample`.
+
+    Parameters
+    ----------
+    kernel : ndarray
+        The kernel by which to do the convolving.
+
+    shape : tuple
+        The shape of the array in non-vector form before decimation.
+
+    factor : int or tuple
+        The decimation factor, either for all dimensions or one per
+        dimension.
+
+    order = {'C', 'F', 'A'}, optional
+        The order by which the vectorized array is reshaped.
+
+    Returns
+    -------
+    LinearOperator
+        A LinearOperator from the vectorized array of `shape` to the
+        vectorized, decimated array.
+
+    Raises
+    ------
+    ValueError
+        When the inputs are not the same dimension or a factor is not a
+        positive integer.
+
+    See Also
+    --------
+    convolve : The convolution before the decimation.
+    upsample : The adjoint of this operator.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import decimate
+    >>> D = decimate(np.array([1., 1.]), (6,), 2)
+    >>> D(np.arange(6.))
+    array([ 0.,  3.,  7.])
+    '''
+    if not kernel.ndim == len(shape):
+        raise ValueError("kernel and shape must have "
+                         "the same dimensions.")
+
+    if not order in ('C', 'F', 'A'):
+        raise ValueError("The order must be 'C', 'F', or 'A'")
+
+    if isinstance(factor, int):
+        factor = (factor, ) * len(shape)
+
+    if len(factor) != len(shape):
+        raise ValueError("factor and shape must have the same dimensions.")
+
+    if not all(isinstance(m, int) and m > 0 for m in factor):
+        raise ValueError("factor must contain positive integers.")
+
+    shape = tuple(shape)
+    out_shape = tuple(-(-n // m) for n, m in six.moves.zip(shape, factor))
+
+    phases = __polyphases(kernel, shape, factor)
+
+    return LinearOperator((reduce(mul, out_shape), reduce(mul, shape)),
+        matvectorized(shape, order)(partial(__decimateForward,
+            phases = phases, out_shape = out_shape)),
+        matvectorized(out_shape, order)(partial(__decimateAdjoint,
+            phases = phases, shape = shape)),
+        kernel.dtype)
+
+
+def upsample(kernel, shape, factor, order='C'):
+    ''' Insert zeros between samples and correlate, as a LinearOperator.
+
+    This is the adjoint of :func:`decimate` with the same arguments: every
+    sample of the coarse input is placed at a multiple of `factor` in an
+    array of `shape`, which is then correlated with the kernel. It is
+    computed by the same polyphase components, so the zeros are never
+    multiplied. The adjoint of this operator is the decimation.
+
+    Parameters
+    ----------
+    kernel : ndarray
+        The (interpolation) kernel.
+
+    shape : tuple
+        The shape of the array in non-vector form after upsampling.
+
+    factor : int or tuple
+        The upsampling factor, either for all dimensions or one per
+        dimension.
+
+    order = {'C', 'F', 'A'}, optional
+        The order by which the vectorized array is reshaped.
+
+    Returns
+    -------
+    LinearOperator
+        A LinearOperator from the vectorized coarse array to the
+        vectorized array of `shape`.
+
+    Raises
+    ------
+    ValueError
+        When the inputs are not the same dimension or a factor is not a
+        positive integer.
+
+    See Also
+    --------
+    decimate : The adjoint of this operator.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import upsample
+    >>> U = upsample(np.array([1., 1.]), (6,), 2)
+    >>> U(np.array([1., 2., 3.]))
+    array([ 1.,  2.,  2.,  3.,  3.,  0.])
+    '''
+    return decimate(kernel, shape, factor, order).T
 
 
 def gradient(derivative, points, shape, step=None, order='C'):
@@ -1,15 +1,25 @@
 '''
 The functions below create LinearOperator versions of fftn and the like,
 operating on vectorized versions of an input array.
+
+The transforms keep the precision of their input: float32 and complex64
+inputs give complex64 results. When available, scipy.fft is used as it
+computes single precision transforms natively.
 '''
 
 import numpy as np
 
+try:
+    import scipy.fft as fftlib
+except ImportError:
+    import numpy.fft as fftlib
+
 ## For calculating shape of FFT LinearOperators
 from functools import reduce
 from operator import mul
 
-from pyop import matvectorized, LinearOperator
+from pyop import matvectorized, LinearOperator, promoteDtype
+from pyop.operators.matrix_operators import permute
 
 
 from scipy.misc import doccer
@@ -102,21 +112,24 @@ def __fourier(f, dual, shape, s, order):
     positive = lambda x: 0 if x < 0 else x
     column_deficit = lambda d: positive(shape[d] - s[d])
 
+    as_complex = lambda x, res: res.astype(
+            promoteDtype(x.dtype, np.complex64), copy = False)
+
     @matvectorized(shape, order)
     def forward(x):
-        return f(x, s = s)
+        return as_complex(x, f(x, s = s))
 
 
     @matvectorized(s, order)
     def adjoint(x):
-        res = dual(x)
+        res = as_complex(x, dual(x))
         res_pad = np.pad(res,
             [(0, column_deficit(d)) for d, _ in enumerate(shape)],
             'constant', constant_values = 0)
         return res_pad[tuple(slice(None, d) for d in shape)]
 
 
-    return LinearOperator((codomain, domain), forward, adjoint)
+    return LinearOperator((codomain, domain), forward, adjoint, np.complex64)
 
 
 @docfill
@@ -164,17 +177,12 @@ def fft(shape, s = None, order = 'C'):
     >>> from pyop.operators import fft
     >>> a = np.array([0, 1, 2, 3, 2, 1, 0])
     >>> F = fft(a.shape)
-    >>> F(a)
-    array([ 9.00000000+0.j        , -4.54891734-2.19064313j,
-            0.19202147+0.24078731j, -0.14310413-0.62698017j,
-           -0.14310413+0.62698017j,  0.19202147-0.24078731j,
-           -4.54891734+2.19064313j])
-    >>> np.real((F.T*F)(a))
-    array([  2.95002118e-15,   1.00000000e+00,   2.00000000e+00,
-             3.00000000e+00,   2.00000000e+00,   1.00000000e+00,
-            -1.90323947e-15])
+    >>> np.allclose(F(a), np.fft.fftn(a))
+    True
+    >>> np.allclose((F.T*F)(a), a)
+    True
     '''
-    return __fourier(np.fft.fftn, np.fft.ifftn, shape, s, order)
+    return __fourier(fftlib.fftn, fftlib.ifftn, shape, s, order)
 
 
 @docfill
@@ -223,17 +231,12 @@ def ifft(shape, s = None, order = 'C'):
     >>> from pyop.operators import ifft
     >>> a = np.array([0, 1, 2, 3, 2, 1, 0])
     >>> F = ifft(a.shape)
-    >>> F(a)
-    array([ 1.28571429+0.j        , -0.64984533+0.31294902j,
-            0.02743164-0.03439819j, -0.02044345+0.0895686j ,
-           -0.02044345-0.0895686j ,  0.02743164+0.03439819j,
-           -0.64984533-0.31294902j])
-    >>> np.real((F.T*F)(a))
-    array([  2.78943535e-15,   1.00000000e+00,   2.00000000e+00,
-             3.00000000e+00,   2.00000000e+00,   1.00000000e+00,
-            -2.05391260e-15])
+    >>> np.allclose(F(a), np.fft.ifftn(a))
+    True
+    >>> np.allclose((F.T*F)(a), a)
+    True
     '''
-    return __fourier(np.fft.ifftn, np.fft.fftn, shape, s, order)
+    return __fourier(fftlib.ifftn, fftlib.fftn, shape, s, order)
 
 
 ################
@@ -256,13 +259,11 @@ def __fouriershift(f, shape, axes, order):
                 raise ValueError("Out of bound axes. {}".format(axes))
 
 
-    domain = reduce(mul, shape)
+    ## The shift only moves elements, so it is the permutation that shifts
+    ## the indices of the elements.
+    indices = np.arange(reduce(mul, shape)).reshape(shape, order = order)
 
-    @matvectorized(shape, order)
-    def forward(x):
-        return f(x, axes = axes)
-
-    return LinearOperator((domain, domain), forward, forward)
+    return permute(np.ravel(f(indices, axes = axes), order = order))
 
 
 @docfill
@@ -285,7 +286,7 @@ def fftshift(shape, axes = None, order = 'C'):
 
     Returns
     -------
-    LinearOperator
+    PermutationOperator
         A LinearOperator performing the fftshift.
 
     See Also
@@ -302,17 +303,9 @@ def fftshift(shape, axes = None, order = 'C'):
     >>> from pyop.operators import fft, fftshift
     >>> a = np.array([0, 1, 2, 3, 2, 1, 0])
     >>> F = fft(a.shape)
-    >>> F(a)
-    array([ 9.00000000+0.j        , -4.54891734-2.19064313j,
-            0.19202147+0.24078731j, -0.14310413-0.62698017j,
-           -0.14310413+0.62698017j,  0.19202147-0.24078731j,
-           -4.54891734+2.19064313j])
     >>> S = fftshift(a.shape)
-    >>> (S*F)(a)
-    array([-0.14310413+0.62698017j,  0.19202147-0.24078731j,
-           -4.54891734+2.19064313j,  9.00000000+0.j        ,
-           -4.54891734-2.19064313j,  0.19202147+0.24078731j,
-           -0.14310413-0.62698017j])
+    >>> np.allclose((S*F)(a), np.fft.fftshift(np.fft.fftn(a)))
+    True
     '''
     return __fouriershift(np.fft.fftshift, shape, axes, order)
 
@@ -337,7 +330,7 @@ def ifftshift(shape, axes = None, order = 'C'):
 
     Returns
     -------
-    LinearOperator
+    PermutationOperator
         A LinearOperator performing the fftshift.
 
     See Also
@@ -354,17 +347,9 @@ def ifftshift(shape, axes = None, order = 'C'):
     >>> from pyop.operators import ifft, ifftshift
     >>> a = np.array([0, 1, 2, 3, 2, 1, 0])
     >>> F = ifft(a.shape)
-    >>> F(a)
-    array([ 1.28571429+0.j        , -0.64984533+0.31294902j,
-            0.02743164-0.03439819j, -0.02044345+0.0895686j ,
-           -0.02044345-0.0895686j ,  0.02743164+0.03439819j,
-           -0.64984533-0.31294902j])
     >>> S = ifftshift(a.shape)
-    >>> (S*F)(a)
-    array([-0.02044345+0.0895686j , -0.02044345-0.0895686j ,
-            0.02743164+0.03439819j, -0.64984533-0.31294902j,
-            1.28571429+0.j        , -0.64984533+0.31294902j,
-            0.02743164-0.03439819j])
+    >>> np.allclose((S*F)(a), np.fft.ifftshift(np.fft.ifftn(a)))
+    True
     '''
     return __fouriershift(np.fft.ifftshift, shape, axes, order)
 
@@ -449,8 +434,8 @@ def fftwrap(O, shape, s = None, shift = 'none', order = 'C'):
     >>> a = np.array([1, 1, 1, 1])
     >>> I = LinearOperator((4, 4), lambda x: x, lambda x: x)
     >>> F = fftwrap(I, (4,))
-    >>> F(a)
-    array([ 1.+0.j,  1.+0.j,  1.+0.j,  1.+0.j])
+    >>> np.allclose(F(a), a)
+    True
     '''
     return __fourierwrap(fft, O, shape, s, shift, order)
 
@@ -506,7 +491,7 @@ def ifftwrap(O, shape, s = None, shift = 'none', order = 'C'):
     >>> a = np.array([1, 1, 1, 1])
     >>> I = LinearOperator((4, 4), lambda x: x, lambda x: x)
     >>> F = ifftwrap(I, (4,))
-    >>> F(a)
-    array([ 1.+0.j,  1.+0.j,  1.+0.j,  1.+0.j])
+    >>> np.allclose(F(a), a)
+    True
     '''
     return __fourierwrap(ifft, O, shape, s, shift, order)
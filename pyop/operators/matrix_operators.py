@@ -4,10 +4,13 @@ and attempt to match tbe basic building blocks in NumPy and other numerical
 packages.
 """
 import numpy as np
+import scipy.sparse
 
-from functools import partial
+from functools import partial, reduce
+from numbers import Number
+from operator import mul
 
-from pyop import LinearOperator, matmat
+from pyop import LinearOperator, matmat, promoteDtype, toMatrix
 
 from scipy.misc import doccer
 
@@ -22,7 +25,11 @@ docdict = {
     'ones' : "ones : Matrix free version of the ones matrix.",
     'eye' : "eye : Matrix free version of the eye matrix.",
     'diag' : "diag : Convert a 1D array to matrix free diagonal matrix.",
-    'select' : "select : Select certain rows out of a matrix."
+    'select' : "select : Select certain rows out of a matrix.",
+    'permute' : "permute : Reorder the rows of a matrix.",
+    'diagStack' : "diagStack : Stack diagonal operators sharing one input.",
+    'kron' : "kron : Kronecker product of LinearOperators.",
+    'lowrank' : "lowrank : Matrix free low rank matrix U V^H."
     }
 
 docfill = doccer.filldoc(docdict)
@@ -33,13 +40,17 @@ def zeros(shape):
 
     Returns a new LinearOperator that emulates a matrix filled with zeros.
 
+    The result is a :class:`ZeroOperator`, which is recognized when it is
+    composed with or added to other operators and by the block operators,
+    so that no work is done on its behalf.
+
     Parameters
     ----------
     %(shape)s
 
     Returns
     -------
-    LinearOperator
+    ZeroOperator
         A functional version of numpy.zeros()
 
     See Also
@@ -61,28 +72,96 @@ def zeros(shape):
     array([[ 0.,  0.],
            [ 0.,  0.]])
     '''
+    return ZeroOperator(shape)
+
+
+class ZeroOperator(LinearOperator):
+    ''' A LinearOperator that is known to be zero.
+
+    Products with a zero operator are zero operators of the product shape,
+    and zero operators vanish from sums, both without applying the other
+    operator. Created by :func:`zeros`.
+    '''
+
+    rank = 0
+
+    def __init__(self, shape):
+
+        def zeroInput(x, op_shape):
+            return np.zeros((op_shape, x.shape[1]), dtype = x.dtype)
+
+        super(ZeroOperator, self).__init__(shape,
+                matmat(partial(zeroInput, op_shape = shape[0])),
+                matmat(partial(zeroInput, op_shape = shape[1])))
+
+
+    @property
+    def T(self):
+        return ZeroOperator(self.shape[::-1])
+
+
+    def _structure(self):
+        return ()
+
+
+    def _compose(self, other):
+        return ZeroOperator((self.shape[0], other.shape[1]))
+
+
+    def _rcompose(self, other):
+        return ZeroOperator((other.shape[0], self.shape[1]))
+
+
+    def _add(self, other):
+        return other
+
+
+    def _radd(self, other):
+        return other
+
+
+    def __scaledmul__(self, other):
+        return self
+
+
+    def __neg__(self):
+        return self
 
-    def zeroInput(x, op_shape):
-        return np.zeros((op_shape, x.shape[1]))
 
-    return LinearOperator(shape,
-            matmat(partial(zeroInput, op_shape = shape[0])),
-            matmat(partial(zeroInput, op_shape = shape[1])))
+    def __pos__(self):
+        return self
+
+
+    def _toSparse(self, dtype):
+        return scipy.sparse.coo_matrix(self.shape,
+                dtype = self.result_type(dtype))
+
+
+    def _sparsity(self):
+        return self._toSparse(np.bool_).astype(bool)
 
 
 @docfill
-def ones(shape):
+def ones(shape, broadcast=False):
     ''' PyOp version of ones array function (only 2D).
 
     Returns a new LinearOperator that emulates a matrix filled with ones.
 
+    Every row of the result is the sum of the input's rows. The result is a
+    :class:`RankOneOperator`, which never tiles the sums: they are written
+    into every row of the output, or into ``out`` when the operator is
+    called as ``O(x, out=y)``. With `broadcast` set, a read-only broadcast
+    view of the sums is returned instead of a full-size array.
+
     Parameters
     ----------
     %(shape)s
+    broadcast : bool, optional
+        Return a read-only broadcast view instead of a new array.
 
     Returns
     -------
-    LinearOperator
+    RankOneOperator
         A functional version of numpy.ones()
 
     See Also
@@ -104,15 +183,183 @@ def ones(shape):
     array([[ 1.,  1.],
            [ 1.,  1.]])
     '''
+    return RankOneOperator(shape, broadcast = broadcast)
+
+
+class RankOneOperator(LinearOperator):
+    ''' A LinearOperator of the form ``scale * outer(left, right)``.
+
+    The operator is applied as ``scale * left * right.dot(x)`` without ever
+    forming the matrix. A `left` or `right` of None stands for a vector of
+    ones, so :func:`ones` stores no vectors at all. Products with other
+    rank one operators and with :func:`diag` operators are again rank one
+    operators.
+
+    Parameters
+    ----------
+    shape : pair
+        The shape of the LinearOperator (if it were a matrix).
+    left : 1-D array, optional
+        The column vector, of length ``shape[0]``.
+    right : 1-D array, optional
+        The row vector, of length ``shape[1]``.
+    scale : number, optional
+        A scalar multiplying the operator.
+    broadcast : bool, optional
+        If ``left`` is None, return a read-only broadcast view instead of a
+        new array.
+
+    Attributes
+    ----------
+    rank : int
+        The rank of the operator, 1.
+    '''
+
+    rank = 1
+
+    def __init__(self, shape, left=None, right=None, scale=1,
+            broadcast=False):
+
+        if left is not None and len(left) != shape[0]:
+            raise ValueError("left must have length shape[0].")
+
+        if right is not None and len(right) != shape[1]:
+            raise ValueError("right must have length shape[1].")
+
+        self._left = left
+        self._right = right
+        self._scale = scale
+        self._broadcast = broadcast
+
+        conj = lambda v: None if v is None else np.conj(v)
+        dtype = LinearOperator._scaledDtype(LinearOperator._commonDtype(
+            *[v.dtype for v in (left, right) if v is not None]), scale)
+
+        super(RankOneOperator, self).__init__(shape,
+                partial(RankOneOperator._outer, rows = shape[0], left = left,
+                    right = right, scale = scale, broadcast = broadcast,
+                    dtype = dtype),
+                partial(RankOneOperator._outer, rows = shape[1],
+                    left = conj(right), right = conj(left),
+                    scale = np.conj(scale), broadcast = broadcast,
+                    dtype = dtype),
+                dtype)
+
+
+    @staticmethod
+    def _outer(x, rows, left, right, scale, broadcast, out=None,
+            dtype=None):
+        ''' Computes scale * left * right.dot(x), or writes it into out.
+
+        The vectors are cast to the precision of x, see
+        :func:`~pyop.utilities.promoteDtype`.
+        '''
+        res_dtype = promoteDtype(x.dtype, dtype)
+
+        if right is None:
+            s = x.sum(axis = 0)
+        else:
+            s = x.T.dot(right.astype(res_dtype, copy = False))
 
-    def sumColumns(x, op_shape):
-        column_sums = np.sum(x, axis = 0)
-        return np.tile(column_sums, (op_shape, 1))
+        ## Sparse inputs sum to a (1, k) matrix.
+        s = np.asarray(s).reshape(x.shape[1:]).astype(res_dtype, copy = False)
+        s = res_dtype.type(scale) * s
 
-    return LinearOperator(shape,
-            matmat(partial(sumColumns, op_shape = shape[0])),
-            matmat(partial(sumColumns, op_shape = shape[1])))
+        if left is not None:
+            left = left.astype(res_dtype, copy = False)
+            left = left.reshape((rows,) + (1,) * len(x.shape[1:]))
+            return np.multiply(left, s, out = out)
 
+        if out is not None:
+            out[...] = s
+            return out
+
+        res_shape = (rows,) + x.shape[1:]
+        if broadcast:
+            return np.broadcast_to(s, res_shape)
+
+        res = np.empty(res_shape, dtype = s.dtype)
+        res[...] = s
+        return res
+
+
+    def _forwardInto(self, x, out):
+        return RankOneOperator._outer(x, self.shape[0], self._left,
+                self._right, self._scale, self._broadcast, out, self.dtype)
+
+
+    @property
+    def T(self):
+        conj = lambda v: None if v is None else np.conj(v)
+
+        return RankOneOperator(self.shape[::-1], conj(self._right),
+                conj(self._left), np.conj(self._scale), self._broadcast)
+
+
+    def _structure(self):
+        return (self._left, self._right, self._scale)
+
+
+    def _toSparse(self, dtype):
+        ## Every entry is nonzero, so the matrix is stored densely.
+        dtype = self.result_type(dtype)
+        left, right = [np.ones(n, dtype = dtype) if v is None else
+                       v.astype(dtype, copy = False)
+                       for v, n in zip((self._left, self._right), self.shape)]
+
+        return scipy.sparse.csr_matrix(
+                dtype.type(self._scale) * np.outer(left, right))
+
+
+    @staticmethod
+    def _dotVectors(a, b, n):
+        ''' a.dot(b) where None stands for a vector of n ones. '''
+
+        if a is None and b is None:
+            return n
+        if a is None:
+            return np.sum(b)
+        if b is None:
+            return np.sum(a)
+        return a.dot(b)
+
+
+    def _compose(self, other):
+        if isinstance(other, RankOneOperator):
+            inner = RankOneOperator._dotVectors(self._right, other._left,
+                    self.shape[1])
+
+            return RankOneOperator((self.shape[0], other.shape[1]),
+                    self._left, other._right,
+                    self._scale * other._scale * inner, self._broadcast)
+
+        if isinstance(other, DiagonalOperator):
+            right = other._v if self._right is None else \
+                    other._v * self._right
+
+            return RankOneOperator(self.shape, self._left, right,
+                    self._scale, self._broadcast)
+
+        return NotImplemented
+
+
+    def _rcompose(self, other):
+        if isinstance(other, DiagonalOperator):
+            left = other._v if self._left is None else other._v * self._left
+
+            return RankOneOperator(self.shape, left, self._right,
+                    self._scale, self._broadcast)
+
+        return NotImplemented
+
+
+    def __scaledmul__(self, other):
+        return RankOneOperator(self.shape, self._left, self._right,
+                other * self._scale, self._broadcast)
+
+
+    def __neg__(self):
+        return self.__scaledmul__(-1)
 
 
 @docfill
@@ -127,7 +374,7 @@ def eye(shape):
 
     Returns
     -------
-    LinearOperator
+    EyeOperator
         A functional version of numpy.eye()
 
     See Also
@@ -149,18 +396,93 @@ def eye(shape):
     array([[ 1.,  0.],
            [ 0.,  1.]])
     '''
-    def identity(x, op_shape):
-        m, n = op_shape
-        p, q = x.shape
+    return EyeOperator(shape)
+
+
+class EyeOperator(LinearOperator):
+    ''' A LinearOperator that emulates the (possibly rectangular) identity.
+
+    A square identity disappears from products: ``I * A`` and ``A * I`` are
+    ``A`` itself. A wide identity truncates its input and returns a view of
+    it, while a tall identity pads its input with zeros, either into a new
+    array or into ``out``. Created by :func:`eye`.
+    '''
+
+    def __init__(self, shape):
+        super(EyeOperator, self).__init__(shape,
+                partial(EyeOperator._embed, rows = shape[0]),
+                partial(EyeOperator._embed, rows = shape[1]))
+
+
+    @staticmethod
+    def _embed(x, rows, out=None):
+        ''' Truncates x or pads x with zeros to the number of rows. '''
+
+        n = x.shape[0]
+
+        if scipy.sparse.issparse(x):
+            x = x.tocsr()
+            if rows > n:
+                return scipy.sparse.vstack(
+                        [x, scipy.sparse.csr_matrix((rows - n, x.shape[1]))])
+
+        if out is None:
+            if rows <= n:
+                return x[:rows]
+
+            out = np.zeros((rows,) + x.shape[1:], dtype = x.dtype)
+            out[:n] = x
+            return out
+
+        k = min(rows, n)
+        out[:k] = x[:k]
+        out[k:] = 0
+        return out
+
+
+    def _forwardInto(self, x, out):
+        return EyeOperator._embed(x, self.shape[0], out)
+
+
+    @property
+    def T(self):
+        if self.shape[0] == self.shape[1]:
+            return self
+
+        return EyeOperator(self.shape[::-1])
+
+
+    def _structure(self):
+        return ()
+
+
+    def _compose(self, other):
+        if self.shape[0] == self.shape[1]:
+            return other
 
-        if m > n:
-            return np.vstack([x, np.zeros((m - p, q))])
-        elif m <= n:
-            return x[:m]
+        ## Truncating then padding is again an identity if nothing of the
+        ## smaller side is lost in between.
+        if (isinstance(other, EyeOperator)
+                and self.shape[1] >= min(self.shape[0], other.shape[1])):
+            return EyeOperator((self.shape[0], other.shape[1]))
 
-    return LinearOperator(shape,
-            matmat(partial(identity, op_shape = shape)),
-            matmat(partial(identity, op_shape = shape[::-1])))
+        return NotImplemented
+
+
+    def _rcompose(self, other):
+        if self.shape[0] == self.shape[1]:
+            return other
+
+        return NotImplemented
+
+
+    def _toSparse(self, dtype):
+        return scipy.sparse.eye(self.shape[0], self.shape[1],
+                dtype = self.result_type(dtype))
+
+
+    def _sparsity(self):
+        return self._toSparse(np.bool_).astype(bool)
 
 
 @docfill
@@ -184,7 +506,7 @@ def select(rows, perm):
 
     Returns
     -------
-    LinearOperator
+    SelectOperator
         A LinearOperator that performs the selection on np.array inputs.
 
     See Also
@@ -206,20 +528,178 @@ def select(rows, perm):
     array([1, 2, 2])
     '''
 
-    @matmat
-    def subset(x):
-        return x[perm]
+    return SelectOperator(rows, perm)
+
+
+class SelectOperator(LinearOperator):
+    ''' A LinearOperator selecting rows of its input. Created by
+    :func:`select`.
+
+    The indices are analyzed once, when the operator is created. The
+    adjoint of a permutation is a gather with the inverse permutation, the
+    adjoint of unique indices is a single scatter, and only indices with
+    duplicates are accumulated, through a sparse matrix built up front.
+    The dtype of the input is preserved.
+    '''
+
+    def __init__(self, rows, perm):
 
-    @matmat
-    def expand(x):
-        ret_shape = (rows, x.shape[1])
+        perm = np.asarray(perm, dtype = np.intp)
 
-        ret = np.zeros(ret_shape)
-        np.add.at(ret, perm, x)
+        self._rows = rows
+        self._perm = perm
 
+        unique = len(np.unique(perm)) == len(perm)
+
+        if unique and len(perm) == rows:
+            inverse = np.empty_like(perm)
+            inverse[perm] = np.arange(len(perm))
+            adjoint = partial(SelectOperator._gather, perm = inverse)
+        elif unique:
+            adjoint = partial(SelectOperator._scatter, rows = rows,
+                    perm = perm)
+        else:
+            accumulate = scipy.sparse.csr_matrix(
+                    (np.ones(len(perm), dtype = bool),
+                        (perm, np.arange(len(perm)))),
+                    shape = (rows, len(perm)))
+            adjoint = accumulate.dot
+
+        super(SelectOperator, self).__init__((len(perm), rows),
+                partial(SelectOperator._gather, perm = perm), adjoint)
+
+
+    @staticmethod
+    def _gather(x, perm):
+        return x[perm]
+
+
+    @staticmethod
+    def _scatter(x, rows, perm):
+        ret = np.zeros((rows,) + x.shape[1:], dtype = x.dtype)
+        ret[perm] = x
         return ret
 
-    return LinearOperator((len(perm), rows), subset, expand)
+
+    def _structure(self):
+        return (self._rows, self._perm)
+
+
+    def _toSparse(self, dtype):
+        n = len(self._perm)
+        return scipy.sparse.csr_matrix(
+                (np.ones(n, dtype = self.result_type(dtype)), self._perm,
+                    np.arange(n + 1)),
+                shape = self.shape)
+
+
+    def _sparsity(self):
+        return self._toSparse(np.bool_).astype(bool)
+
+
+@docfill
+def permute(perm):
+    ''' Reorder the rows of a matrix.
+
+    Row i of the result is row ``perm[i]`` of the input. Unlike
+    :func:`select`, the indices must be a permutation, so both the forward
+    and the adjoint are a single gather (the adjoint with the inverse
+    permutation). Reversing the rows is a view of the input.
+
+    Products of permutations are permutations, and a permutation times its
+    inverse is the identity.
+
+    Parameters
+    ----------
+    perm : list
+        A permutation of ``range(len(perm))``.
+
+    Returns
+    -------
+    PermutationOperator
+        A LinearOperator that reorders np.array inputs.
+
+    Raises
+    ------
+    ValueError
+        If perm is not a permutation.
+
+    See Also
+    --------
+    %(select)s
+    %(eye)s
+
+    Examples
+    --------
+    >>> from pyop.operators import permute
+    >>> import numpy as np
+    >>> P = permute([2, 0, 1])
+    >>> P(np.array([1, 2, 3]))
+    array([3, 1, 2])
+    >>> P.T(np.array([3, 1, 2]))
+    array([1, 2, 3])
+    '''
+    return PermutationOperator(perm)
+
+
+class PermutationOperator(SelectOperator):
+    ''' A :class:`SelectOperator` whose indices are a permutation. Created
+    by :func:`permute`. '''
+
+    def __init__(self, perm, inverse=None):
+
+        perm = np.asarray(perm, dtype = np.intp)
+        n = len(perm)
+
+        if inverse is None:
+            if (perm.min() < 0 or perm.max() >= n
+                    or np.any(np.bincount(perm, minlength = n) != 1)):
+                raise ValueError("perm must be a permutation.")
+
+            inverse = np.empty_like(perm)
+            inverse[perm] = np.arange(n)
+
+        self._rows = n
+        self._perm = perm
+        self._inverse = inverse
+
+        ## Skips the index analysis of SelectOperator, which is not needed
+        ## for a permutation.
+        super(SelectOperator, self).__init__((n, n),
+                PermutationOperator._gatherFunction(perm),
+                PermutationOperator._gatherFunction(inverse))
+
+
+    @staticmethod
+    def _gatherFunction(perm):
+        ''' A gather by perm, or a reversing view if perm reverses. '''
+
+        if perm[0] == len(perm) - 1 and np.all(np.diff(perm) == -1):
+            return PermutationOperator._reverse
+
+        return partial(SelectOperator._gather, perm = perm)
+
+
+    @staticmethod
+    def _reverse(x):
+        return x[::-1]
+
+
+    @property
+    def T(self):
+        return PermutationOperator(self._inverse, self._perm)
+
+
+    def _compose(self, other):
+        if isinstance(other, PermutationOperator):
+            perm = other._perm[self._perm]
+
+            if np.all(perm == np.arange(len(perm))):
+                return EyeOperator(self.shape)
+
+            return PermutationOperator(perm, self._inverse[other._inverse])
+
+        return NotImplemented
 
 
 @docfill
@@ -230,6 +710,11 @@ def diag(v):
     corresponding element of the input vector v. The length of the vector v
     defines the shape of the operator (n by n).
 
+    The result is a :class:`DiagonalOperator`: products, sums, scalings and
+    powers of diagonal operators, including the inverse ``D**-1``, are
+    again diagonal operators computed on the vectors alone. Calling the
+    operator as ``D(x, out=x)`` scales x in place.
+
     Parameters
     ----------
     v : 1-D array
@@ -237,7 +722,7 @@ def diag(v):
 
     Returns
     -------
-    LinearOperator
+    DiagonalOperator
         A LinearOperator that scales np.array inputs.
 
     See Also
@@ -246,6 +731,7 @@ def diag(v):
     %(ones)s
     %(eye)s
     %(select)s
+    %(diagStack)s
 
     Examples
     --------
@@ -257,12 +743,644 @@ def diag(v):
            [ 0.,  2.,  0.,  0.],
            [ 0.,  0.,  3.,  0.],
            [ 0.,  0.,  0.,  4.]])
+    >>> (diag(np.array([1., 2., 4.]))**-1)(np.ones(3))
+    array([ 1.  ,  0.5 ,  0.25])
+    '''
+
+    return DiagonalOperator(v)
+
+
+def _conj(v):
+    ''' The complex conjugate of v, without a copy for real v. '''
+    return np.conj(v) if np.iscomplexobj(v) else v
+
+
+class DiagonalOperator(LinearOperator):
+    ''' A LinearOperator scaling each row of its input. Created by
+    :func:`diag`.
+
+    The adjoint scales by the complex conjugate of the diagonal. Products
+    and sums with other diagonal operators, scalings and (possibly negative
+    or fractional) powers are diagonal operators.
     '''
 
-    @matmat
-    def forwardAdjoint(x):
-        return v[:, np.newaxis] * x
+    def __init__(self, v):
+
+        v = np.asarray(v)
+        if v.ndim != 1:
+            raise ValueError("The diagonal must be a 1-D array.")
+
+        self._v = v
+
+        super(DiagonalOperator, self).__init__((len(v), len(v)),
+                partial(DiagonalOperator._scale, v = v),
+                partial(DiagonalOperator._scale, v = _conj(v)),
+                v.dtype)
+
+
+    @staticmethod
+    def _scale(x, v, out=None):
+        ''' Scales each row of x by v, or writes the result into out. '''
+
+        v = v.astype(promoteDtype(x.dtype, v.dtype), copy = False)
+
+        if scipy.sparse.issparse(x):
+            return x.multiply(v[:, np.newaxis]).tocsr()
+
+        if x.ndim == 2:
+            v = v[:, np.newaxis]
+
+        return np.multiply(v, x, out = out)
+
+
+    def _forwardInto(self, x, out):
+        return DiagonalOperator._scale(x, self._v, out)
+
+
+    @property
+    def T(self):
+        if np.iscomplexobj(self._v):
+            return DiagonalOperator(np.conj(self._v))
+
+        return self
+
+
+    def _structure(self):
+        return (self._v,)
+
+
+    def _compose(self, other):
+        if isinstance(other, DiagonalOperator):
+            return DiagonalOperator(self._v * other._v)
+
+        return NotImplemented
+
+
+    def _add(self, other):
+        if isinstance(other, DiagonalOperator):
+            return DiagonalOperator(self._v + other._v)
+
+        return NotImplemented
+
+
+    def _toSparse(self, dtype):
+        return scipy.sparse.diags(self._v.astype(self.result_type(dtype),
+            copy = False))
+
+
+    def _sparsity(self):
+        return self._toSparse(np.bool_).astype(bool)
+
+
+    def _blockDiag(self, other):
+        if isinstance(other, DiagonalOperator):
+            return DiagonalOperator(np.concatenate([self._v, other._v]))
+
+        return NotImplemented
+
+
+    def __scaledmul__(self, other):
+        return DiagonalOperator(other * self._v)
+
+
+    def __neg__(self):
+        return DiagonalOperator(-self._v)
+
+
+    def __pow__(self, power):
+        if not isinstance(power, Number):
+            return NotImplemented
+
+        v = self._v
+        if power < 0 or power != int(power):
+            if power < 0 and not np.all(v):
+                raise ValueError("A singular diagonal operator cannot be "
+                                 "raised to a negative power.")
+
+            ## Integers cannot be raised to negative powers.
+            if v.dtype.kind not in 'fc':
+                v = v.astype(np.float64)
+
+        return DiagonalOperator(v ** power)
+
+
+@docfill
+def diagStack(maps):
+    ''' Stack diagonal operators sharing one input into one operator.
+
+    The result applies every row of maps to the same input, as
+    ``vstack([diag(m) for m in maps])`` would, but in a single broadcast
+    multiply. The adjoint sums the conjugate-weighted blocks in one pass,
+    and ``S.T * S`` is the diagonal operator of ``sum(abs(maps)**2)``.
+    Multiplying an image by a set of coil sensitivity maps is the typical
+    use.
+
+    Parameters
+    ----------
+    maps : 2-D array
+        The diagonals, one per row. The result has shape
+        ``(maps.size, maps.shape[1])``.
+
+    Returns
+    -------
+    StackedDiagonalOperator
+        The stacked diagonal LinearOperator.
+
+    See Also
+    --------
+    %(diag)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import diagStack
+    >>> S = diagStack(np.array([[1., 2.], [3., 4.]]))
+    >>> S(np.array([1., 1.]))
+    array([ 1.,  2.,  3.,  4.])
+    >>> S.T(np.array([1., 1., 1., 1.]))
+    array([ 4.,  6.])
+    '''
+
+    return StackedDiagonalOperator(maps)
+
+
+class StackedDiagonalOperator(LinearOperator):
+    ''' Diagonal operators stacked vertically, or their adjoint. Created
+    by :func:`diagStack`.
+
+    Parameters
+    ----------
+    maps : 2-D array
+        The diagonals, one per row.
+    transposed : bool, optional
+        Represent the adjoint of the stack instead.
+    '''
+
+    def __init__(self, maps, transposed=False):
+
+        maps = np.asarray(maps)
+        if maps.ndim != 2:
+            raise ValueError("The stacked diagonals must be a 2-D array.")
+
+        self._maps = maps
+        self._transposed = transposed
+
+        spread = partial(StackedDiagonalOperator._spread, maps = maps)
+        gather = partial(StackedDiagonalOperator._gather, maps = maps)
+        shape = (maps.size, maps.shape[1])
+
+        if transposed:
+            super(StackedDiagonalOperator, self).__init__(shape[::-1],
+                    gather, spread, maps.dtype)
+        else:
+            super(StackedDiagonalOperator, self).__init__(shape,
+                    spread, gather, maps.dtype)
+
+
+    @staticmethod
+    def _spread(x, maps, out=None):
+        ''' Scales x by every map, stacking the results. '''
+
+        maps = maps.astype(promoteDtype(x.dtype, maps.dtype), copy = False)
+        shape = maps.shape + x.shape[1:]
+
+        if x.ndim == 2:
+            maps = maps[..., np.newaxis]
+
+        if out is not None and out.flags.c_contiguous:
+            np.multiply(maps, x, out = out.reshape(shape))
+            return out
+
+        res = np.multiply(maps, x)
+        if out is not None:
+            out[...] = res.reshape(out.shape)
+            return out
+
+        return res.reshape((maps.shape[0] * maps.shape[1],) + x.shape[1:])
+
+
+    @staticmethod
+    def _gather(y, maps):
+        ''' Sums the blocks of y scaled by the conjugate maps. '''
+
+        maps = _conj(maps.astype(promoteDtype(y.dtype, maps.dtype),
+            copy = False))
+
+        return np.einsum('kn,kn...->n...', maps,
+                y.reshape(maps.shape + y.shape[1:]))
+
+
+    def _forwardInto(self, x, out):
+        if self._transposed:
+            return super(StackedDiagonalOperator, self)._forwardInto(x, out)
+
+        return StackedDiagonalOperator._spread(x, self._maps, out)
+
+
+    @property
+    def T(self):
+        return StackedDiagonalOperator(self._maps, not self._transposed)
+
+
+    def _structure(self):
+        return (self._maps, self._transposed)
+
+
+    def _compose(self, other):
+        if not isinstance(other, (StackedDiagonalOperator, DiagonalOperator)):
+            return NotImplemented
+
+        if isinstance(other, DiagonalOperator):
+            if self._transposed:
+                return NotImplemented
+
+            return StackedDiagonalOperator(self._maps * other._v)
+
+        ## The normal operator of a stack is diagonal, provided both
+        ## stacks split their rows into blocks the same way.
+        if (self._transposed and not other._transposed
+                and self._maps.shape == other._maps.shape):
+            return DiagonalOperator(np.einsum('kn,kn->n',
+                _conj(self._maps), other._maps))
+
+        return NotImplemented
+
+
+    def _rcompose(self, other):
+        if isinstance(other, DiagonalOperator) and self._transposed:
+            return StackedDiagonalOperator(self._maps * _conj(other._v),
+                    True)
+
+        if isinstance(other, DiagonalOperator):
+            return StackedDiagonalOperator(
+                    other._v.reshape(self._maps.shape) * self._maps)
+
+        return NotImplemented
+
+
+    def __scaledmul__(self, other):
+        if self._transposed:
+            other = np.conj(other)
+
+        return StackedDiagonalOperator(other * self._maps, self._transposed)
+
+
+    def __neg__(self):
+        return StackedDiagonalOperator(-self._maps, self._transposed)
+
+
+@docfill
+def kron(*factors, **kwargs):
+    ''' Kronecker product of LinearOperators, applied without forming it.
+
+    The input is reshaped into an array with one axis per factor, and each
+    factor is applied along its own axis. For two n by n factors this is
+    O(n^3) work on the n^2 input instead of the O(n^4) of the product
+    matrix, which is never formed. Separable transforms are the typical
+    use.
+
+    Parameters
+    ----------
+    *factors : LinearOperator
+        The factors of the product. Factors that are themselves Kronecker
+        products of the same order are flattened into the product.
+    order : {'C', 'F'}, optional
+        The order by which the input is reshaped into an array with axis
+        ``d`` of length ``factors[d].shape[1]``. With 'C' the operator is
+        ``numpy.kron(A, B, ...)``; with 'F' the first factor varies
+        fastest, so the operator is ``numpy.kron(..., B, A)``.
+
+    Returns
+    -------
+    KroneckerOperator
+        The Kronecker product as a LinearOperator.
+
+    See Also
+    --------
+    %(diag)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop import toLinearOperator, toMatrix
+    >>> from pyop.operators import kron
+    >>> A = np.array([[1., 2.], [3., 4.]])
+    >>> B = np.array([[0., 1.], [1., 0.]])
+    >>> K = kron(toLinearOperator(A), toLinearOperator(B))
+    >>> np.array_equal(toMatrix(K), np.kron(A, B))
+    True
+    '''
+    order = kwargs.pop('order', 'C')
+
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments {}".format(
+            list(kwargs)))
+
+    if not order in ('C', 'F'):
+        raise ValueError("The order must be 'C' or 'F'")
+
+    if len(factors) == 0:
+        raise ValueError("Kronecker product of no factors.")
+
+    return KroneckerOperator(factors, order)
+
+
+class KroneckerOperator(LinearOperator):
+    ''' The Kronecker product of LinearOperators. Created by :func:`kron`.
+
+    The adjoint is the Kronecker product of the adjoints, and the product
+    of two Kronecker operators with matching factors is the Kronecker
+    operator of the factor products.
+    '''
+
+    def __init__(self, factors, order = 'C'):
+
+        flat = []
+        for f in factors:
+            if isinstance(f, KroneckerOperator) and f._order == order:
+                flat.extend(f._factors)
+            else:
+                flat.append(f)
+
+        self._factors = tuple(flat)
+        self._order = order
+
+        rows = reduce(mul, (f.shape[0] for f in flat))
+        cols = reduce(mul, (f.shape[1] for f in flat))
+
+        super(KroneckerOperator, self).__init__((rows, cols),
+                partial(KroneckerOperator._apply, factors = self._factors,
+                    order = order),
+                partial(KroneckerOperator._applyAdjoint,
+                    factors = self._factors, order = order),
+                LinearOperator._commonDtype(*(f.dtype for f in flat)))
+
+
+    @staticmethod
+    def _apply(x, factors, order):
+        ''' Applies each factor along its axis of the reshaped input. '''
+
+        columns = x.shape[1:]
+        a = x.reshape(tuple(f.shape[1] for f in factors) + columns,
+                order = order)
+
+        for d, f in enumerate(factors):
+            a = np.moveaxis(a, d, 0)
+            rest = a.shape[1:]
+            a = f(a.reshape((a.shape[0], -1)))
+            a = np.moveaxis(a.reshape((f.shape[0],) + rest), 0, d)
+
+        return a.reshape((-1,) + columns, order = order)
+
+
+    @staticmethod
+    def _applyAdjoint(x, factors, order):
+        return KroneckerOperator._apply(x, [f.T for f in factors], order)
+
+
+    @property
+    def T(self):
+        return KroneckerOperator([f.T for f in self._factors], self._order)
+
+
+    def _structure(self):
+        return (self._factors, self._order)
+
+
+    def _toSparse(self, dtype):
+        ## The factors are small, so those without a closed form are
+        ## applied to an identity.
+        factors = []
+        for f in self._factors:
+            S = f._toSparse(dtype)
+            if S is NotImplemented:
+                S = scipy.sparse.csr_matrix(toMatrix(f, dtype = dtype))
+            factors.append(S)
+
+        if self._order == 'F':
+            factors = factors[::-1]
+
+        return reduce(partial(scipy.sparse.kron, format = 'csr'), factors)
+
+
+    def _compose(self, other):
+        if (isinstance(other, KroneckerOperator)
+                and self._order == other._order
+                and len(self._factors) == len(other._factors)
+                and all(a.shape[1] == b.shape[0] for a, b in
+                    zip(self._factors, other._factors))):
+            return KroneckerOperator([a*b for a, b in
+                zip(self._factors, other._factors)], self._order)
+
+        return NotImplemented
+
+
+@docfill
+def lowrank(U, V, tol=None):
+    ''' Create a LinearOperator that emulates the low rank matrix U V^H.
+
+    The operator is applied as ``U (V^H x)`` in O((m + n) r) for rank r,
+    without forming the m by n matrix. The result is a
+    :class:`LowRankOperator`: products with other low rank, rank one and
+    diagonal operators are again low rank operators, and sums of low rank
+    operators are recompressed by a QR and SVD to the smallest rank that
+    keeps the singular values above the tolerance.
+
+    Parameters
+    ----------
+    U : 2-D array
+        The m by r left factor.
+    V : 2-D array
+        The n by r right factor.
+    tol : float, optional
+        Singular values below tol times the largest one are truncated when
+        the operator is recompressed. The None default only removes
+        numerically dependent or cancelling terms.
+
+    Returns
+    -------
+    LowRankOperator
+        The low rank LinearOperator.
+
+    See Also
+    --------
+    %(ones)s
+    %(diag)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import lowrank
+    >>> U = np.array([[1.], [2.]])
+    >>> L = lowrank(U, U)
+    >>> L(np.array([1., 1.]))
+    array([ 3.,  6.])
+    >>> (L + L).rank
+    1
+    '''
+    return LowRankOperator(U, V, tol)
+
+
+class LowRankOperator(LinearOperator):
+    ''' The LinearOperator U V^H. Created by :func:`lowrank`.
+
+    Attributes
+    ----------
+    rank : int
+        The number of columns of the factors.
+    '''
+
+    def __init__(self, U, V, tol=None):
+
+        U = np.asarray(U)
+        V = np.asarray(V)
+
+        if U.ndim != 2 or V.ndim != 2 or U.shape[1] != V.shape[1]:
+            raise ValueError("U and V must be 2-D arrays with the same "
+                             "number of columns.")
+
+        self._U = U
+        self._V = V
+        self._tol = tol
+        self.rank = U.shape[1]
+
+        super(LowRankOperator, self).__init__((U.shape[0], V.shape[0]),
+                partial(LowRankOperator._apply, left = U, right = _conj(V)),
+                partial(LowRankOperator._apply, left = V, right = _conj(U)),
+                np.result_type(U, V))
+
+
+    @staticmethod
+    def _apply(x, left, right):
+        ''' Computes left (right^T x), in the precision of x. '''
+
+        dtype = promoteDtype(x.dtype, left.dtype, right.dtype)
+        inner = x.T.dot(right.astype(dtype, copy = False)).T
+
+        return left.astype(dtype, copy = False).dot(np.asarray(inner))
+
+
+    @property
+    def T(self):
+        return LowRankOperator(self._V, self._U, self._tol)
+
+
+    def _structure(self):
+        return (self._U, self._V)
+
+
+    @staticmethod
+    def _factors(op):
+        ''' The factors U, V of op = U V^H for low rank, rank one and
+        diagonal operators, or None. '''
+
+        if isinstance(op, LowRankOperator):
+            return op._U, op._V
+
+        if isinstance(op, RankOneOperator):
+            left = np.ones(op.shape[0]) if op._left is None else op._left
+            right = np.ones(op.shape[1]) if op._right is None else op._right
+            return ((op._scale * left)[:, np.newaxis],
+                    _conj(right)[:, np.newaxis])
+
+        return None
+
+
+    def _compose(self, other):
+        if isinstance(other, DiagonalOperator):
+            return LowRankOperator(self._U,
+                    _conj(other._v)[:, np.newaxis] * self._V, self._tol)
+
+        factors = LowRankOperator._factors(other)
+        if factors is None:
+            return NotImplemented
+
+        U, V = factors
+        ## U1 V1^H U2 V2^H, folding the small inner matrix into the factor
+        ## that keeps the rank smallest.
+        inner = _conj(self._V).T.dot(U)
+        if inner.shape[0] <= inner.shape[1]:
+            return LowRankOperator(self._U, V.dot(_conj(inner).T), self._tol)
+
+        return LowRankOperator(self._U.dot(inner), V, self._tol)
+
+
+    def _rcompose(self, other):
+        if isinstance(other, DiagonalOperator):
+            return LowRankOperator(other._v[:, np.newaxis] * self._U,
+                    self._V, self._tol)
+
+        if isinstance(other, RankOneOperator):
+            U, V = LowRankOperator._factors(other)
+            return LowRankOperator(U, V, self._tol)._compose(self)
+
+        return NotImplemented
+
+
+    def _add(self, other):
+        factors = LowRankOperator._factors(other)
+        if factors is None:
+            return NotImplemented
+
+        U, V = factors
+        tols = [t for t in (self._tol, getattr(other, '_tol', None))
+                if t is not None]
+
+        return LowRankOperator(np.hstack([self._U, U]),
+                np.hstack([self._V, V]),
+                max(tols) if tols else None).compress()
+
+
+    def _radd(self, other):
+        return self._add(other)
+
+
+    def compress(self, tol=None):
+        ''' Truncates the operator to the smallest rank within tol.
+
+        The factors are orthogonalized by QR decompositions, and the SVD of
+        the small core matrix gives the singular values of the operator.
+
+        Parameters
+        ----------
+        tol : float, optional
+            Singular values below tol times the largest one are dropped. The
+            None default uses the tolerance of the operator, or if it has
+            none, removes the singular values that are rounding errors
+            relative to the size of the factors.
+
+        Returns
+        -------
+        LowRankOperator or ZeroOperator
+            The truncated operator, or a zero operator if nothing is left.
+        '''
+        if tol is None:
+            tol = self._tol
+
+        Qu, Ru = np.linalg.qr(self._U)
+        Qv, Rv = np.linalg.qr(self._V)
+        W, sigma, Zh = np.linalg.svd(Ru.dot(_conj(Rv).T))
+
+        ## Without a tolerance, singular values are compared to the size of
+        ## the factors, so that terms cancelling each other are removed.
+        if tol is None:
+            tol = max(self.shape) * np.finfo(sigma.dtype).eps
+            scale = np.linalg.norm(Ru, 2) * np.linalg.norm(Rv, 2)
+        else:
+            scale = sigma[0] if sigma.size else 0
+
+        keep = int(np.sum(sigma > tol * scale))
+
+        if keep == 0:
+            return ZeroOperator(self.shape)
+
+        return LowRankOperator(Qu.dot(W[:, :keep] * sigma[:keep]),
+                Qv.dot(_conj(Zh[:keep]).T), self._tol)
+
+
+    def __scaledmul__(self, other):
+        return LowRankOperator(other * self._U, self._V, self._tol)
 
-    return LinearOperator( (len(v), len(v)),
-            forwardAdjoint, forwardAdjoint)
 
+    def __neg__(self):
+        return LowRankOperator(-self._U, self._V, self._tol)
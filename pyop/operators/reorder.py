@@ -0,0 +1,197 @@
+'''
+The functions below create permutations of a vectorized array, expressed
+through operations on the unvectorized array. Each returns a
+:class:`~pyop.operators.matrix_operators.PermutationOperator`, so reorderings
+compose with each other in closed form and cancel with their inverses.
+
+Converting between C and F vectorizations of an array is the transpose of
+all of its axes. ::
+
+  C_to_F = transpose(shape)
+'''
+
+import numpy as np
+
+from functools import reduce
+from numbers import Integral
+from operator import mul
+
+from pyop.operators.matrix_operators import permute
+
+from scipy.misc import doccer
+
+
+docdict = {
+'shape' :
+"""shape : tuple
+    The shape of the array in its unvectorized form.""",
+'order' :
+"""order = {'C', 'F'}, optional
+    The order by which the vectorized array is reshaped. This is the
+    same parameter as given to functions like numpy.reshape.""",
+
+## The see also section.
+'reverse' : "reverse : Reverse the order of elements along axes.",
+'roll' : "roll : Roll elements along axes.",
+'transpose' : "transpose : Permute the axes of the array.",
+'permute' : "permute : Reorder the rows of a matrix.",
+    }
+
+docfill = doccer.filldoc(docdict)
+
+
+def __reorder(f, shape, order):
+    ''' The permutation performing f on the unvectorized array. '''
+
+    if not order in ('C', 'F'):
+        raise ValueError("The order must be 'C' or 'F'")
+
+    indices = np.arange(reduce(mul, shape)).reshape(shape, order = order)
+
+    return permute(np.ravel(f(indices), order = order))
+
+
+def __axes(axes, ndim):
+    ''' The axes as a tuple of nonnegative axes, counting negative axes
+    from the end as numpy does. '''
+
+    if isinstance(axes, Integral):
+        axes = (axes, )
+
+    axes = tuple(axes)
+    if any(not -ndim <= a < ndim for a in axes):
+        raise ValueError("Axes {} out of range for an array of {} "
+                         "dimensions.".format(axes, ndim))
+
+    return tuple(a % ndim for a in axes)
+
+
+@docfill
+def reverse(shape, axes = None, order = 'C'):
+    ''' Reverse the order of elements along axes, as a LinearOperator.
+
+    Reversing all of the axes reverses the vectorized array, which is
+    applied as a view of the input.
+
+    Parameters
+    ----------
+    %(shape)s
+    axes : int or tuple, optional
+        The axes to reverse. The None default reverses all axes.
+    %(order)s
+
+    Returns
+    -------
+    PermutationOperator
+        A LinearOperator performing the reversal.
+
+    See Also
+    --------
+    %(roll)s
+    %(transpose)s
+    %(permute)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import reverse
+    >>> R = reverse((2, 3), axes = 1)
+    >>> R(np.arange(6))
+    array([2, 1, 0, 5, 4, 3])
+    '''
+    if axes is None:
+        axes = tuple(range(len(shape)))
+    else:
+        axes = __axes(axes, len(shape))
+
+    def flip(a):
+        return a[tuple(slice(None, None, -1) if d in axes else slice(None)
+                       for d in range(a.ndim))]
+
+    return __reorder(flip, shape, order)
+
+
+@docfill
+def roll(shape, shift, axes = None, order = 'C'):
+    ''' Roll elements along axes, as a LinearOperator.
+
+    Elements rolled beyond the last position are reintroduced at the first,
+    as in numpy.roll.
+
+    Parameters
+    ----------
+    %(shape)s
+    shift : int or tuple
+        The number of places elements are shifted, for every axis or one per
+        axis in `axes`.
+    axes : int or tuple, optional
+        The axes to roll. The None default rolls the flattened array.
+    %(order)s
+
+    Returns
+    -------
+    PermutationOperator
+        A LinearOperator performing the roll.
+
+    See Also
+    --------
+    %(reverse)s
+    %(transpose)s
+    %(permute)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import roll
+    >>> R = roll((2, 3), 1, axes = 1)
+    >>> R(np.arange(6))
+    array([2, 0, 1, 5, 3, 4])
+    '''
+    if axes is not None:
+        axes = __axes(axes, len(shape))
+
+    return __reorder(lambda a: np.roll(a, shift, axes), shape, order)
+
+
+@docfill
+def transpose(shape, axes = None, order = 'C'):
+    ''' Permute the axes of the array, as a LinearOperator.
+
+    The result is the vectorization of the transposed array, with shape
+    ``[shape[a] for a in axes]``. Transposing all axes converts between C
+    and F vectorizations, and moving an axis converts, for example, between
+    coil-major and pixel-major layouts.
+
+    Parameters
+    ----------
+    %(shape)s
+    axes : tuple, optional
+        The permutation of the axes. The None default reverses the axes.
+    %(order)s
+
+    Returns
+    -------
+    PermutationOperator
+        A LinearOperator performing the transpose.
+
+    See Also
+    --------
+    %(reverse)s
+    %(roll)s
+    %(permute)s
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop.operators import transpose
+    >>> T = transpose((2, 3))
+    >>> T(np.arange(6))
+    array([0, 3, 1, 4, 2, 5])
+    '''
+    if axes is not None:
+        axes = __axes(axes, len(shape))
+        if sorted(axes) != list(range(len(shape))):
+            raise ValueError("The axes must be a permutation of the axes of "
+                             "the array.")
+
+    return __reorder(lambda a: np.transpose(a, axes), shape, order)
@@ -34,4 +34,4 @@ def adjointTest(O, rtol=1e-7):
     x = np.random.rand(O.shape[1])
     y = np.random.rand(O.shape[0])
 
-    assert_allclose(O.T(y).dot(x), y.dot(O(x)), rtol = rtol)
+    assert_allclose(np.vdot(O.T(y), x), np.vdot(y, O(x)), rtol = rtol)
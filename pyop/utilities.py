@@ -4,6 +4,9 @@ matrix-matrix multiplication or to operate on a reshape version of the
 input. The decorators defined here allow for functions of these forms to be
 modified to matrix-matrix functions easily. The examples for each decorator
 give a good sample of how to use such functions.
+
+The dtype rule shared by all operators, :func:`promoteDtype`, is also
+defined here.
 '''
 
 import numpy as np
@@ -196,3 +199,52 @@ def matvectorized(shape, order = 'C'):
         return __wrapIfPy3(wrapper, f)
 
     return decorator
+
+
+def promoteDtype(dtype, *coefficients):
+    ''' The dtype of applying an operator to an input of dtype.
+
+    Operators keep the precision of floating point inputs, so that single
+    precision data stays in single precision. Only the kind is promoted by
+    the operator's coefficients: a complex operator applied to a float32
+    input gives complex64. Integer and boolean inputs take the type of the
+    coefficients.
+
+    Parameters
+    ----------
+    dtype : numpy.dtype
+        The dtype of the input.
+    *coefficients : numpy.dtype or None
+        The dtypes of the operator's coefficients. None is ignored.
+
+    Returns
+    -------
+    numpy.dtype
+        The dtype of the result.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from pyop import promoteDtype
+    >>> promoteDtype(np.float32, np.float64)
+    dtype('float32')
+    >>> promoteDtype(np.float32, np.complex128)
+    dtype('complex64')
+    >>> promoteDtype(np.int64, np.float64)
+    dtype('float64')
+    '''
+    dtype = np.dtype(dtype)
+    coefficients = [np.dtype(c) for c in coefficients if c is not None]
+
+    if not coefficients:
+        return dtype
+
+    promoted = np.result_type(dtype, *coefficients)
+
+    if dtype.kind not in 'fc':
+        return promoted
+
+    if dtype.kind == 'f' and promoted.kind == 'c':
+        return np.result_type(dtype, np.complex64)
+
+    return dtype
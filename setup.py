@@ -45,9 +45,10 @@ setup( name             = 'pyop'
      , packages         = ['pyop', 'pyop.operators']
      , install_requires =
         [ 'six >= 1.6'
-        , 'numpy >= 1.8'
+        , 'numpy >= 1.11'
         , 'scipy >= 0.14.0'
         ]
+     , extras_require   = {'processes' : ['cloudpickle']}
      , zip_safe         = False
      , tests_require    = ['pytest']
      , cmdclass         = {'test': PyTest}
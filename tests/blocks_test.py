@@ -1,10 +1,16 @@
 #pylint: disable=W0104,W0108
 import pytest
 import pyop
+import pyop.operators as operators
 
 import numpy as np
+import scipy.linalg
+import scipy.sparse
 import random
 
+from pyop.operators.matrix_operators import ZeroOperator
+from pyop.block import BlockOperator, RepeatedOperator
+from pyop.operators.matrix_operators import DiagonalOperator
 from tools import operatorVersusMatrix
 
 num_tests = 250
@@ -100,6 +106,205 @@ def testBmat():
         operatorVersusMatrix(E_mat, E_op)
 
 
+def testBmatNone():
+    A_mat = np.random.rand(3, 4)
+    D_mat = np.random.rand(2, 5)
+
+    E_op = pyop.bmat([[pyop.toLinearOperator(A_mat), None],
+                      [None, pyop.toLinearOperator(D_mat)]])
+
+    E_mat = np.vstack([np.hstack([A_mat, np.zeros((3, 5))]),
+                       np.hstack([np.zeros((2, 4)), D_mat])])
+
+    operatorVersusMatrix(E_mat, E_op)
+
+    with pytest.raises(ValueError):
+        pyop.bmat([[None, None], [None, pyop.toLinearOperator(D_mat)]])
+
+
+def testBmatNoneIrregular():
+    A_mat = np.random.rand(2, 2)
+    B_mat = np.random.rand(2, 3)
+    C_mat = np.random.rand(3, 7)
+
+    A, B, C = (pyop.toLinearOperator(M) for M in (A_mat, B_mat, C_mat))
+
+    E_op = pyop.bmat([[A, None], [C]])
+    E_mat = np.vstack([np.hstack([A_mat, np.zeros((2, 5))]), C_mat])
+    operatorVersusMatrix(E_mat, E_op)
+
+    E_op = pyop.bmat([[A, None, B], [C]])
+    E_mat = np.vstack([np.hstack([A_mat, np.zeros((2, 2)), B_mat]), C_mat])
+    operatorVersusMatrix(E_mat, E_op)
+
+    with pytest.raises(ValueError):
+        pyop.bmat([[A, None, None], [C]])
+
+    with pytest.raises(ValueError):
+        pyop.bmat([[A, None], [B, None]])
+
+    with pytest.raises(ValueError):
+        pyop.bmat([[C, None], [A]])
+
+
+def testBlockRepr():
+    A = pyop.toLinearOperator(np.random.rand(2, 2))
+    B = pyop.toLinearOperator(np.random.rand(2, 3))
+
+    for O in (pyop.bmat([[A, A]]), pyop.hstack([A, B]),
+              pyop.vstack([A, B.T]), pyop.bmat([[A, None], [None, B]])):
+        assert repr(O).startswith('BlockOperator(')
+        assert str(O) == repr(O)
+        assert repr(O.T).startswith('BlockOperator(')
+
+    assert pyop.hstack([A, B]) == pyop.hstack([A, B])
+    assert pyop.hstack([A, B]) != pyop.hstack([A, A])
+    assert pyop.hstack([A, A]) != pyop.vstack([A, A])
+
+
+def testRepeatedRepr():
+    A = pyop.toLinearOperator(np.random.rand(2, 3))
+
+    for O in (pyop.blockRepeat(A, 2), pyop.blockDiag([A]*4)):
+        assert isinstance(O, RepeatedOperator)
+        assert repr(O).startswith('RepeatedOperator(')
+        assert str(O.T) == repr(O.T)
+
+    assert pyop.blockRepeat(A, 2) == pyop.blockDiag([A, A])
+    assert pyop.blockRepeat(A, 2) != pyop.blockRepeat(A, 3)
+
+
+class NeverApplied(ZeroOperator):
+    def __call__(self, x):
+        raise AssertionError("Zero block was applied.")
+
+    @property
+    def T(self):
+        return NeverApplied(self.shape[::-1])
+
+
+def testZeroBlocksSkipped():
+    A_mat = np.random.rand(3, 4)
+    A_op = pyop.toLinearOperator(A_mat)
+    Z = NeverApplied((3, 2))
+
+    operatorVersusMatrix(np.hstack([A_mat, np.zeros((3, 2))]),
+                         pyop.hstack([A_op, Z]))
+    operatorVersusMatrix(np.vstack([A_mat, np.zeros((2, 4))]),
+                         pyop.vstack([A_op, Z.T*pyop.toLinearOperator(
+                             np.ones((3, 4)))]))
+    operatorVersusMatrix(np.vstack([np.hstack([A_mat, np.zeros((3, 3))]),
+                                    np.zeros((2, 7))]),
+                         pyop.blockDiag([A_op, Z.T]))
+
+    assert isinstance(pyop.vstack([Z, Z]), ZeroOperator)
+    assert isinstance(pyop.bmat([[Z, None], [None, Z]]), ZeroOperator)
+
+
+class WritesInto(pyop.LinearOperator):
+    ''' The identity, recording the outputs it was asked to write into. '''
+
+    def __init__(self, n):
+        super(WritesInto, self).__init__((n, n), lambda x: x.copy(),
+                lambda x: x.copy())
+        self.outs = []
+
+    def _forwardInto(self, x, out):
+        self.outs.append(out)
+        out[...] = x
+        return out
+
+    @property
+    def T(self):
+        return self
+
+
+def testBlocksWriteIntoOutput():
+    A = WritesInto(3)
+    B = WritesInto(2)
+    x = np.random.rand(5, 2)
+
+    for O in (pyop.blockDiag([A, B]), pyop.vstack([A, A])):
+        res = O(x[:O.shape[1]])
+        assert all(np.may_share_memory(out, res) for out in A.outs)
+        A.outs = []
+
+    B.outs = []
+    np.testing.assert_allclose(pyop.blockDiag([A, B])(x), x)
+    assert len(B.outs) == 1
+
+
+def testBlocksWidenResult():
+    ## A block without a dtype that returns complex results.
+    F = pyop.LinearOperator((4, 4), lambda x: np.fft.fft(x, axis = 0),
+                            lambda x: np.fft.ifft(x, axis = 0))
+    I = pyop.operators.eye((4, 4))
+    x = np.random.rand(4)
+
+    np.testing.assert_allclose(pyop.vstack([I, F])(x),
+                               np.hstack([x, np.fft.fft(x)]))
+    np.testing.assert_allclose(pyop.hstack([I, F])(np.hstack([x, x])),
+                               x + np.fft.fft(x))
+
+
+def testHstackKeepsInput():
+    I = pyop.operators.eye((4, 4))
+    x = np.random.rand(8)
+    x_copy = x.copy()
+
+    np.testing.assert_allclose(pyop.hstack([I, I])(x), x[:4] + x[4:])
+    np.testing.assert_array_equal(x, x_copy)
+
+
+def testBlocksFlattened():
+    mats = [[np.random.rand(r, c) for c in (2, 3)] for r in (4, 1)]
+    ops = [[pyop.toLinearOperator(m) for m in row] for row in mats]
+
+    E_op = pyop.bmat(ops)
+    assert isinstance(E_op, BlockOperator)
+    assert len(E_op._entries) == 4
+
+    ## Nested stacks merge into one table of blocks.
+    N_op = pyop.vstack([pyop.hstack(ops[0]), pyop.hstack(ops[1])])
+    assert len(N_op._entries) == 4
+    assert len(N_op.T._entries) == 4
+
+    operatorVersusMatrix(np.bmat(mats).A, E_op)
+    operatorVersusMatrix(np.bmat(mats).A, N_op)
+
+
+def testBlocksOverlappingRows():
+    A_mat, B_mat = np.random.rand(2, 3), np.random.rand(3, 3)
+    C_mat = np.random.rand(5, 4)
+    A_op, B_op, C_op = (pyop.toLinearOperator(m)
+                        for m in (A_mat, B_mat, C_mat))
+
+    ## The column blocks split the rows differently.
+    E_op = pyop.hstack([pyop.vstack([A_op, B_op]), C_op])
+    E_mat = np.hstack([np.vstack([A_mat, B_mat]), C_mat])
+    operatorVersusMatrix(E_mat, E_op)
+
+    E_op = pyop.hstack([C_op, pyop.vstack([A_op,
+                                           pyop.operators.zeros((3, 3))])])
+    E_mat = np.hstack([C_mat, np.vstack([A_mat, np.zeros((3, 3))])])
+    operatorVersusMatrix(E_mat, E_op)
+
+
+def testBlocksOut():
+    A_mat, B_mat = np.random.rand(3, 4), np.random.rand(2, 4)
+    E_op = pyop.vstack([pyop.toLinearOperator(A_mat),
+                        pyop.toLinearOperator(B_mat)])
+    x = np.random.rand(4, 2)
+    out = np.empty((5, 2))
+
+    assert E_op(x, out = out) is out
+    np.testing.assert_allclose(out, np.vstack([A_mat, B_mat]).dot(x))
+
+    out = np.empty(5)
+    E_op(x[:, 0], out = out)
+    np.testing.assert_allclose(out, np.vstack([A_mat, B_mat]).dot(x[:, 0]))
+
+
 #######################
 # Test block diagonal #
 #######################
@@ -143,6 +348,245 @@ def testBlockDiag():
         operatorVersusMatrix(E_mat.T, E_op.T)
 
 
+class CountCalls(pyop.LinearOperator):
+    ''' Wraps a matrix, counting how often it is applied. '''
+
+    def __init__(self, mat):
+        self.calls = 0
+
+        def forward(x):
+            self.calls += 1
+            return mat.dot(x)
+
+        super(CountCalls, self).__init__(mat.shape, forward,
+                lambda x: mat.T.dot(x), mat.dtype)
+
+
+def testBlockDiagRepeated():
+    A_mat = np.random.rand(3, 2)
+    A_op = CountCalls(A_mat)
+    B_mat = np.random.rand(2, 2)
+    B_op = pyop.toLinearOperator(B_mat)
+
+    E_op = pyop.blockDiag([A_op] * 4 + [B_op] + [A_op] * 2)
+    E_mat = scipy.linalg.block_diag(*([A_mat] * 4 + [B_mat] + [A_mat] * 2))
+
+    assert len(E_op._entries) == 3
+    assert isinstance(E_op._entries[0][2], RepeatedOperator)
+
+    operatorVersusMatrix(E_mat, E_op)
+
+    A_op.calls = 0
+    E_op(np.random.rand(E_op.shape[1], 5))
+    assert A_op.calls == 2
+
+    out = np.empty(E_op.shape[0])
+    x = np.random.rand(E_op.shape[1])
+    E_op(x, out = out)
+    np.testing.assert_allclose(out, E_mat.dot(x))
+
+
+def testBlocksShareFactors():
+    F_mat = np.random.rand(4, 4)
+    F_op = CountCalls(F_mat)
+    D_mats = [np.diag(np.random.rand(4)) for _ in range(3)]
+    D_ops = [pyop.toLinearOperator(D) for D in D_mats]
+    C_mat = np.random.rand(2, 4)
+
+    V_op = pyop.vstack([D * F_op for D in D_ops] +
+                       [pyop.toLinearOperator(C_mat)])
+    V_mat = np.vstack([D.dot(F_mat) for D in D_mats] + [C_mat])
+
+    operatorVersusMatrix(V_mat, V_op)
+
+    F_op.calls = 0
+    V_op(np.random.rand(4, 3))
+    assert F_op.calls == 1
+
+    ## Blocks of a row sharing their left factor.
+    H_op = pyop.hstack([F_op * D for D in D_ops])
+    H_mat = np.hstack([F_mat.dot(D) for D in D_mats])
+
+    operatorVersusMatrix(H_mat, H_op)
+
+    F_op.calls = 0
+    H_op(np.random.rand(12))
+    assert F_op.calls == 1
+
+
+def testBlocksToSparse():
+    A_mat = np.random.rand(3, 3)
+    A_op = CountCalls(A_mat)
+    v = np.random.rand(3)
+
+    ## A KKT style system with closed form blocks.
+    K_op = pyop.bmat([[pyop.operators.diag(v), A_op.T],
+                      [A_op, NeverApplied((3, 3))],
+                      [pyop.operators.select(3, [2, 0]),
+                       pyop.operators.eye((2, 3))]])
+    K_mat = np.vstack([np.hstack([np.diag(v), A_mat.T]),
+                       np.hstack([A_mat, np.zeros((3, 3))]),
+                       np.hstack([np.eye(3)[[2, 0]], np.eye(2, 3)])])
+
+    K_sparse = pyop.toMatrix(K_op, sparse = True)
+    assert scipy.sparse.isspmatrix_csr(K_sparse)
+    np.testing.assert_allclose(K_sparse.toarray(), K_mat)
+    np.testing.assert_allclose(pyop.toMatrix(K_op), K_mat)
+    assert A_op.calls == 2
+
+    R_op = pyop.blockRepeat(pyop.toLinearOperator(A_mat), 3)
+    R_sparse = pyop.toMatrix(R_op, sparse = True, dtype = np.float32)
+    assert R_sparse.dtype == np.float32
+    np.testing.assert_allclose(R_sparse.toarray(),
+                               scipy.linalg.block_diag(*[A_mat] * 3),
+                               rtol = 1e-6)
+
+
+def testBlockRepeat():
+    A_mat = np.random.rand(3, 2)
+    R_op = pyop.blockRepeat(pyop.toLinearOperator(A_mat), 5)
+
+    operatorVersusMatrix(scipy.linalg.block_diag(*[A_mat] * 5), R_op)
+    pyop.adjointTest(R_op)
+
+    with pytest.raises(ValueError):
+        pyop.blockRepeat(pyop.toLinearOperator(A_mat), 0)
+
+
+def testBlockDiagMergesDiagonals():
+    vs = [np.random.rand(n) for n in (3, 1, 4)]
+    D_op = pyop.blockDiag([pyop.operators.diag(v) for v in vs])
+
+    assert isinstance(D_op, DiagonalOperator)
+    np.testing.assert_allclose(pyop.toMatrix(D_op),
+                               np.diag(np.concatenate(vs)))
+
+
+def executorBlocks(lambdas):
+    A = pyop.toLinearOperator(np.random.rand(3, 4))
+    B = pyop.toLinearOperator(np.random.rand(3, 2))
+    C = pyop.toLinearOperator(np.random.rand(2, 4))
+
+    if lambdas:
+        ## Returns complex results without declaring a dtype.
+        W = pyop.LinearOperator((3, 2), lambda x: 1j * B(x))
+    else:
+        W = pyop.toLinearOperator(1j * pyop.toMatrix(B))
+
+    return A, B, C, [[A, B, None], [C, None, None], [A, None, W]]
+
+
+def checkExecutor(executor, lambdas):
+    A, B, C, blocks = executorBlocks(lambdas)
+    E = pyop.bmat(blocks)
+    x = np.random.rand(8, 3)
+
+    P = pyop.bmat(blocks, executor)
+
+    np.testing.assert_allclose(P(x), E(x))
+    np.testing.assert_allclose(P(x[:, 0]), E(x[:, 0]))
+
+    out = np.empty((8, 3), dtype = np.complex128)
+    P(x, out = out)
+    np.testing.assert_allclose(out, E(x))
+
+    H = pyop.hstack([A, A, B], executor)
+    np.testing.assert_allclose(H.T(x[:3]), pyop.hstack([A, A, B]).T(x[:3]))
+
+    D = pyop.blockDiag([A, B, C], executor)
+    y = np.random.rand(10).astype(np.float32)
+    assert D(y).dtype == np.float32
+    np.testing.assert_allclose(D(y), pyop.blockDiag([A, B, C])(y),
+                               rtol = 1e-5)
+
+
+def testBlocksExecutors():
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    with ThreadPoolExecutor(2) as threads:
+        checkExecutor(threads, True)
+
+    ## Blocks made of operators from pyop pickle without cloudpickle.
+    with ProcessPoolExecutor(2) as procs:
+        checkExecutor(procs, False)
+
+
+def testShippedBlocksBounded(monkeypatch):
+    from collections import OrderedDict
+    from concurrent.futures import ProcessPoolExecutor
+    import pyop.block as block
+
+    ## The worker side of an application, run in this process.
+    monkeypatch.setattr(block, '_shipped', OrderedDict())
+    x = np.random.rand(4)
+
+    with ProcessPoolExecutor(1) as procs:
+        ops = [pyop.hstack([pyop.toLinearOperator(np.random.rand(3, 2))]*2,
+                           procs) for _ in range(block._shippedLimit + 3)]
+
+        for O in ops:
+            src, dst = O._sharedSegments(x.nbytes, 3 * x.itemsize)
+            src.array(x.shape, x.dtype)[...] = x
+
+            block._sharedBlock(O._ship(), src.shm.name, x.shape, x.dtype,
+                               dst.shm.name, (3,), x.dtype, (0, 0, 0))
+
+            assert len(block._shipped) <= block._shippedLimit
+            assert O._shipped[0] in block._shipped
+
+        assert ops[0]._shipped[0] not in block._shipped
+
+
+def testBlocksProcessesLambdas():
+    pytest.importorskip('cloudpickle')
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(2) as procs:
+        checkExecutor(procs, True)
+
+
+def testSharedArrays(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    import pyop.block as block
+
+    A = pyop.toLinearOperator(np.random.rand(3, 4))
+    B = pyop.toLinearOperator(np.random.rand(3, 2))
+    C = pyop.toLinearOperator(np.random.rand(2, 4))
+
+    ## The middle rows are accumulated below the output.
+    blocks = [[A, B], [C, None], [A, B]]
+    E = pyop.bmat(blocks)
+    x = np.random.rand(6, 2)
+
+    with ProcessPoolExecutor(2) as procs:
+        P = pyop.vstack([pyop.bmat(blocks), pyop.hstack([A, B])], procs)
+        E = pyop.vstack([E, pyop.hstack([A, B])])
+
+        x_s, out_s = P.sharedArrays(2)
+        assert x_s.shape == (6, 2) and out_s.shape == (11, 2)
+        x_s[...] = x
+
+        P(x_s, out = out_s)
+        segments = P._segments
+        np.testing.assert_allclose(out_s, E(x))
+
+        np.testing.assert_allclose(P(x), E(x))
+        np.testing.assert_allclose(P(x[:, 0]), E(x[:, 0]))
+        assert P._segments == segments
+
+        x_v, out_v = P.sharedArrays()
+        x_v[...] = x[:, 1]
+        P(x_v, out = out_v)
+        np.testing.assert_allclose(out_v, E(x[:, 1]))
+
+        monkeypatch.setattr(block, 'shared_memory', None)
+        P = pyop.vstack([pyop.bmat(blocks), pyop.hstack([A, B])], procs)
+        x_s, out_s = P.sharedArrays(2)
+        x_s[...] = x
+        np.testing.assert_allclose(P(x_s, out = out_s), E(x))
+        assert P._segments is None
+
+
 #########################
 # Test incorrect inputs #
 #########################
@@ -5,6 +5,7 @@ import pyop
 import random
 
 import numpy as np
+import scipy.sparse as sp
 
 from tools import operatorVersusMatrix
 
@@ -58,6 +59,127 @@ def testToMatrix():
         np.testing.assert_allclose(A_mat, pyop.toMatrix(A_op))
 
 
+def testToMatrixDtype():
+    A_op = pyop.LinearOperator((3, 3), lambda x:x, lambda x:x)
+
+    assert pyop.toMatrix(A_op).dtype == np.float64
+    assert pyop.toMatrix(A_op, dtype = np.float32).dtype == np.float32
+    assert pyop.toMatrix(A_op, sparse = True,
+                         dtype = np.complex64).dtype == np.complex64
+
+
+def testToMatrixBlocks(tmpdir):
+    from concurrent.futures import ThreadPoolExecutor
+
+    A_mat = np.random.rand(5, 7)
+    A_op = pyop.toLinearOperator(A_mat)
+
+    np.testing.assert_allclose(pyop.toMatrix(A_op, columns = 3), A_mat)
+    np.testing.assert_allclose(pyop.toMatrix(A_op, memory = 100), A_mat)
+
+    out = np.zeros((5, 7), dtype = np.float32)
+    assert pyop.toMatrix(A_op, out = out, columns = 2) is out
+    np.testing.assert_allclose(out, A_mat, rtol = 1e-6)
+
+    name = str(tmpdir.join('A.npy'))
+    with ThreadPoolExecutor(2) as executor:
+        pyop.toMatrix(A_op, out = name, columns = 2, executor = executor)
+    np.testing.assert_allclose(np.load(name), A_mat)
+
+    S = pyop.toMatrix(pyop.toLinearOperator(sp.csr_matrix(A_mat)),
+                      sparse = True, columns = 3)
+    assert sp.issparse(S)
+    np.testing.assert_allclose(S.toarray(), A_mat)
+
+    with pytest.raises(ValueError):
+        pyop.toMatrix(A_op, out = np.zeros((7, 5)))
+    with pytest.raises(ValueError):
+        pyop.toMatrix(A_op, sparse = True, out = out)
+
+
+def testToMatrixPattern():
+    ## A tridiagonal matrix, only known through its forward function.
+    A_mat = np.diag(np.random.rand(20)) + np.diag(np.random.rand(19), 1) + \
+            np.diag(np.random.rand(19), -1)
+    columns = []
+
+    def forward(x):
+        columns.append(x.shape[1])
+        return A_mat.dot(x)
+
+    A_op = pyop.LinearOperator(A_mat.shape, forward)
+    pattern = sp.diags([1, 1, 1], [-1, 0, 1], shape = A_mat.shape)
+
+    S = pyop.toMatrix(A_op, sparse = True, pattern = pattern)
+    assert sp.issparse(S)
+    assert columns == [3]
+    np.testing.assert_allclose(S.toarray(), A_mat)
+
+    ## Products of operators with known patterns are probed as well.
+    del columns[:]
+    D_mat = np.diag(np.random.rand(20))
+    P_op = pyop.operators.diag(np.diag(D_mat)) * A_op
+    assert P_op._sparsity() is NotImplemented
+
+    np.testing.assert_allclose(pyop.toMatrix(P_op, pattern = pattern),
+                               D_mat.dot(A_mat))
+    assert columns == [3]
+
+
+def testToScipyLinearOperatorBlocks():
+    A_mat = np.random.rand(5, 4)
+    calls = []
+
+    def forward(x):
+        calls.append(x.shape)
+        return A_mat.dot(x)
+
+    A_op = pyop.LinearOperator((5, 4), forward, lambda x: A_mat.T.dot(x),
+                               np.float64)
+    A_sci = pyop.toScipyLinearOperator(A_op)
+    X = np.random.rand(4, 3)
+
+    np.testing.assert_allclose(A_sci.matmat(X), A_mat.dot(X))
+    assert calls == [(4, 3)]
+    np.testing.assert_allclose(A_sci.rmatmat(A_mat.dot(X)),
+                               A_mat.T.dot(A_mat.dot(X)))
+
+    ## The dtype is inferred, by a probe for operators that do not
+    ## declare it.
+    F_op = pyop.LinearOperator((4, 4), lambda x: np.fft.fft(x, axis = 0))
+    assert pyop.toScipyLinearOperator(F_op).dtype == np.complex128
+    assert pyop.toScipyLinearOperator(
+            pyop.operators.diag(np.ones(4, dtype = np.complex64))
+        ).dtype == np.complex128
+    assert pyop.toScipyLinearOperator(A_op, np.float32).dtype == np.float32
+
+    with pytest.raises(NotImplementedError):
+        pyop.toScipyLinearOperator(F_op).rmatvec(np.ones(4))
+
+
+def testToLinearOperatorMatrix():
+    A_mat = sp.random(6, 5, density = 0.3, format = 'csr')
+    A_op = pyop.toLinearOperator(A_mat)
+
+    assert A_op.T.T is A_op
+    assert A_op._toSparse(np.float64) is not NotImplemented
+
+    S = pyop.toMatrix(A_op, sparse = True)
+    assert sp.isspmatrix_csr(S)
+    np.testing.assert_array_equal(S.toarray(), A_mat.toarray())
+    np.testing.assert_array_equal(pyop.toMatrix(A_op.T), A_mat.T.toarray())
+
+
+def testToLinearOperatorPrecision():
+    A_op = pyop.toLinearOperator(np.random.rand(4, 3))
+    x = np.random.rand(3).astype(np.float32)
+
+    assert A_op.dtype == np.float64
+    assert A_op(x).dtype == np.float32
+    assert A_op.T(A_op(x)).dtype == np.float32
+    assert A_op(x.astype(np.complex64)).dtype == np.complex64
+
+
 ################################
 #  To another functional form  #
 ################################
@@ -112,6 +112,19 @@ def testForward():
         aop_44(d_54)
 
 
+def testForwardOut():
+    out = np.empty(4)
+    assert aop_44(v_4, out = out) is out
+    np.testing.assert_allclose(out, np.dot(a_44, v_4))
+
+    out = np.empty((5, 4))
+    assert cop_45.T(a_44, out = out) is out
+    np.testing.assert_allclose(out, np.dot(c_45.T, a_44))
+
+    with pytest.raises(pyop.error.DimensionMismatch):
+        aop_44(v_4, out = np.empty((4, 1)))
+
+
 def testAdjoint():
     assert np.array_equal(np.dot(a_44.T, v_4), aop_44.T(v_4))
     assert np.array_equal(np.dot(c_45.T, v_4), cop_45.T(v_4))
@@ -211,6 +224,100 @@ def testEquality():
     assert e != f
 
 
+def testStructuralEquality():
+    import pyop.operators as operators
+    import scipy.sparse
+
+    v = np.random.rand(4)
+    kernel = np.random.rand(3, 2)
+
+    ## Equal operators built independently from equal data.
+    same = [(lambda: operators.diag(v.copy())),
+            (lambda: operators.select(4, [0, 2, 3])),
+            (lambda: operators.permute([1, 0, 3, 2])),
+            (lambda: operators.kron(operators.diag(v[:2]),
+                                    operators.eye((2, 2)))),
+            (lambda: operators.convolve(kernel.copy(), (4, 5))),
+            (lambda: operators.circulant(v.copy())),
+            (lambda: operators.toeplitz(v.copy(), v[::-1].copy())),
+            (lambda: pyop.toLinearOperator(a_44.copy())),
+            (lambda: pyop.toLinearOperator(scipy.sparse.csr_matrix(a_44))),
+            (lambda: operators.diag(v) * pyop.toLinearOperator(a_44)),
+            (lambda: pyop.hstack([operators.diag(v), operators.eye((4, 4))])),
+            (lambda: pyop.blockRepeat(operators.diag(v), 3))]
+
+    for make in same:
+        assert make() == make()
+        assert not make() != make()
+
+    assert operators.diag(v) != operators.diag(v + 1)
+    assert operators.diag(v) != operators.diag(v.astype(np.float32))
+    assert operators.convolve(kernel, (4, 5)) != \
+        operators.convolve(kernel, (4, 5)).T
+    assert operators.convolve(kernel, (4, 5)) != \
+        operators.convolve(kernel, (4, 5), 'F')
+    assert pyop.toLinearOperator(a_44) != pyop.toLinearOperator(b_44)
+    assert operators.diag(v) != pyop.toLinearOperator(np.diag(v))
+
+    ## Independently built factors are applied once.
+    w = np.random.rand(20)
+    F = [operators.convolve(kernel, (4, 5)) for _ in range(2)]
+    P = pyop.vstack([operators.diag(w) * F[0], operators.diag(w + 1) * F[1]])
+    assert len(P._entries) == 1
+
+
+###########
+#  Dtype  #
+###########
+
+def testDtype():
+    A = pyop.LinearOperator((4,4), lambda x: x, lambda x: x)
+    B = pyop.LinearOperator((4,4), lambda x: x, lambda x: x, np.float32)
+    C = pyop.LinearOperator((4,4), lambda x: x, lambda x: x, np.complex128)
+
+    assert A.dtype is None
+    assert A.result_type(np.float32) == np.float32
+    assert B.dtype == np.float32
+    assert B.T.dtype == np.float32
+
+    assert (A*B).dtype == np.float32
+    assert (B*C).dtype == np.complex128
+    assert (B + C).dtype == np.complex128
+    assert (A - B).dtype == np.float32
+    assert (2*A).dtype is None
+    assert (1j*B).dtype == np.complex128
+    assert (-C).dtype == np.complex128
+    assert (B**2).dtype == np.float32
+
+    assert (B*C).result_type(np.float32) == np.complex64
+    assert (B*C).result_type(np.float64) == np.complex128
+
+
+def testSharedFactors():
+    calls = []
+
+    def forward(x):
+        calls.append(x)
+        return a_44.dot(x)
+
+    A = pyop.LinearOperator((4, 4), forward, lambda x: a_44.T.dot(x))
+    B = pyop.toLinearOperator(b_44)
+    C = pyop.toLinearOperator(i_44 + b_44)
+
+    sums = [(A + A*B, a_44 + a_44.dot(b_44)),
+            (A*B - A, a_44.dot(b_44) - a_44),
+            (B*A + A, b_44.dot(a_44) + a_44),
+            (A*B + A*C, a_44.dot(b_44) + a_44.dot(i_44 + b_44)),
+            (B*A - C*A, (b_44 - i_44 - b_44).dot(a_44))]
+
+    for S, S_mat in sums:
+        del calls[:]
+        np.testing.assert_allclose(S(v_4), S_mat.dot(v_4))
+        assert len(calls) == 1
+
+        np.testing.assert_allclose(pyop.toMatrix(S.T), S_mat.T)
+
+
 #########################
 #  To/From Matrix form  #
 #########################
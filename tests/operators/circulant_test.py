@@ -0,0 +1,124 @@
+#pylint: disable=W0104,W0108
+import pyop
+import pyop.operators as operators
+from pyop.operators.circulant import CirculantOperator, ToeplitzOperator
+
+import pytest
+import random
+
+import numpy as np
+import scipy.linalg
+
+num_tests = 50
+
+
+def randomVector(n):
+    v = np.random.rand(n)
+    if random.random() < 0.5:
+        v = v + 1j*np.random.rand(n)
+
+    return v
+
+
+###############
+#  Circulant  #
+###############
+
+def testCirculantRandom():
+    for _ in range(num_tests):
+        c = randomVector(random.randint(1, 20))
+        C = operators.circulant(c)
+        C_mat = scipy.linalg.circulant(c)
+
+        np.testing.assert_allclose(pyop.toMatrix(C), C_mat, atol = 1e-12)
+        np.testing.assert_allclose(pyop.toMatrix(C.T), C_mat.conj().T,
+                                   atol = 1e-12)
+
+        x = randomVector(len(c))
+        np.testing.assert_allclose(C(x), C_mat.dot(x), atol = 1e-12)
+        pyop.adjointTest(C)
+
+
+def testCirculantEigenvalues():
+    c = np.random.rand(7)
+    C = operators.circulant(c)
+    n = np.arange(7)
+
+    for k, l in enumerate(C.eigenvalues):
+        mode = np.exp(2j*np.pi*k*n/7)
+        np.testing.assert_allclose(C(mode), l*mode, atol = 1e-12)
+
+
+def testCirculantStructure():
+    c = np.random.rand(6) + 1
+    d = randomVector(6)
+    C = operators.circulant(c)
+    D = operators.circulant(d)
+    C_mat = scipy.linalg.circulant(c)
+    D_mat = scipy.linalg.circulant(d)
+
+    for O, O_mat in [(C**-1, np.linalg.inv(C_mat)),
+                     (C**3, C_mat.dot(C_mat).dot(C_mat)),
+                     (C*D, C_mat.dot(D_mat)), (C + D, C_mat + D_mat),
+                     (2*C, 2*C_mat), (-D, -D_mat)]:
+        assert isinstance(O, CirculantOperator)
+        np.testing.assert_allclose(pyop.toMatrix(O), O_mat, atol = 1e-10)
+
+    assert np.isrealobj(pyop.toMatrix(C**-1))
+
+    with pytest.raises(ValueError):
+        operators.circulant(np.ones(4))**-1
+
+
+##############
+#  Toeplitz  #
+##############
+
+def testToeplitzRandom():
+    for _ in range(num_tests):
+        c = randomVector(random.randint(1, 20))
+        r = randomVector(random.randint(1, 20))
+        T = operators.toeplitz(c, r)
+        T_mat = scipy.linalg.toeplitz(c, r)
+
+        assert isinstance(T, ToeplitzOperator)
+        np.testing.assert_allclose(pyop.toMatrix(T), T_mat, atol = 1e-12)
+        np.testing.assert_allclose(pyop.toMatrix(T.T), T_mat.conj().T,
+                                   atol = 1e-12)
+
+        x = randomVector(len(r))
+        np.testing.assert_allclose(T(x), T_mat.dot(x), atol = 1e-12)
+        pyop.adjointTest(T)
+
+
+def testToeplitzHermitian():
+    c = randomVector(5)
+    np.testing.assert_allclose(pyop.toMatrix(operators.toeplitz(c)),
+                               scipy.linalg.toeplitz(c), atol = 1e-12)
+
+
+def testSinglePrecision():
+    x = np.random.rand(8).astype(np.float32)
+
+    for O in (operators.circulant(np.random.rand(8)),
+              operators.toeplitz(np.random.rand(8), np.random.rand(8))):
+        assert O(x).dtype == np.float32
+        assert O(x.astype(np.complex64)).dtype == np.complex64
+
+    assert operators.circulant(np.arange(8))(x).dtype == np.float32
+
+
+def testCirculantStructurePrecision():
+    c = np.random.rand(6).astype(np.float32) + 1
+    C = operators.circulant(c)
+    C_mat = scipy.linalg.circulant(c).astype(np.float64)
+
+    for O, O_mat in [(C*C, C_mat.dot(C_mat)),
+                     (C**np.int64(2), C_mat.dot(C_mat)),
+                     (C**-1, np.linalg.inv(C_mat))]:
+        assert isinstance(O, CirculantOperator)
+        assert O.dtype == np.float32
+        np.testing.assert_allclose(pyop.toMatrix(O), O_mat, rtol = 1e-4)
+
+    Z = operators.circulant(c.astype(np.complex64))
+    assert (Z*C).dtype == np.complex64
@@ -1,6 +1,9 @@
 #pylint: disable=W0104,W0108
+import pyop
 import pyop.operators as operators
-from pyop import adjointTest
+from pyop import adjointTest, toMatrix
+from pyop.operators.convolution import ConvolutionOperator, \
+        ConvolutionNormalOperator
 
 import pytest
 import random
@@ -108,6 +111,316 @@ def testConvolutionRandom():
             reshape(C._forward(ravel(image, order)), image.shape, order),
             signal.convolve(image, kernel, 'same'))
 
+def testSparseConvolutionRandom():
+    for _ in range(num_tests):
+        d = random.randint(1, 3)
+
+        kernel = np.random.rand(*tuple(
+            random.randint(1, 5) for _ in range(d)))
+        kernel[np.random.rand(*kernel.shape) < 0.6] = 0
+
+        image = np.random.rand(*tuple(
+            random.randint(1, 6) for _ in range(d)))
+
+        order = random.choice(('C', 'F', 'A'))
+
+        ## Force shifted accumulation and compare against scipy.
+        S = operators.convolve(kernel, image.shape, order, sparse_threshold = 1)
+        D = operators.convolve(kernel, image.shape, order, sparse_threshold = 0)
+        adjointTest(S)
+
+        np.testing.assert_allclose(
+            reshape(S(ravel(image, order)), image.shape, order),
+            signal.convolve(image, kernel, 'same'), atol = 1e-12)
+        np.testing.assert_allclose(toMatrix(S.T), toMatrix(D.T),
+                                   atol = 1e-12)
+
+
+def testStencilsAccumulate(monkeypatch):
+    laplacian = np.zeros((3, 3, 3))
+    laplacian[1, 1, :] = laplacian[1, :, 1] = laplacian[:, 1, 1] = 1
+    laplacian[1, 1, 1] = -6
+
+    ops = [operators.gradient(1, 3, (20, 30)),
+           operators.gradient(2, 3, (20, 30)),
+           operators.gradient(2, 5, (8, 9, 10)),
+           operators.convolve(laplacian, (8, 9, 10))]
+    x = [np.random.rand(O.shape[1]) for O in ops]
+    expected = [(O(v), O.T(v)) for O, v in zip(ops, x)]
+
+    ## A dense kernel is cheaper to convolve by FFT.
+    dense = operators.convolve(np.random.rand(9, 9), (20, 30))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("scipy.signal.convolve was called.")
+
+    monkeypatch.setattr(signal, 'convolve', fail)
+
+    for O, v, (y, z) in zip(ops, x, expected):
+        np.testing.assert_allclose(O(v), y)
+        np.testing.assert_allclose(O.T(v), z)
+
+    with pytest.raises(AssertionError):
+        dense(np.random.rand(600))
+
+
+def testTiledConvolutionRandom():
+    for _ in range(num_tests):
+        d = random.randint(1, 3)
+
+        kernel = np.random.rand(*tuple(
+            random.randint(1, 5) for _ in range(d)))
+        shape = tuple(random.randint(1, 9) for _ in range(d))
+        tiles = tuple(random.randint(1, 4) for _ in range(d))
+        order = random.choice(('C', 'F'))
+
+        T = operators.convolve(kernel, shape, order, tiles = tiles)
+        C = operators.convolve(kernel, shape, order, sparse_threshold = 0)
+
+        np.testing.assert_allclose(toMatrix(T), toMatrix(C), atol = 1e-12)
+        np.testing.assert_allclose(toMatrix(T.T), toMatrix(C.T),
+                                   atol = 1e-12)
+
+
+def testConvolutionSparsity():
+    kernel = np.random.rand(3, 3, 3)
+    kernel[0, 1, 2] = 0
+    shape = (6, 5, 4)
+
+    for order in ('C', 'F'):
+        C = operators.convolve(kernel, shape, order)
+
+        for O in (C, C.T, C.T*C):
+            np.testing.assert_array_equal(O._sparsity().toarray(),
+                                          toMatrix(O) != 0)
+
+    ## A Laplacian like stencil needs one probe per kernel entry.
+    C = operators.convolve(kernel, shape)
+    columns = []
+
+    def forward(x):
+        columns.append(x.shape[1])
+        return C(x)
+
+    S = toMatrix(pyop.LinearOperator(C.shape, forward), sparse = True,
+                 pattern = C._sparsity())
+    assert columns == [27]
+    np.testing.assert_allclose(S.toarray(),
+        toMatrix(pyop.LinearOperator(C.shape, C._forward)), atol = 1e-12)
+
+
+def testTiledConvolutionExecutors():
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    kernel = np.random.rand(5, 4)
+    image = np.random.rand(20, 17)
+    x = ravel(image)
+
+    C = operators.convolve(kernel, image.shape, sparse_threshold = 0)
+
+    with ThreadPoolExecutor(2) as threads, ProcessPoolExecutor(2) as procs:
+        for executor in (threads, procs):
+            T = operators.convolve(kernel, image.shape, tiles = (3, 2),
+                                   executor = executor)
+
+            np.testing.assert_allclose(T(x), C(x))
+            np.testing.assert_allclose(T.T(x), C.T(x))
+
+
+def testTiledConvolutionWithoutSharedMemory(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    import pyop.operators.convolution as convolution
+
+    monkeypatch.setattr(convolution, 'shared_memory', None)
+
+    kernel = np.random.rand(3, 4)
+    image = np.random.rand(9, 11)
+    x = ravel(image)
+
+    C = operators.convolve(kernel, image.shape, sparse_threshold = 0)
+
+    with ProcessPoolExecutor(2) as procs:
+        T = operators.convolve(kernel, image.shape, tiles = (2, 3),
+                               executor = procs)
+
+        np.testing.assert_allclose(T(x), C(x))
+        np.testing.assert_allclose(T.T(x), C.T(x))
+
+
+def testTiledConvolutionErrors():
+    with pytest.raises(ValueError):
+        operators.convolve(np.ones((2, 2)), (4, 4), tiles = (2, 2, 2))
+
+    with pytest.raises(ValueError):
+        operators.convolve(np.ones((2, 2)), (4, 4), tiles = 0)
+
+
+def testConvolutionNormalRandom():
+    kernel_max_size = 5
+    image_max_size = 6
+    dimensions_max = 3
+
+    for _ in range(num_tests):
+        d = random.randint(1, dimensions_max)
+
+        kernel = np.random.rand(*tuple(
+            random.randint(1, kernel_max_size) for _ in range(d)))
+
+        image = np.random.rand(*tuple(
+            random.randint(1, image_max_size) for _ in range(d)))
+
+        order = random.choice(('C', 'F', 'A'))
+
+        C = operators.convolve(kernel, image.shape, order)
+        N = operators.convolveNormal(kernel, image.shape, order)
+        adjointTest(N)
+
+        x = ravel(image, order)
+        np.testing.assert_allclose(N(x), C.T(C(x)), atol = 1e-12)
+        np.testing.assert_allclose((C.T*C)(x), C.T(C(x)), atol = 1e-12)
+
+
+def testConvolutionNormalComposition():
+    kernel = np.random.rand(3, 2)
+    C = operators.convolve(kernel, (5, 4))
+
+    assert isinstance(C, ConvolutionOperator)
+    assert isinstance(C.T, ConvolutionOperator)
+
+    ## Only the transpose on the left fuses.
+    assert not isinstance(C.T*C, ConvolutionOperator)
+    assert isinstance(C.T*C, ConvolutionNormalOperator)
+    assert not isinstance(C*C.T, ConvolutionOperator)
+    np.testing.assert_allclose(toMatrix(C*C.T),
+            toMatrix(C).dot(toMatrix(C).T))
+
+    D = operators.convolve(kernel + 1, (5, 4))
+    np.testing.assert_allclose(toMatrix(C.T*D),
+            toMatrix(C).T.dot(toMatrix(D)))
+
+
+def testConvolutionNormalInexact():
+    kernel = np.random.rand(3, 4)
+    image = zeros((10, 11))
+    image[3:-3, 3:-3] = np.random.rand(4, 5)
+
+    C = operators.convolve(kernel, image.shape)
+    N = operators.convolveNormal(kernel, image.shape, exact=False)
+    adjointTest(N)
+
+    ## Images that vanish near the border see no boundary effects.
+    np.testing.assert_allclose(N(ravel(image)), C.T(C(ravel(image))),
+            atol = 1e-12)
+
+
+def testConvolutionStreamRandom():
+    for _ in range(num_tests):
+        n = random.randint(1, 50)
+        kernel = np.random.rand(random.randint(1, 9))
+        x = np.random.rand(n)
+
+        C = operators.convolve(kernel, (n,))
+
+        for O in (C, C.T):
+            np.testing.assert_allclose(
+                O.stream(x, chunk_size = random.randint(1, 10)), O(x))
+
+            cuts = sorted(random.sample(range(n + 1),
+                                        random.randint(0, min(n, 5))))
+            chunks = [x[a:b] for a, b in zip([0] + cuts, cuts + [n])]
+
+            np.testing.assert_allclose(
+                np.concatenate(list(O.stream(iter(chunks)))), O(x))
+
+
+def testConvolutionStreamMemmap(tmpdir):
+    n = 1000
+    kernel = np.random.rand(64)
+
+    x = np.memmap(str(tmpdir.join('x.dat')), dtype = np.float64,
+                  mode = 'w+', shape = (n,))
+    x[:] = np.random.rand(n)
+    out = np.memmap(str(tmpdir.join('y.dat')), dtype = np.float64,
+                    mode = 'w+', shape = (n,))
+
+    C = operators.convolve(kernel, (n,))
+
+    assert C.stream(x, out, chunk_size = 100) is out
+    np.testing.assert_allclose(out, C(np.asarray(x)))
+
+    C.T.stream((x[i:i + 77] for i in range(0, n, 77)), out)
+    np.testing.assert_allclose(out, C.T(np.asarray(x)))
+
+
+def testConvolutionStreamErrors():
+    C = operators.convolve(np.ones((2, 2)), (3, 3))
+    with pytest.raises(ValueError):
+        C.stream(np.ones(9))
+
+    C = operators.convolve(np.ones(2), (5,))
+    with pytest.raises(ValueError):
+        C.stream(np.ones(4))
+
+    with pytest.raises(ValueError):
+        C.stream(np.ones(5), out = np.empty(4))
+
+    with pytest.raises(ValueError):
+        list(C.stream(iter([np.ones(3), np.ones(3)])))
+
+
+##########################
+#  Decimate and Upsample  #
+##########################
+
+def testDecimateRandom():
+    dimensions_max = 3
+
+    for _ in range(num_tests):
+        d = random.randint(1, dimensions_max)
+
+        shape = tuple(random.randint(1, 9) for _ in range(d))
+        kernel = np.random.rand(*tuple(random.randint(1, 6) for _ in range(d)))
+        factor = tuple(random.randint(1, 4) for _ in range(d))
+        order = random.choice(('C', 'F'))
+
+        ## The reference is a full convolution followed by a selection.
+        n = int(np.prod(shape))
+        kept = np.arange(n).reshape(shape, order = order)[
+            tuple(slice(None, None, m) for m in factor)]
+        S = operators.select(n, list(ravel(kept, order)))
+        C = operators.convolve(kernel, shape, order)
+
+        D = operators.decimate(kernel, shape, factor, order)
+        adjointTest(D)
+
+        np.testing.assert_allclose(toMatrix(D), toMatrix(S*C), atol = 1e-12)
+        np.testing.assert_allclose(toMatrix(D.T), toMatrix(C.T*S.T),
+                                   atol = 1e-12)
+
+
+def testUpsampleIsDecimateAdjoint():
+    kernel = np.random.rand(4, 3)
+
+    D = operators.decimate(kernel, (9, 8), (2, 3))
+    U = operators.upsample(kernel, (9, 8), (2, 3))
+    adjointTest(U)
+
+    assert U.shape == (72, 15)
+    np.testing.assert_allclose(toMatrix(U), toMatrix(D).T)
+    np.testing.assert_allclose(toMatrix(U.T), toMatrix(D))
+
+
+def testDecimateErrors():
+    with pytest.raises(ValueError):
+        operators.decimate(np.ones(3), (4, 4), 2)
+
+    with pytest.raises(ValueError):
+        operators.decimate(np.ones((3, 3)), (4, 4), (2, 2, 2))
+
+    with pytest.raises(ValueError):
+        operators.decimate(np.ones(3), (4,), 0)
+
+
 ##############
 #  Gradient  #
 ##############
@@ -259,3 +572,30 @@ def testCentralDiffErrors():
         operators.gradient(5, 5, (10, ))
     assert e.value.args[0] == ("Number of points must be at least "
                                "the derivative order + 1.")
+
+
+###############
+#  Precision  #
+###############
+
+def testConvolutionSinglePrecision():
+    shape = (6, 5)
+    kernel = np.random.rand(3, 3)
+    x = np.random.rand(30).astype(np.float32)
+
+    ops = [operators.convolve(kernel, shape),
+           operators.convolve(kernel, shape, sparse_threshold = 1),
+           operators.convolve(kernel, shape, tiles = 2),
+           operators.convolveNormal(kernel, shape),
+           operators.decimate(kernel, shape, 2),
+           operators.gradient(1, 3, shape)]
+
+    for O in ops:
+        assert O.dtype == np.float64
+        for v in (x, x.astype(np.complex64)):
+            assert O(v).dtype == v.dtype
+            assert O.T(O(v)).dtype == v.dtype
+
+    C = operators.convolve(np.random.rand(3), (10,))
+    assert C.stream(x[:10], chunk_size = 3).dtype == np.float32
+    assert all(c.dtype == np.float32 for c in C.stream(iter([x[:4], x[4:10]])))
@@ -199,3 +199,17 @@ def testIfftwrapRandom():
         J = operators.ifftwrap(I, arr.shape, s, shift, order)
 
         pyop.adjointTest(J)
+
+
+def testFftSinglePrecision():
+    shape = (4, 6)
+    x = np.random.rand(24).astype(np.float32)
+
+    for F in (operators.fft(shape), operators.ifft(shape),
+              operators.fft(shape, s = (5, 3))):
+        assert F.dtype == np.complex64
+        assert F(x).dtype == np.complex64
+        assert F.T(F(x)).dtype == np.complex64
+        assert F(x.astype(np.float64)).dtype == np.complex128
+        np.testing.assert_allclose(F(x), F(x.astype(np.float64)),
+                                   rtol = 1e-4, atol = 1e-4)
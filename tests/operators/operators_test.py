@@ -2,9 +2,17 @@
 import pyop
 import pyop.operators as operators
 
+import pytest
 import random
 
+from functools import reduce
+
 import numpy as np
+from pyop.operators.matrix_operators import (
+        ZeroOperator, RankOneOperator, EyeOperator, PermutationOperator,
+        DiagonalOperator, StackedDiagonalOperator, KroneckerOperator,
+        LowRankOperator
+    )
 from tools import operatorVersusMatrix
 
 num_tests = 250
@@ -35,6 +43,24 @@ def testZerosAdjoint():
         pyop.adjointTest(Z_op)
 
 
+def testZerosStructure():
+    A = pyop.toLinearOperator(np.random.rand(3, 4))
+    Z = operators.zeros((4, 5))
+
+    assert isinstance(A*Z, ZeroOperator)
+    assert (A*Z).shape == (3, 5)
+    assert isinstance(Z.T*A.T, ZeroOperator)
+    assert (Z.T*A.T).shape == (5, 3)
+    assert isinstance(Z.T, ZeroOperator)
+    assert isinstance(2*Z, ZeroOperator)
+
+    Z = operators.zeros((3, 4))
+    assert A + Z is A
+    assert Z + A is A
+    assert A - Z is A
+    operatorVersusMatrix(-pyop.toMatrix(A), Z - A)
+
+
 ##########
 #  Ones  #
 ##########
@@ -60,6 +86,33 @@ def testOnesAdjoint():
         pyop.adjointTest(O_op)
 
 
+def testOnesStructure():
+    x = np.random.rand(4, 3)
+    O_op = operators.ones((5, 4))
+
+    assert O_op.rank == 1
+
+    out = np.empty((5, 3))
+    assert O_op(x, out = out) is out
+    np.testing.assert_allclose(out, np.ones((5, 4)).dot(x))
+
+    B_op = operators.ones((5, 4), broadcast = True)
+    assert not B_op(x).flags.writeable
+    np.testing.assert_allclose(B_op(x), np.ones((5, 4)).dot(x))
+
+    u = np.random.rand(5)
+    v = np.random.rand(4)
+    P_op = operators.diag(u) * O_op * operators.diag(v) * \
+            operators.ones((4, 2)) * 3
+
+    P_mat = 3 * np.diag(u).dot(np.ones((5, 4))).dot(np.diag(v)).dot(
+            np.ones((4, 2)))
+
+    assert isinstance(P_op, RankOneOperator)
+    operatorVersusMatrix(P_mat, P_op)
+    operatorVersusMatrix(-P_mat, -P_op)
+
+
 #########
 #  Eye  #
 #########
@@ -85,6 +138,41 @@ def testEyeAdjoint():
         pyop.adjointTest(I_op)
 
 
+def testEyeRectangular():
+    for shape in ((5, 3), (3, 5), (4, 4)):
+        I_mat = np.eye(*shape)
+        I_op = operators.eye(shape)
+
+        operatorVersusMatrix(I_mat, I_op)
+        pyop.adjointTest(I_op)
+
+        x = np.random.rand(shape[1], 2)
+        out = np.full((shape[0], 2), np.nan)
+        assert I_op(x, out = out) is out
+        np.testing.assert_allclose(out, I_mat.dot(x))
+
+    ## Truncation does not copy.
+    x = np.random.rand(5)
+    assert np.shares_memory(operators.eye((3, 5))(x), x)
+
+
+def testEyeElision():
+    A = pyop.toLinearOperator(np.random.rand(4, 3))
+
+    assert operators.eye((4, 4)) * A is A
+    assert A * operators.eye((3, 3)) is A
+    assert operators.eye((4, 4)).T * A is A
+
+    ## Truncation followed by padding only loses rows of the middle.
+    E = operators.eye((5, 3)) * operators.eye((3, 2))
+    assert isinstance(E, EyeOperator)
+    operatorVersusMatrix(np.eye(5, 2), E)
+
+    E = operators.eye((5, 2)) * operators.eye((2, 3))
+    assert not isinstance(E, EyeOperator)
+    operatorVersusMatrix(np.eye(5, 2).dot(np.eye(2, 3)), E)
+
+
 ############
 #  Select  #
 ############
@@ -100,6 +188,72 @@ def testSelectAdjoint():
         pyop.adjointTest(S_op)
 
 
+def testSelectFunction():
+    for _ in range(num_tests):
+        rows = random.randint(1, 30)
+
+        ## A permutation, unique indices, and indices with duplicates.
+        perm = random.choice([
+            list(np.random.permutation(rows)),
+            random.sample(range(rows), random.randint(1, rows)),
+            [random.randint(0, rows - 1)
+                for _ in range(random.randint(1, 2*rows))]])
+
+        S_mat = np.eye(rows)[perm]
+        S_op = operators.select(rows, perm)
+
+        operatorVersusMatrix(S_mat, S_op)
+
+        y = np.random.rand(len(perm), 2).astype(np.float32)
+        assert S_op.T(y).dtype == np.float32
+        assert S_op.T(y[:, 0]).dtype == np.float32
+
+
+#############
+#  Permute  #
+#############
+
+def testPermuteFunction():
+    for _ in range(num_tests):
+        rows = random.randint(1, 30)
+        perm = np.random.permutation(rows)
+
+        P_op = operators.permute(perm)
+
+        operatorVersusMatrix(np.eye(rows)[perm], P_op)
+        pyop.adjointTest(P_op)
+
+
+def testPermuteComposition():
+    p = np.random.permutation(10)
+    q = np.random.permutation(10)
+
+    P = operators.permute(p)
+    Q = operators.permute(q)
+
+    assert isinstance(P*Q, PermutationOperator)
+    operatorVersusMatrix(np.eye(10)[p].dot(np.eye(10)[q]), P*Q)
+
+    assert isinstance(P.T*P, EyeOperator)
+    assert isinstance(P*P.T, EyeOperator)
+
+
+def testPermuteReverseView():
+    x = np.random.rand(6, 2)
+    R = operators.permute(range(5, -1, -1))
+
+    assert np.shares_memory(R(x), x)
+    np.testing.assert_allclose(R(x), x[::-1])
+
+
+def testPermuteInputs():
+    with pytest.raises(ValueError):
+        operators.permute([0, 0, 1])
+
+    with pytest.raises(ValueError):
+        operators.permute([1, 2, 3])
+
+
 ##########
 #  Diag  #
 ##########
@@ -128,3 +282,292 @@ def testDiagAdjoint():
         D_op = operators.diag(rand_vec)
 
         pyop.adjointTest(D_op)
+
+
+def testDiagComplexAdjoint():
+    v = np.random.rand(6) + 1j*np.random.rand(6)
+    D_op = operators.diag(v)
+
+    np.testing.assert_allclose(pyop.toMatrix(D_op), np.diag(v))
+    np.testing.assert_allclose(pyop.toMatrix(D_op.T), np.diag(v.conj()))
+    pyop.adjointTest(D_op)
+
+
+def testDiagInPlace():
+    v = np.random.rand(6)
+    x = np.random.rand(6, 3)
+    y = x.copy()
+
+    res = operators.diag(v)(y, out = y)
+
+    assert res is y
+    np.testing.assert_allclose(y, v[:, np.newaxis] * x)
+
+
+def testDiagStructure():
+    v = np.random.rand(5) + 1
+    w = np.random.rand(5)
+    D = operators.diag(v)
+    E = operators.diag(w)
+
+    for O, v_res in [(D*E, v*w), (D + E, v + w), (D - E, v - w),
+                     (3*D, 3*v), (-D, -v), (D**-1, 1/v), (D**3, v**3),
+                     (D**0.5, np.sqrt(v))]:
+        assert isinstance(O, DiagonalOperator)
+        np.testing.assert_allclose(pyop.toMatrix(O), np.diag(v_res))
+
+    np.testing.assert_allclose(
+        operators.diag(np.array([1, 2, 4]))**-1 * np.ones(3), [1, 0.5, 0.25])
+
+    with pytest.raises(ValueError):
+        operators.diag(np.array([1., 0.]))**-1
+
+
+def testDiagStack():
+    maps = np.random.rand(3, 5) + 1j*np.random.rand(3, 5)
+    S = operators.diagStack(maps)
+    S_mat = np.vstack([np.diag(m) for m in maps])
+
+    np.testing.assert_allclose(pyop.toMatrix(S), S_mat)
+    pyop.adjointTest(S)
+    np.testing.assert_allclose(pyop.toMatrix(S.T), S_mat.conj().T)
+
+    x = np.random.rand(5, 2)
+    out = np.empty((15, 2), dtype = complex)
+    S(x, out = out)
+    np.testing.assert_allclose(out, S_mat.dot(x))
+
+
+def testDiagStackStructure():
+    maps = np.random.rand(3, 5) + 1j*np.random.rand(3, 5)
+    S = operators.diagStack(maps)
+    S_mat = np.vstack([np.diag(m) for m in maps])
+    v = np.random.rand(5) + 1j
+    w = np.random.rand(15)
+
+    N = S.T*S
+    assert isinstance(N, DiagonalOperator)
+    np.testing.assert_allclose(pyop.toMatrix(N), S_mat.conj().T.dot(S_mat))
+
+    for O, O_mat in [(S*operators.diag(v), S_mat.dot(np.diag(v))),
+                     (operators.diag(w)*S, np.diag(w).dot(S_mat)),
+                     (operators.diag(v)*S.T, np.diag(v).dot(S_mat.conj().T)),
+                     (2j*S.T, 2j*S_mat.conj().T)]:
+        assert isinstance(O, StackedDiagonalOperator)
+        np.testing.assert_allclose(pyop.toMatrix(O), O_mat)
+
+
+def testDiagStackMismatchedNormal():
+    A = np.random.rand(2, 6)
+    B = np.random.rand(3, 4)
+    A_mat = np.vstack([np.diag(m) for m in A])
+    B_mat = np.vstack([np.diag(m) for m in B])
+
+    N = operators.diagStack(A).T*operators.diagStack(B)
+    assert not isinstance(N, DiagonalOperator)
+    assert N.shape == (6, 4)
+    np.testing.assert_allclose(pyop.toMatrix(N), A_mat.T.dot(B_mat))
+
+
+##########
+#  Kron  #
+##########
+
+def testKronFunction():
+    for _ in range(num_tests // 10):
+        mats = [np.random.rand(random.randint(1, matrix_max_size),
+                               random.randint(1, matrix_max_size))
+                for _ in range(random.randint(1, 3))]
+        ops = [pyop.toLinearOperator(m) for m in mats]
+
+        operatorVersusMatrix(reduce(np.kron, mats), operators.kron(*ops))
+        operatorVersusMatrix(reduce(np.kron, mats[::-1]),
+                             operators.kron(*ops, order = 'F'))
+        pyop.adjointTest(operators.kron(*ops))
+
+
+def testKronComplexAdjoint():
+    A = np.random.rand(3, 4) + 1j*np.random.rand(3, 4)
+    B = np.random.rand(2, 5)
+    K = operators.kron(pyop.toLinearOperator(A), pyop.toLinearOperator(B))
+
+    np.testing.assert_allclose(pyop.toMatrix(K.T), np.kron(A, B).conj().T)
+    pyop.adjointTest(K)
+
+
+def testKronStructure():
+    A, B, C = (np.random.rand(3, 3) for _ in range(3))
+    A_op, B_op, C_op = (pyop.toLinearOperator(m) for m in (A, B, C))
+
+    K = operators.kron(A_op, operators.kron(B_op, C_op))
+    assert len(K._factors) == 3
+    np.testing.assert_allclose(pyop.toMatrix(K),
+                               np.kron(np.kron(A, B), C))
+
+    P = operators.kron(A_op, B_op) * operators.kron(B_op, C_op)
+    assert isinstance(P, KroneckerOperator)
+    np.testing.assert_allclose(pyop.toMatrix(P),
+                               np.kron(A, B).dot(np.kron(B, C)))
+
+    with pytest.raises(ValueError):
+        operators.kron(A_op, order = 'A')
+
+    with pytest.raises(TypeError):
+        operators.kron(A_op, B_op, axis = 1)
+
+
+#############
+#  Lowrank  #
+#############
+
+def randomFactor(n, r):
+    return np.random.rand(n, r) + 1j*np.random.rand(n, r)
+
+
+def testLowrankFunction():
+    for _ in range(num_tests // 10):
+        m, n = (random.randint(1, matrix_max_size) for _ in range(2))
+        r = random.randint(1, 4)
+        U, V = randomFactor(m, r), randomFactor(n, r)
+        L = operators.lowrank(U, V)
+
+        assert L.rank == r
+        np.testing.assert_allclose(pyop.toMatrix(L), U.dot(V.conj().T))
+        np.testing.assert_allclose(pyop.toMatrix(L.T), V.dot(U.conj().T))
+        pyop.adjointTest(L)
+
+
+def testLowrankComposition():
+    U, V = randomFactor(6, 2), randomFactor(5, 2)
+    W, X = randomFactor(5, 3), randomFactor(4, 3)
+    d, e = randomFactor(5, 1)[:, 0], randomFactor(6, 1)[:, 0]
+    L = operators.lowrank(U, V)
+    L_mat = U.dot(V.conj().T)
+
+    for O, O_mat in [(L*operators.lowrank(W, X),
+                      L_mat.dot(W).dot(X.conj().T)),
+                     (L*operators.diag(d), L_mat.dot(np.diag(d))),
+                     (operators.diag(e)*L, np.diag(e).dot(L_mat)),
+                     (L*operators.ones((5, 3)), L_mat.dot(np.ones((5, 3)))),
+                     (operators.ones((4, 6))*L, np.ones((4, 6)).dot(L_mat))]:
+        assert isinstance(O, LowRankOperator)
+        assert O.rank <= 2
+        np.testing.assert_allclose(pyop.toMatrix(O), O_mat)
+
+
+def testLowrankSum():
+    U, V = randomFactor(6, 2), randomFactor(5, 2)
+    L = operators.lowrank(U, V)
+    L_mat = U.dot(V.conj().T)
+
+    S = L + 2*L
+    assert isinstance(S, LowRankOperator) and S.rank == 2
+    np.testing.assert_allclose(pyop.toMatrix(S), 3*L_mat)
+
+    S = L + operators.ones((6, 5))
+    assert isinstance(S, LowRankOperator) and S.rank == 3
+    np.testing.assert_allclose(pyop.toMatrix(S), L_mat + 1)
+
+    assert isinstance(L - L, ZeroOperator)
+
+
+def testLowrankCompress():
+    U, V = randomFactor(8, 3), randomFactor(7, 3)
+    U = U.dot(np.linalg.qr(U)[1].T)
+    L = operators.lowrank(U * [1, 1e-3, 1e-9], V)
+
+    assert L.compress().rank == 3
+    assert L.compress(1e-6).rank == 2
+    assert operators.lowrank(U * [1, 1e-3, 1e-9], V,
+                             tol = 1e-6).compress().rank == 2
+
+    C = L.compress(1e-6)
+    np.testing.assert_allclose(pyop.toMatrix(C), pyop.toMatrix(L),
+                               atol = 1e-6 * np.linalg.norm(U) *
+                                      np.linalg.norm(V))
+
+
+##########################
+#  Closed Form Matrices  #
+##########################
+
+def testClosedFormMatrices():
+    kernel = np.random.rand(3, 2)
+    kernel[1, 0] = 0
+
+    ops = [operators.zeros((4, 6)), operators.eye((4, 6)),
+           operators.eye((8, 6)), operators.select(6, [0, 2, 2]),
+           operators.permute([1, 0, 3, 2, 5, 4]),
+           operators.diag(np.random.rand(6) + 1j),
+           operators.ones((4, 6)),
+           RankOneOperator((4, 6), np.random.rand(4), None, 2.),
+           operators.kron(pyop.toLinearOperator(np.random.rand(2, 3)),
+                          operators.diag(np.random.rand(2))),
+           operators.kron(pyop.toLinearOperator(np.random.rand(2, 3)),
+                          operators.ones((3, 2)), order = 'F'),
+           operators.fftshift((2, 3)), operators.ifftshift((3, 2), order = 'F'),
+           operators.convolve(kernel, (2, 3)),
+           operators.convolve(kernel, (2, 3), 'F').T,
+           operators.gradient(1, 3, (3, 4)),
+           operators.gradient(1, 3, (3, 4)).T*operators.gradient(1, 3, (3, 4)),
+           operators.convolveNormal(kernel, (4, 3), 'F'),
+           operators.convolveNormal(kernel, (4, 3), exact = False)]
+
+    for O in ops:
+        assert O._toSparse(np.float64) is not NotImplemented
+
+    for O in ops:
+        ## The same operator, only known through its forward function.
+        applied = pyop.LinearOperator(O.shape, O._forward)
+
+        for dtype in (np.float32, np.float64):
+            S = pyop.toMatrix(O, sparse = True, dtype = dtype)
+            D = pyop.toMatrix(applied, dtype = dtype)
+
+            assert S.format == 'csr'
+            assert S.dtype == D.dtype
+            np.testing.assert_allclose(S.toarray(), D, atol = 1e-6)
+            np.testing.assert_allclose(pyop.toMatrix(O, dtype = dtype), D,
+                                       atol = 1e-6)
+
+
+def testClosedFormProducts():
+    A_mat = np.random.rand(4, 6)
+    v = np.random.rand(4)
+
+    P = operators.diag(v) * pyop.toLinearOperator(A_mat) * \
+        operators.select(6, [5, 0, 1, 2, 3, 4]) * operators.eye((6, 3))
+    S = P._toSparse(np.float64)
+
+    assert S is not NotImplemented
+    np.testing.assert_allclose(S.toarray(), np.diag(v).dot(A_mat).dot(
+        np.eye(6)[[5, 0, 1, 2, 3, 4]]).dot(np.eye(6, 3)))
+
+    ## Without a closed form for every factor, the product is applied.
+    Q = operators.diag(v) * pyop.LinearOperator((4, 4), lambda x: x)
+    assert Q._toSparse(np.float64) is NotImplemented
+    np.testing.assert_allclose(pyop.toMatrix(Q), np.diag(v))
+
+
+###############
+#  Precision  #
+###############
+
+def testSinglePrecision():
+    x = np.random.rand(6).astype(np.float32)
+    ops = [operators.zeros((4, 6)), operators.ones((4, 6)),
+           operators.eye((4, 6)), operators.eye((8, 6)),
+           operators.select(6, [0, 2, 2]), operators.permute([1, 0, 3, 2, 5, 4]),
+           operators.diag(np.random.rand(6)),
+           operators.diag(np.random.rand(6) + 1j),
+           operators.diagStack(np.random.rand(2, 6)),
+           operators.lowrank(np.random.rand(4, 2), np.random.rand(6, 2))]
+
+    for O in ops:
+        for v in (x, x.astype(np.complex64), np.tile(x, (3, 1)).T):
+            assert O(v).dtype == O.result_type(v.dtype)
+            assert O.T(O(v)).dtype == O.result_type(v.dtype)
+
+    assert ops[0].dtype is None
+    assert ops[6](x).dtype == np.float32
+    assert ops[7](x).dtype == np.complex64
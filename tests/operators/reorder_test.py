@@ -0,0 +1,115 @@
+#pylint: disable=W0104,W0108
+import pyop
+import pyop.operators as operators
+from pyop.operators.matrix_operators import EyeOperator
+
+import pytest
+import random
+
+import numpy as np
+
+num_tests = 50
+
+
+def randomArray():
+    d = random.randint(1, 4)
+    return np.random.rand(*tuple(random.randint(1, 5) for _ in range(d)))
+
+
+#############
+#  Reverse  #
+#############
+
+def testReverseRandom():
+    for _ in range(num_tests):
+        a = randomArray()
+        order = random.choice(('C', 'F'))
+        axes = tuple(d for d in range(a.ndim) if random.random() < 0.5)
+
+        R = operators.reverse(a.shape, axes, order)
+        pyop.adjointTest(R)
+
+        np.testing.assert_allclose(R(np.ravel(a, order)),
+            np.ravel(a[tuple(slice(None, None, -1) if d in axes
+                             else slice(None) for d in range(a.ndim))],
+                     order))
+
+
+def testReverseAllIsView():
+    a = randomArray()
+    x = np.ravel(a)
+
+    assert np.shares_memory(operators.reverse(a.shape)(x), x)
+
+
+##########
+#  Roll  #
+##########
+
+def testRollRandom():
+    for _ in range(num_tests):
+        a = randomArray()
+        order = random.choice(('C', 'F'))
+        axis = random.randint(0, a.ndim - 1)
+        shift = random.randint(-5, 5)
+
+        R = operators.roll(a.shape, shift, axis, order)
+        pyop.adjointTest(R)
+
+        np.testing.assert_allclose(R(np.ravel(a, order)),
+            np.ravel(np.roll(a, shift, axis), order))
+
+        assert isinstance(operators.roll(a.shape, -shift, axis, order) * R,
+                          EyeOperator)
+
+
+###############
+#  Transpose  #
+###############
+
+def testTransposeRandom():
+    for _ in range(num_tests):
+        a = randomArray()
+        order = random.choice(('C', 'F'))
+        axes = tuple(np.random.permutation(a.ndim))
+
+        T = operators.transpose(a.shape, axes, order)
+        pyop.adjointTest(T)
+
+        np.testing.assert_allclose(T(np.ravel(a, order)),
+            np.ravel(np.transpose(a, axes), order))
+
+        assert isinstance(T.T * T, EyeOperator)
+
+
+def testTransposeOrderConversion():
+    a = randomArray()
+    T = operators.transpose(a.shape)
+
+    np.testing.assert_allclose(T(np.ravel(a, 'C')), np.ravel(a, 'F'))
+
+
+##########
+#  Axes  #
+##########
+
+def testNegativeAxes():
+    a = np.random.rand(3, 4, 2)
+    x = np.ravel(a)
+
+    R = operators.reverse(a.shape, axes = -1)
+    np.testing.assert_allclose(R(x), np.ravel(a[:, :, ::-1]))
+    assert not isinstance(R, EyeOperator)
+
+    np.testing.assert_allclose(operators.reverse(a.shape, (0, -2))(x),
+                               np.ravel(a[::-1, ::-1]))
+    np.testing.assert_allclose(operators.roll(a.shape, 1, -2)(x),
+                               np.ravel(np.roll(a, 1, 1)))
+    np.testing.assert_allclose(operators.transpose(a.shape, (-1, 0, 1))(x),
+                               np.ravel(np.transpose(a, (2, 0, 1))))
+
+    for f in (lambda: operators.reverse(a.shape, 3),
+              lambda: operators.roll(a.shape, 1, -4),
+              lambda: operators.transpose(a.shape, (0, 0, 1))):
+        with pytest.raises(ValueError):
+            f()
@@ -3,6 +3,8 @@ import pyop
 
 import numpy as np
 
+from pyop import promoteDtype
+
 
 #######################################################################
 #                                Tests                                #
@@ -73,3 +75,17 @@ def testVectorArrayOnVector():
     np.testing.assert_allclose(
         multFirstColumnImg(np.array([1, 1, 1, 1])),
         np.array(np.array([2, 1, 2, 1])))
+
+
+##################
+#  promoteDtype  #
+##################
+
+def testPromoteDtype():
+    assert promoteDtype(np.float32, None) == np.float32
+    assert promoteDtype(np.float32, np.float64) == np.float32
+    assert promoteDtype(np.float32, np.complex128) == np.complex64
+    assert promoteDtype(np.complex64, np.float64) == np.complex64
+    assert promoteDtype(np.float64, np.float32) == np.float64
+    assert promoteDtype(np.int64, np.float32) == np.float64
+    assert promoteDtype(np.int64) == np.int64